@@ -0,0 +1,115 @@
+"""
+Конвертация листов ADF в PDF в пуле процессов.
+Модуль не создает ничего при импорте, поэтому процессы пула (в том числе
+запущенные через spawn) не поднимают ScannerManager и слушатель кнопок.
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+
+import config
+from utils import setup_logger
+from image_processing import image_to_pdf, analyze_page, blank_page_action, BLANK_SKIP
+
+logger = setup_logger()
+
+# Пул конвертации листов ADF: процессы по числу ядер, создается при первом сканировании
+_page_pool = None
+_page_pool_workers = 0
+_page_pool_lock = threading.Lock()
+
+def get_page_pool():
+    """Пул процессов конвертации листов (потоки, если процессы недоступны)"""
+    global _page_pool, _page_pool_workers
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool_workers = getattr(config, 'SCAN_CONVERT_WORKERS', 0) or os.cpu_count() or 1
+            try:
+                _page_pool = ProcessPoolExecutor(max_workers=_page_pool_workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"⚠️ Пул процессов недоступен ({e}), конвертируем в потоках")
+                _page_pool = ThreadPoolExecutor(max_workers=_page_pool_workers)
+        return _page_pool, _page_pool_workers
+
+def reset_page_pool():
+    """Пересоздать пул при следующем обращении (после падения процесса)"""
+    global _page_pool
+    with _page_pool_lock:
+        pool, _page_pool = _page_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+def convert_adf_page(storage_dir, parent_scan_id, png_file, page_number, dpi, mode):
+    """
+    Сохраняет лист ADF как отдельный PDF с метаданными для загрузки.
+    Выполняется в пуле процессов, поэтому получает только простые аргументы.
+    Пустой лист не сохраняется (BLANK_PAGE_ACTION = "skip") или помечается ("flag"),
+    цветной лист без цветного содержимого сохраняется в Gray или Lineart.
+    """
+    blank_check, mode_check = analyze_page(png_file, mode)
+    if blank_check["blank"]:
+        if blank_page_action() == BLANK_SKIP:
+            logger.info(f"⬜ Лист {page_number} пустой (краска {blank_check['ink_coverage']:.3%}) - пропускаем")
+            return {'page_number': page_number, 'blank': True, 'skipped': True}
+        logger.info(f"⬜ Лист {page_number} пустой (краска {blank_check['ink_coverage']:.3%}) - помечаем")
+
+    # Создаем отдельный PDF для каждого листа
+    page_scan_id = f"{parent_scan_id}_page_{page_number:03d}"
+    page_filename = f"scan_{page_scan_id}.pdf"
+    page_pdf_path = os.path.join(storage_dir, page_filename)
+
+    page_mode = mode_check["mode"]
+    if page_mode != mode:
+        logger.info(f"🎨 Лист {page_number} без цвета - сохраняем в режиме {page_mode}")
+
+    # Сжимаем PNG по режиму листа и конвертируем в PDF
+    compression = image_to_pdf(png_file, page_pdf_path, page_mode, dpi)
+
+    file_size = os.path.getsize(page_pdf_path)
+
+    # Создаем метаданные для каждого PDF файла
+    page_metadata = {
+        "scan_id": page_scan_id,
+        "filename": page_filename,
+        "original_filename": page_filename,
+        "file_path": page_pdf_path,
+        "file_size": file_size,
+        "format": "pdf",
+        "dpi": dpi,
+        "mode": page_mode,
+        "scanned_mode": mode,
+        "color_analysis": mode_check,
+        "page_number": page_number,
+        "parent_scan_id": parent_scan_id,
+        "compression": compression,
+        "blank": blank_check["blank"],
+        "created_at": datetime.now().isoformat(),
+        "status": "pending",
+        "upload_attempts": 0,
+        "last_upload_attempt": None,
+        "upload_error": None
+    }
+
+    # Сохраняем метаданные
+    metadata_filename = f"scan_{page_scan_id}.json"
+    metadata_path = os.path.join(storage_dir, metadata_filename)
+
+    with open(metadata_path, "w", encoding='utf-8') as f:
+        json.dump(page_metadata, f, indent=2, ensure_ascii=False)
+
+    logger.info(f"💾 Сохранен лист {page_number} как отдельный PDF: {page_filename} ({file_size} байт, "
+                f"{compression['codec']}, сжатие x{compression['ratio']})")
+
+    return {
+        'scan_id': page_scan_id,
+        'filename': page_filename,
+        'file_path': page_pdf_path,
+        'file_size': file_size,
+        'page_number': page_number,
+        'compression': compression,
+        'mode': page_mode,
+        'blank': blank_check["blank"]
+    }
@@ -0,0 +1,93 @@
+import json
+import threading
+
+import pika
+
+from . import config
+from .utils import setup_logger
+
+logger = setup_logger()
+
+class ResultsPublisher:
+    """
+    Публикация результатов и heartbeat в обменник RabbitMQ с подтверждениями брокера.
+    Используется соединение канала управления: оно постоянно обслуживается своим
+    потоком, а публикации из других потоков передаются ему через add_callback_threadsafe.
+    """
+
+    def __init__(self, exchange: str):
+        self.exchange = exchange
+        self._lock = threading.Lock()
+        self._connection = None
+        self._channel = None
+
+    def attach(self, connection):
+        """Открывает канал публикации (вызывается из потока соединения)"""
+        channel = connection.channel()
+        channel.exchange_declare(exchange=self.exchange, exchange_type="topic", durable=True)
+        channel.confirm_delivery()
+        with self._lock:
+            self._connection, self._channel = connection, channel
+        logger.info(f"✅ Публикация результатов в обменник {self.exchange}")
+
+    def detach(self):
+        with self._lock:
+            self._connection, self._channel = None, None
+
+    @property
+    def connected(self) -> bool:
+        with self._lock:
+            return self._connection is not None and self._connection.is_open
+
+    def _publish(self, channel, routing_key: str, body: bytes, outcome: dict, done: threading.Event):
+        try:
+            channel.basic_publish(
+                exchange=self.exchange,
+                routing_key=routing_key,
+                body=body,
+                properties=pika.BasicProperties(delivery_mode=2, content_type="application/json"),
+                mandatory=True
+            )
+            outcome["ok"] = True
+        except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+            logger.error(f"❌ Брокер не принял сообщение {routing_key}: {e}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка публикации {routing_key}: {e}")
+        finally:
+            done.set()
+
+    def publish(self, routing_key: str, data: dict, timeout: float = 10) -> bool:
+        """
+        Публикует сообщение и ждет подтверждения брокера.
+        Возвращает False, если соединения нет, брокер отказал или истек таймаут.
+        """
+        with self._lock:
+            connection, channel = self._connection, self._channel
+        if connection is None or not connection.is_open:
+            return False
+
+        body = json.dumps(data, ensure_ascii=False, default=str).encode()
+        outcome = {"ok": False}
+        done = threading.Event()
+        try:
+            connection.add_callback_threadsafe(
+                lambda: self._publish(channel, routing_key, body, outcome, done)
+            )
+        except Exception as e:
+            logger.error(f"❌ Соединение публикации недоступно: {e}")
+            return False
+
+        if not done.wait(timeout):
+            logger.error(f"❌ Нет подтверждения брокера для {routing_key} за {timeout} сек")
+            return False
+        return outcome["ok"]
+
+def results_routing_key(kind: str) -> str:
+    """Ключ маршрутизации: result.<PRINTER_ID> или heartbeat.<PRINTER_ID>"""
+    return f"{kind}.{config.PRINTER_ID}"
+
+def amqp_results_enabled() -> bool:
+    return config.RESULTS_TRANSPORT == "amqp"
+
+# Общий публикатор результатов воркера
+results_publisher = ResultsPublisher(config.RESULTS_EXCHANGE)
@@ -37,16 +37,14 @@ logger = logging.getLogger(__name__)
 class AutoScanService:
     def __init__(self):
         self.is_running = False
-        self.scanning_in_progress = False
         self.use_adf = getattr(config, 'USE_AUTOMATIC_DOCUMENT_FEEDER', True)
 
     def on_scan_triggered(self):
-        """Callback функция, вызываемая при нажатии кнопки сканирования"""
-        if self.scanning_in_progress:
-            logger.info("⏳ Сканирование уже выполняется, пропускаем...")
-            return
-
-        self.scanning_in_progress = True
+        """
+        Callback функция, вызываемая при нажатии кнопки сканирования.
+        Вызывается исполнителем очереди сканирования - по одному сканированию за раз,
+        нажатия во время сканирования ждут в очереди.
+        """
         try:
             if self.use_adf:
                 logger.info("🎯 Запуск сканирования с автоподатчиком по нажатию кнопки...")
@@ -63,6 +61,8 @@ class AutoScanService:
                 if self.use_adf and 'individual_pdfs' in scan_result:
                     individual_files = scan_result['individual_pdfs']
                     logger.info(f"📄 Создано отдельных PDF файлов: {len(individual_files)}")
+                    if scan_result.get('incomplete'):
+                        logger.warning(f"⚠️ Стопка отсканирована не полностью: {scan_result['error']}")
 
                     # Каждый файл уже сохранен в scans_storage с собственными метаданными
                     # Сервис загрузки автоматически подхватит их
@@ -82,8 +82,6 @@ class AutoScanService:
 
         except Exception as e:
             logger.error(f"❌ Критическая ошибка при сканировании: {e}")
-        finally:
-            self.scanning_in_progress = False
 
     def signal_handler(self, sig, frame):
         """Обработчик сигналов для graceful shutdown"""
@@ -151,6 +149,9 @@ class AutoScanService:
 
         self.is_running = True
 
+        # Фоновая проверка готовности: нажатие кнопки не ждет проверки сканера
+        scanner_manager.readiness.start()
+
         # Запускаем слушатель клавиатуры
         logger.info("🎹 Запускаем слушатель клавиатуры...")
         if not scanner_manager.start_keyboard_listener(self.on_scan_triggered):
@@ -188,6 +189,7 @@ class AutoScanService:
         logger.info("🛑 Останавливаем службу...")
         self.is_running = False
         scanner_manager.stop_keyboard_listener()
+        scanner_manager.readiness.stop()
         logger.info("✅ Служба остановлена")
 
 def main():
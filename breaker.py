@@ -0,0 +1,100 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Простой автомат "предохранитель":
+      closed    - все работает, запросы проходят
+      open      - после N сбоев подряд запросы не выполняются до истечения таймаута
+      half_open - таймаут истек, пропускается одна пробная попытка
+    Таймаут после неудачной пробы удваивается (до max_reset_timeout).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3,
+                 reset_timeout: float = 30, max_reset_timeout: float = 300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._reset_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def is_closed(self) -> bool:
+        """Предохранитель замкнут - можно работать"""
+        return self.state == self.CLOSED
+
+    def allow_request(self) -> bool:
+        """Можно ли выполнить запрос сейчас (в half_open - только одна проба)"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """Через сколько секунд предохранитель пропустит пробную попытку"""
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self._reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._reset_timeout = self.base_reset_timeout
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == self.HALF_OPEN:
+                # Проба не удалась - размыкаем снова с увеличенным таймаутом
+                self._reset_timeout = min(self._reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif state == self.CLOSED and self._failures >= self.failure_threshold:
+                self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def snapshot(self) -> dict:
+        """Состояние для логов и heartbeat"""
+        with self._lock:
+            state = self._current_state()
+            retry_after = 0.0
+            if state == self.OPEN:
+                retry_after = max(0.0, self._reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "name": self.name,
+                "state": state,
+                "failures": self._failures,
+                "retry_after": round(retry_after, 1)
+            }
@@ -1,38 +1,38 @@
-import requests
 import sys
 import traceback
 from . import config
 from .utils import setup_logger
+from .callback_outbox import callback_outbox
 
 logger = setup_logger()
 
-def send_callback(result: dict):
-    """Отправка результата в Laravel API"""
+def send_callback(result: dict) -> bool:
+    """
+    Отправка результата в Laravel API.
+    Результат сохраняется в очередь на диске и отправляется фоновым потоком,
+    поэтому к моменту подтверждения задачи он уже не будет потерян.
+    Возвращает False, если результат не удалось сохранить - задачу нельзя подтверждать.
+    """
     try:
-        url = f"{config.LARAVEL_API}/v1/print-callback"
-        headers = {
-            "Authorization": f"Bearer {config.LARAVEL_TOKEN}",
-            "Accept": "application/json",
-            "Content-Type": "application/json"
-        }
-
         # Используем job_id из результата, а не из глобального состояния
         data = {
             "job_id": result.get("job_id"),
             "status": result.get("status"),
             "error": result.get("error", "")
         }
+        if result.get("error_code"):
+            data["error_code"] = result["error_code"]
+        # Длительности этапов обработки задания (мс)
+        if result.get("timings"):
+            data["timings"] = result["timings"]
+        # Метаданные задания из предварительного разбора: страницы, размер, формат
+        if result.get("preflight"):
+            data["preflight"] = result["preflight"]
 
-        logger.info(f"Отправка callback для задачи {data['job_id']}: {data['status']}")
-
-        response = requests.post(url, json=data, headers=headers, timeout=10)
-
-        if response.status_code == 200:
-            logger.info(f"✅ Callback успешно отправлен для задачи {data['job_id']}")
-        else:
-            logger.error(f"❌ Ошибка callback: {response.status_code} {response.text}")
+        logger.info(f"Callback для задачи {data['job_id']} поставлен в очередь: {data['status']}")
+        callback_outbox.enqueue(data)
+        return True
 
-    except requests.exceptions.Timeout:
-        logger.error("⚠️ Timeout при отправке callback")
     except Exception as e:
-        logger.error(f"❌ Ошибка при отправке callback: {e}\n{traceback.format_exc()}")
+        logger.error(f"❌ Ошибка при сохранении callback: {e}\n{traceback.format_exc()}")
+        return False
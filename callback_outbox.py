@@ -0,0 +1,199 @@
+import json
+import sqlite3
+import threading
+import time
+
+from . import config
+from .http_client import http_client
+from .amqp_results import results_publisher, results_routing_key, amqp_results_enabled
+from .utils import setup_logger
+
+logger = setup_logger()
+
+class CallbackOutbox:
+    """
+    Надежная очередь результатов для Laravel.
+    Результат сохраняется в SQLite до подтверждения сообщения RabbitMQ,
+    фоновый поток отправляет накопленные результаты пачками с повторами.
+    """
+
+    def __init__(self, path: str, batch_size: int = 50, batch_window: float = 0.5,
+                 max_backoff: int = 300):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._db = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        # Поддерживает ли сервер пакетную отправку (None - еще не известно)
+        self._bulk_supported = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " payload TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " next_attempt REAL NOT NULL DEFAULT 0)"
+            )
+        return self._db
+
+    def enqueue(self, data: dict):
+        """Сохраняет результат на диск (вызывается до ack задачи)"""
+        payload = json.dumps(data, ensure_ascii=False, default=str)
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO outbox (payload, created) VALUES (?, ?)",
+                (payload, time.time())
+            )
+        self._wakeup.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def _due(self, limit: int) -> list:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT id, payload, attempts FROM outbox WHERE next_attempt <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+    def _delete(self, ids: list):
+        with self._lock:
+            self._connect().executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def _postpone(self, rows: list):
+        """Откладывает повтор с экспоненциальной задержкой"""
+        now = time.time()
+        with self._lock:
+            self._connect().executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                [(attempts + 1, now + min(2 ** attempts * 5, self.max_backoff), row_id)
+                 for row_id, _, attempts in rows]
+            )
+
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {config.LARAVEL_TOKEN}",
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        }
+
+    def _send_bulk(self, rows: list) -> bool:
+        """
+        Отправка пачки на /v1/print-callback/batch.
+        Возвращает False, если сервер не поддерживает пакетный метод.
+        """
+        url = f"{config.LARAVEL_API}/v1/print-callback/batch"
+        callbacks = [json.loads(payload) for _, payload, _ in rows]
+        response = http_client.post(url, endpoint="callback", json={"callbacks": callbacks}, headers=self._headers())
+        if response.status_code in (404, 405):
+            logger.warning("⚠️ Пакетная отправка callback не поддерживается сервером - отправляем по одному")
+            self._bulk_supported = False
+            return False
+        self._bulk_supported = True
+        if response.status_code == 200:
+            self._delete([row_id for row_id, _, _ in rows])
+            logger.info(f"✅ Отправлена пачка из {len(rows)} callback")
+        else:
+            logger.error(f"❌ Ошибка пакетного callback: {response.status_code} {response.text}")
+            self._postpone(rows)
+        return True
+
+    def _send_amqp(self, rows: list):
+        """Публикация пачки в обменник результатов с подтверждением брокера"""
+        callbacks = [json.loads(payload) for _, payload, _ in rows]
+        published = results_publisher.publish(
+            results_routing_key("result"),
+            {"worker_id": config.PRINTER_ID, "callbacks": callbacks}
+        )
+        if published:
+            self._delete([row_id for row_id, _, _ in rows])
+            logger.info(f"✅ Опубликована пачка из {len(rows)} результатов")
+        else:
+            self._postpone(rows)
+
+    def _send_single(self, rows: list):
+        url = f"{config.LARAVEL_API}/v1/print-callback"
+        for row in rows:
+            row_id, payload, _ = row
+            data = json.loads(payload)
+            try:
+                response = http_client.post(url, endpoint="callback", data=payload.encode(), headers=self._headers())
+            except Exception as e:
+                logger.error(f"❌ Ошибка при отправке callback для задачи {data.get('job_id')}: {e}")
+                self._postpone([row])
+                continue
+            if response.status_code == 200:
+                self._delete([row_id])
+                logger.info(f"✅ Callback успешно отправлен для задачи {data.get('job_id')}")
+            else:
+                logger.error(f"❌ Ошибка callback: {response.status_code} {response.text}")
+                self._postpone([row])
+
+    def flush_once(self) -> int:
+        """Отправляет одну пачку готовых к отправке результатов, возвращает их число"""
+        rows = self._due(self.batch_size)
+        if not rows:
+            return 0
+        try:
+            if amqp_results_enabled():
+                self._send_amqp(rows)
+            elif self._bulk_supported is False or not self._send_bulk(rows):
+                self._send_single(rows)
+        except Exception as e:
+            logger.error(f"❌ Ошибка отправки callback: {e}")
+            self._postpone(rows)
+        return len(rows)
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._connect().execute("SELECT MIN(next_attempt) FROM outbox").fetchone()
+        if row[0] is None:
+            return 60.0
+        return max(0.1, min(60.0, row[0] - time.time()))
+
+    def _run(self):
+        logger.info(f"📮 Отправка callback запущена (очередь: {self.path}, в ожидании: {self.pending_count()})")
+        while not self._stop.is_set():
+            self._wakeup.clear()
+            if self.flush_once():
+                continue
+            if self._wakeup.wait(self._next_due_in()) and not self._stop.is_set():
+                # Даем накопиться пачке
+                time.sleep(self.batch_window)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Останавливает фоновую отправку и пытается отправить остаток"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.flush_once():
+            pass
+        remaining = self.pending_count()
+        if remaining:
+            logger.warning(f"⚠️ Не отправлено callback: {remaining}, будут отправлены после перезапуска")
+
+# Общая очередь результатов воркера
+callback_outbox = CallbackOutbox(
+    config.CALLBACK_OUTBOX_PATH,
+    batch_size=config.CALLBACK_BATCH_SIZE
+)
@@ -15,18 +15,73 @@ DEFAULT_PRINTER = os.getenv("DEFAULT_PRINTER", "OfficePrinter")
 DEFAULT_METHOD = os.getenv("DEFAULT_METHOD", "raw")
 PRINTER_ID = os.getenv("PRINTER_ID", "raw")
 PRINTER = os.getenv("DEFAULT_PRINTER", '192.168.50.131')
+# Пул взаимозаменяемых принтеров CUPS для одной очереди (через запятую).
+# Если не задан - пул состоит из одного PRINTER
+PRINTER_POOL = [p.strip() for p in os.getenv("PRINTER_POOL", "").split(",") if p.strip()] or [PRINTER]
+# Предохранитель принтера: размыкается после N сбоев подряд, пробы - с удвоением интервала
+PRINTER_BREAKER_THRESHOLD = int(os.getenv("PRINTER_BREAKER_THRESHOLD", "3"))
+PRINTER_BREAKER_RESET = 5  # первая проба через N секунд
+PRINTER_BREAKER_MAX_RESET = 60  # максимальный интервал между пробами
+PRINTER_REGISTRY_TTL = 3600  # как часто перечитывать список принтеров и опции PPD (сек)
+CUPS_HEALTH_INTERVAL = 10  # интервал фоновой проверки здоровья CUPS (сек)
 DISABLE_PRINT = os.getenv("DISABLE_PRINT", "false").lower() == "true"
 DISABLE_SCAN = os.getenv("DISABLE_SCAN", "false").lower() == "true"   # Если True, сканирование отключается (для отладки)
 
 LOG_FILE = os.getenv("LOG_FILE", "/var/log/worker.log")
 LARAVEL_TOKEN = os.getenv("LARAVEL_TOKEN", "")
 
-HEARTBEAT_INTERVAL = 5
+# Очередь результатов для Laravel на диске (SQLite) и размер пачки отправки
+CALLBACK_OUTBOX_PATH = os.getenv(
+    "CALLBACK_OUTBOX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "callback_outbox.db")
+)
+CALLBACK_BATCH_SIZE = 50
+# Доставка результатов и heartbeat: "http" - в Laravel API, "amqp" - в обменник RabbitMQ
+RESULTS_TRANSPORT = os.getenv("RESULTS_TRANSPORT", "http").lower()
+RESULTS_EXCHANGE = os.getenv("RESULTS_EXCHANGE", "print_results")
+
+HEARTBEAT_INTERVAL = 5  # не собирать состояние воркера чаще, чем раз в N сек (при серии событий)
+HEARTBEAT_KEEPALIVE_INTERVAL = 60  # keep-alive, если состояние не менялось (сек)
+QUEUE_BACKLOG_INTERVAL = 15  # как часто узнавать размер очереди задач в RabbitMQ (сек)
+
+# Локальный HTTP API состояния воркера (GET /status), 0 - отключен
+STATUS_HOST = os.getenv("STATUS_HOST", "127.0.0.1")
+STATUS_PORT = int(os.getenv("STATUS_PORT", "0"))
+
+# Метрики Prometheus (GET /metrics): воркер печати отдает их на STATUS_PORT,
+# службы сканирования и загрузки - на своих портах, 0 - отключено
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+SCAN_METRICS_PORT = int(os.getenv("SCAN_METRICS_PORT", "9102"))
+UPLOAD_METRICS_PORT = int(os.getenv("UPLOAD_METRICS_PORT", "9103"))
+
+# Объединение мелких заданий (чеки, этикетки) в одну отправку CUPS.
+# PRINT_BATCH_WINDOW — окно ожидания в секундах, 0 — объединение отключено
+PRINT_BATCH_WINDOW = float(os.getenv("PRINT_BATCH_WINDOW", "0"))
+PRINT_BATCH_MAX_JOBS = int(os.getenv("PRINT_BATCH_MAX_JOBS", "10"))
+PRINT_BATCH_MAX_BYTES = int(os.getenv("PRINT_BATCH_MAX_BYTES", str(256 * 1024)))  # "мелкое" задание
+
+# Таймаут ожидания завершения печати по числу страниц (сек):
+# BASE + PER_PAGE * страниц, не больше MAX; DEFAULT - если страницы не определены
+PRINT_TIMEOUT_DEFAULT = 180
+PRINT_TIMEOUT_BASE = 30
+PRINT_TIMEOUT_PER_PAGE = int(os.getenv("PRINT_TIMEOUT_PER_PAGE", "6"))
+PRINT_TIMEOUT_MAX = 1800
 
 # Настройки сканера
 SCANNER_FORMAT = "pdf"  # pdf или png
 SCANNER_DPI = 300
 SCANNER_MODE = "Color"  # Color, Gray, Lineart
+SCANNER_BACKEND = os.getenv("SCANNER_BACKEND", "scanimage")  # scanimage, sane (python-sane) или fake
+FAKE_SCANNER_PAGES = 3  # листов в автоподатчике фейкового сканера
+SCANNER_CACHE_PATH = os.getenv("SCANNER_CACHE_PATH", "scanner_cache.json")  # найденные сканеры между перезапусками
+SCANNER_CACHE_TTL = 900  # через сколько секунд список сканеров перепроверяется (в фоне)
+SCANNER_KEEPALIVE_INTERVAL = 240  # запрос к готовому сканеру, чтобы не уснул (меньше таймера сна), сек
+SCANNER_READY_RETRY_INTERVAL = 30  # как часто перепроверять неготовый сканер, сек
+SCANNER_WAKE_DEADLINE = 30  # общее время на пробуждение сканера, сек
+SCANNER_WAKE_STAGGER = 2  # через сколько секунд подключать следующий способ пробуждения
+SCANNER_WAKE_STATS_PATH = "scanner_wake_stats.json"  # какие способы будили сканер
+SCAN_QUEUE_SIZE = 5  # сколько нажатий может ждать окончания текущего сканирования
+SCAN_COALESCE_WINDOW = 1.5  # нажатия чаще этого (двойное нажатие, удержание) считаются одним, сек
 
 # Укажите конкретные устройства
 # SCANNER_DEVICE = os.getenv("DEFAULT_SCANNER", '192.168.1.163') # Замените на ID вашего сканера из scanimage -L
@@ -67,6 +122,23 @@ SCANNER_ADF_OPTIONS = [
     # "--batch-increment=1" # инкремент страниц
 ]
 USE_AUTOMATIC_DOCUMENT_FEEDER = True  # Включить автоподатчик
+# Потоковый ADF: каждый лист сохраняется сразу после сканирования (scanimage --batch-print)
+ADF_STREAMING = True
+ADF_PAGE_TIMEOUT = 60  # сколько ждать очередной лист, сек
+SCAN_CONVERT_WORKERS = 0  # процессов конвертации листов, 0 - по числу ядер
+SCAN_COMPRESSION = True  # JPEG для Color/Gray, CCITT G4 для Lineart
+SCAN_JPEG_QUALITY = 75
+BLANK_PAGE_DETECTION = os.getenv("BLANK_PAGE_DETECTION", "true").lower() == "true"
+BLANK_PAGE_ACTION = os.getenv("BLANK_PAGE_ACTION", "flag")  # flag - сохранить пустой лист с пометкой, skip - не сохранять
+BLANK_PAGE_INK_THRESHOLD = float(os.getenv("BLANK_PAGE_INK_THRESHOLD", "0.0005"))  # доля пикселей с краской, ниже которой лист пустой (одна строка текста ~0.0013)
+BLANK_PAGE_MAX_STD = float(os.getenv("BLANK_PAGE_MAX_STD", "12"))  # допустимый разброс яркости пустого листа
+BLANK_PAGE_INK_DELTA = int(os.getenv("BLANK_PAGE_INK_DELTA", "60"))  # насколько пиксель темнее фона, чтобы считаться краской
+BLANK_PAGE_MARGIN = float(os.getenv("BLANK_PAGE_MARGIN", "0.05"))  # доля поля с каждой стороны, не учитываемая при анализе
+COLOR_DOWNGRADE = os.getenv("COLOR_DOWNGRADE", "true").lower() == "true"  # хранить цветные листы без цвета в Gray/Lineart
+COLOR_PIXEL_RATIO = float(os.getenv("COLOR_PIXEL_RATIO", "0.001"))  # доля цветных пикселей, ниже которой лист считается черно-белым
+COLOR_CHROMA_THRESHOLD = int(os.getenv("COLOR_CHROMA_THRESHOLD", "40"))  # разница каналов, с которой пиксель считается цветным
+COLOR_DOWNGRADE_BILEVEL = os.getenv("COLOR_DOWNGRADE_BILEVEL", "true").lower() == "true"  # листы без полутонов хранить в Lineart
+BILEVEL_MIDTONE_RATIO = float(os.getenv("BILEVEL_MIDTONE_RATIO", "0.01"))  # доля полутонов, ниже которой лист хранится в Lineart
 
 
 # Для установки зависимостей подсчета страниц PDF:
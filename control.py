@@ -0,0 +1,161 @@
+import threading
+from collections import OrderedDict
+
+from .utils import setup_logger, notify_state_change, request_full_state
+from .metrics import run_command
+
+logger = setup_logger()
+
+# Команды канала управления
+CMD_CANCEL = "cancel"
+CMD_PAUSE = "pause"
+CMD_RESUME = "resume"
+CMD_FULL_STATE = "full_state"  # прислать полное состояние в heartbeat
+
+class JobControl:
+    """
+    Состояние управления воркером: отмененные задания и пауза.
+    Команды приходят из отдельного потока канала управления,
+    проверки выполняются потоком печати - все операции под блокировкой.
+    """
+
+    def __init__(self, max_cancelled: int = 1000):
+        self._lock = threading.Lock()
+        self._cancelled = OrderedDict()  # job_id -> True (ограниченный по размеру набор)
+        self._max_cancelled = max_cancelled
+        self._resumed = threading.Event()
+        self._resumed.set()
+        # Задание, которое печатается сейчас: job_id, принтер и id задания CUPS
+        self._current_job_id = None
+        self._current_printer = None
+        self._current_cups_job_id = None
+        self._cancel_event = threading.Event()
+
+    # --- Отмена заданий ---
+
+    def is_cancelled(self, job_id) -> bool:
+        if job_id is None:
+            return False
+        with self._lock:
+            return str(job_id) in self._cancelled
+
+    def forget(self, job_id):
+        """Убирает задание из набора отмененных (после того как его пропустили)"""
+        with self._lock:
+            self._cancelled.pop(str(job_id), None)
+
+    def begin_job(self, job_id):
+        """Задание взято в работу"""
+        with self._lock:
+            self._current_job_id = str(job_id) if job_id is not None else None
+            self._current_printer = None
+            self._current_cups_job_id = None
+            self._cancel_event.clear()
+
+    def attach_cups_job(self, printer: str, cups_job_id: str):
+        """Запоминает id задания CUPS текущего задания (для Cancel-Job)"""
+        with self._lock:
+            if self._current_job_id is None:
+                return
+            self._current_printer = printer
+            self._current_cups_job_id = cups_job_id
+            cancelled = self._current_job_id in self._cancelled
+        # Отмена пришла, пока задание отправлялось в CUPS
+        if cancelled:
+            cancel_cups_job(printer, cups_job_id)
+
+    def end_job(self):
+        with self._lock:
+            self._current_job_id = None
+            self._current_printer = None
+            self._current_cups_job_id = None
+            self._cancel_event.clear()
+
+    def current_cancelled(self) -> bool:
+        """Отменено ли задание, которое печатается сейчас"""
+        return self._cancel_event.is_set()
+
+    def wait_cancelled(self, timeout: float) -> bool:
+        """Ожидание с немедленным выходом при отмене текущего задания"""
+        return self._cancel_event.wait(timeout)
+
+    def cancel(self, job_id):
+        """Отменяет задание: в печати - через CUPS, в очереди - будет пропущено"""
+        job_id = str(job_id)
+        with self._lock:
+            self._cancelled[job_id] = True
+            self._cancelled.move_to_end(job_id)
+            while len(self._cancelled) > self._max_cancelled:
+                self._cancelled.popitem(last=False)
+            in_flight = job_id == self._current_job_id
+            printer, cups_job_id = self._current_printer, self._current_cups_job_id
+            if in_flight:
+                self._cancel_event.set()
+
+        if in_flight and cups_job_id:
+            logger.warning(f"🛑 Отмена задания {job_id} в печати (CUPS {cups_job_id})")
+            cancel_cups_job(printer, cups_job_id)
+        elif in_flight:
+            logger.warning(f"🛑 Отмена задания {job_id} до отправки в CUPS")
+        else:
+            logger.warning(f"🛑 Задание {job_id} будет пропущено")
+
+    # --- Пауза ---
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def pause(self):
+        if not self.paused:
+            logger.warning("⏸️ Воркер поставлен на паузу - новые задания не берутся")
+        self._resumed.clear()
+        notify_state_change()
+
+    def resume(self):
+        if self.paused:
+            logger.info("▶️ Воркер снят с паузы")
+        self._resumed.set()
+        notify_state_change()
+
+    def wait_resumed(self, timeout: float) -> bool:
+        return self._resumed.wait(timeout)
+
+    def handle_command(self, command: dict):
+        """Выполняет команду канала управления"""
+        name = command.get("command")
+        if name == CMD_CANCEL:
+            job_id = command.get("job_id")
+            if job_id is None:
+                logger.warning(f"Команда отмены без job_id: {command}")
+                return
+            self.cancel(job_id)
+        elif name == CMD_PAUSE:
+            self.pause()
+        elif name == CMD_RESUME:
+            self.resume()
+        elif name == CMD_FULL_STATE:
+            request_full_state()
+        else:
+            logger.warning(f"Неизвестная команда управления: {command}")
+
+def cancel_cups_job(printer: str, cups_job_id: str) -> bool:
+    """IPP Cancel-Job для задания CUPS"""
+    try:
+        result = run_command(
+            ["cancel", cups_job_id],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        if result.returncode != 0:
+            logger.error(f"❌ Не удалось отменить задание CUPS {cups_job_id} ({printer}): {result.stderr.strip()}")
+            return False
+        logger.info(f"✅ Задание CUPS {cups_job_id} ({printer}) отменено")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Ошибка отмены задания CUPS {cups_job_id}: {e}")
+        return False
+
+# Глобальное состояние управления воркером
+job_control = JobControl()
@@ -0,0 +1,177 @@
+import threading
+
+from . import config
+from .breaker import CircuitBreaker
+from .printer_registry import printer_registry
+from .restart_cups import restart_cups_service
+from .utils import setup_logger, get_printer_status, notify_state_change
+from .metrics import run_command
+
+logger = setup_logger()
+
+# Предохранители принтеров: общие для потребителя очереди и проверок готовности
+_printer_breakers = {}
+_printer_breakers_lock = threading.Lock()
+
+def printer_breaker(printer: str) -> CircuitBreaker:
+    """Предохранитель принтера (создается при первом обращении)"""
+    with _printer_breakers_lock:
+        breaker = _printer_breakers.get(printer)
+        if breaker is None:
+            breaker = _printer_breakers[printer] = CircuitBreaker(
+                f"printer:{printer}",
+                failure_threshold=config.PRINTER_BREAKER_THRESHOLD,
+                reset_timeout=config.PRINTER_BREAKER_RESET,
+                max_reset_timeout=config.PRINTER_BREAKER_MAX_RESET
+            )
+        return breaker
+
+class CupsSupervisor:
+    """
+    Фоновый контроль здоровья CUPS.
+    Периодически проверяет планировщик и наличие принтеров, выполняет
+    восстановление вне пути печати и публикует состояние готовности.
+    """
+
+    def __init__(self, interval: int = 10):
+        self.interval = interval
+        self.breaker = CircuitBreaker("cups", failure_threshold=3, reset_timeout=30)
+        self._recovery_requested = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_ready(self) -> bool:
+        """Готов ли CUPS принимать задания (без обращения к CUPS)"""
+        return self.breaker.is_closed()
+
+    def request_recovery(self):
+        """Просит фоновый поток выполнить восстановление как можно скорее"""
+        if not self._recovery_requested.is_set():
+            logger.warning("⚠️ Запрошено фоновое восстановление CUPS")
+        self._recovery_requested.set()
+
+    def check_health(self) -> bool:
+        """Планировщик CUPS работает и хотя бы один принтер пула известен CUPS"""
+        try:
+            result = run_command(
+                ["lpstat", "-r"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode != 0 or "not running" in result.stdout.lower():
+                logger.warning(f"⚠️ Планировщик CUPS не отвечает: {result.stdout.strip() or result.stderr.strip()}")
+                return False
+        except Exception as e:
+            logger.warning(f"⚠️ Ошибка проверки планировщика CUPS: {e}")
+            return False
+
+        if not any(printer_registry.has_printer(printer) for printer in config.PRINTER_POOL):
+            printer_registry.invalidate()
+            logger.warning("⚠️ Ни один принтер пула не найден в CUPS")
+            return False
+
+        return True
+
+    def probe_printers(self):
+        """
+        Пробы принтеров с полуразомкнутым предохранителем.
+        Используется дешевый lpstat -p, чтобы восстановление замечалось за секунды.
+        """
+        for printer in config.PRINTER_POOL:
+            breaker = printer_breaker(printer)
+            if breaker.state != breaker.HALF_OPEN or not breaker.allow_request():
+                continue
+
+            status = get_printer_status(printer)
+            healthy = (
+                status["raw_status"] and not status["raw_status"].startswith("error:") and
+                status["online"] and not status["paused"] and
+                not status["paper_out"] and not status["door_open"]
+            )
+            if healthy:
+                logger.info(f"✅ Принтер {printer} снова доступен - предохранитель замкнут")
+                breaker.record_success()
+                notify_state_change()
+            else:
+                breaker.record_failure()
+                logger.info(f"⏳ Принтер {printer} все еще недоступен, следующая проба через "
+                            f"{breaker.retry_after():.0f} сек")
+
+    def next_wait(self) -> float:
+        """Пауза до следующей проверки: короче, если ждет проба принтера"""
+        wait = self.interval
+        for printer in config.PRINTER_POOL:
+            breaker = printer_breaker(printer)
+            if not breaker.is_closed():
+                wait = min(wait, max(1.0, breaker.retry_after()))
+        return wait
+
+    def _recovery_due(self, requested: bool) -> bool:
+        """
+        Учитывает неудачную проверку и решает, нужно ли восстановление.
+        Пока предохранитель разомкнут, перезапуск CUPS выполняется не чаще одного
+        раза за цикл open/half_open: при размыкании и при пробе в half_open,
+        интервал между пробами растет вместе с таймаутом предохранителя.
+        """
+        state = self.breaker.state
+        probe = state == self.breaker.HALF_OPEN and self.breaker.allow_request()
+        self.breaker.record_failure()
+        opened = state == self.breaker.CLOSED and not self.breaker.is_closed()
+        # Запросы из пути печати при разомкнутом предохранителе не добавляют перезапусков
+        return opened or probe or (requested and state == self.breaker.CLOSED)
+
+    def recover(self):
+        """Восстановление служб печати (вне пути выполнения задания)"""
+        logger.info("🔄 Фоновое восстановление служб печати...")
+        restart_cups_service(logger.info, force=False)
+        printer_registry.invalidate()
+
+    def check_once(self):
+        """Одна итерация контроля: проверка CUPS, восстановление при необходимости, пробы принтеров"""
+        recovery_requested = self._recovery_requested.is_set()
+        self._recovery_requested.clear()
+
+        was_ready = self.breaker.is_closed()
+        if self.check_health():
+            if not was_ready:
+                logger.info("✅ CUPS снова готов к печати")
+            self.breaker.record_success()
+            run_recovery = recovery_requested
+        else:
+            run_recovery = self._recovery_due(recovery_requested)
+        if self.breaker.is_closed() != was_ready:
+            # Готовность CUPS изменилась - heartbeat пересоберет состояние
+            notify_state_change()
+
+        if run_recovery:
+            try:
+                self.recover()
+            except Exception as e:
+                logger.error(f"❌ Ошибка фонового восстановления CUPS: {e}")
+
+        try:
+            self.probe_printers()
+        except Exception as e:
+            logger.error(f"❌ Ошибка пробы принтеров: {e}")
+
+    def _run(self):
+        logger.info(f"🩺 Контроль CUPS запущен (интервал {self.interval} сек)")
+        while not self._stop.is_set():
+            self.check_once()
+            # Ждем интервал или внеочередной запрос восстановления
+            self._recovery_requested.wait(self.next_wait())
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._recovery_requested.set()
+
+# Глобальный контролер CUPS
+cups_supervisor = CupsSupervisor(interval=config.CUPS_HEALTH_INTERVAL)
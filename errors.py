@@ -0,0 +1,85 @@
+"""
+Коды ошибок печати.
+Коды состояния принтера берутся из IPP printer-state-reasons (RFC 8011),
+остальные описывают причины отказа lp и сбои самого воркера.
+"""
+
+# Состояние принтера (printer-state-reasons)
+MEDIA_EMPTY = "media-empty"
+MEDIA_JAM = "media-jam"
+DOOR_OPEN = "door-open"
+PAUSED = "paused"
+OFFLINE = "offline"
+TONER_EMPTY = "toner-empty"
+PRINTER_BUSY = "printer-busy"
+NOT_READY = "not-ready"
+
+# CUPS и lp
+PRINTER_NOT_FOUND = "printer-not-found"
+REJECTING_JOBS = "rejecting-jobs"
+CUPS_UNAVAILABLE = "cups-unavailable"
+CIRCUIT_OPEN = "circuit-open"
+CUPS_ERROR = "cups-error"
+SUBMIT_TIMEOUT = "submit-timeout"
+COMPLETION_TIMEOUT = "completion-timeout"
+
+# Само задание и воркер
+CANCELLED = "cancelled"
+NO_CONTENT = "no-content"
+UNSUPPORTED_OPTIONS = "unsupported-options"
+INTERNAL_ERROR = "internal-error"
+
+# Неисправность конкретного принтера до приема задания CUPS - задание можно отправить
+# на другой принтер пула (таймаут lp сюда не входит: задание могло попасть в очередь)
+PRINTER_FAULT_CODES = {
+    MEDIA_EMPTY, MEDIA_JAM, DOOR_OPEN, PAUSED, OFFLINE, TONER_EMPTY, NOT_READY,
+    PRINTER_NOT_FOUND, REJECTING_JOBS, CUPS_ERROR,
+}
+
+# printer-state-reasons (без суффиксов -error/-warning/-report) -> код ошибки
+STATE_REASON_CODES = {
+    "media-empty": MEDIA_EMPTY,
+    "media-needed": MEDIA_EMPTY,
+    "input-tray-missing": MEDIA_EMPTY,
+    "media-jam": MEDIA_JAM,
+    "door-open": DOOR_OPEN,
+    "cover-open": DOOR_OPEN,
+    "interlock-open": DOOR_OPEN,
+    "paused": PAUSED,
+    "offline": OFFLINE,
+    "shutdown": OFFLINE,
+    "connecting-to-device": OFFLINE,
+    "timed-out": OFFLINE,
+    "toner-empty": TONER_EMPTY,
+    "marker-supply-empty": TONER_EMPTY,
+}
+
+class PrintError(Exception):
+    """Ошибка печати с машинным кодом для выбора политики повторов"""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+def code_from_state_reasons(reasons):
+    """Первый известный код из списка printer-state-reasons (или None)"""
+    for reason in reasons or []:
+        code = STATE_REASON_CODES.get(reason)
+        if code:
+            return code
+    return None
+
+def code_from_status(status: dict):
+    """Код ошибки по статусу принтера из get_detailed_printer_status"""
+    code = code_from_state_reasons(status.get("state_reasons"))
+    if code:
+        return code
+    if status.get("paused"):
+        return PAUSED
+    if status.get("paper_out"):
+        return MEDIA_EMPTY
+    if status.get("door_open"):
+        return DOOR_OPEN
+    if not status.get("online"):
+        return OFFLINE
+    return None
@@ -1,47 +1,160 @@
+import hashlib
+import json
 import threading
 import time
 from datetime import datetime, timezone
-import requests
 from . import config
-from .utils import get_printer_status, get_detailed_printer_status, get_current_job_id
+from .utils import (get_printer_status, get_detailed_printer_status, get_current_job_id,
+                    state_changed, full_state_requested)
+from .metrics import stage_summary, inc_counter
+from .http_client import http_client
+from .amqp_results import results_publisher, results_routing_key, amqp_results_enabled
+from .control import job_control
+from .printer import throughput_status
+from .rabbit import get_queue_backlog
+
+
+def collect_status(include_throughput: bool = True) -> dict:
+    """
+    Состояние воркера для heartbeat и локального API состояния.
+    include_throughput=False - без расчета скорости и ETA (нужны только в полном состоянии)
+    """
+    printer_worker = config.PRINTER
+    status = get_detailed_printer_status(printer_worker)
+    job_id = get_current_job_id()
+
+    state = {
+        "worker_id": config.PRINTER_ID,
+        "printer_id": printer_worker,
+        "job_id": job_id,
+        "paused": job_control.paused,
+        "printer_status": status,
+        "stage_latency": stage_summary(),
+        "http_client": http_client.metrics(),
+        "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    }
+    if include_throughput:
+        state["throughput"] = throughput_status(get_queue_backlog(), {printer_worker: status})
+    return state
+
+
+# Поля, не влияющие на хеш состояния: меняются постоянно и уходят только в полном состоянии
+VOLATILE_FIELDS = ("timestamp", "stage_latency", "http_client", "throughput")
+
+
+def state_hash(state: dict) -> str:
+    """Хеш значимой части состояния"""
+    significant = {key: value for key, value in state.items() if key not in VOLATILE_FIELDS}
+    encoded = json.dumps(significant, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode()).hexdigest()
+
+
+def state_delta(old: dict, new: dict) -> dict:
+    """Изменившиеся поля (вложенные словари сравниваются по ключам, удаленные - None)"""
+    delta = {}
+    for key in set(old) | set(new):
+        if key in VOLATILE_FIELDS or old.get(key) == new.get(key):
+            continue
+        if isinstance(old.get(key), dict) and isinstance(new.get(key), dict):
+            delta[key] = state_delta(old[key], new[key])
+        else:
+            delta[key] = new.get(key)
+    return delta
+
+
+def deliver_heartbeat(data: dict):
+    """
+    Доставляет heartbeat в Laravel API или в обменник результатов.
+    Возвращает (доставлен, нужно ли следующим отправить полное состояние).
+    """
+    if amqp_results_enabled():
+        # Полное состояние сервер запрашивает командой full_state канала управления
+        delivered = results_publisher.publish(results_routing_key("heartbeat"), data, timeout=5)
+        return delivered, not delivered
+
+    r = http_client.post(
+        f"{config.LARAVEL_API}/v1/worker-status",
+        endpoint="heartbeat",
+        json=data,
+        headers={"Authorization": f"Bearer {config.LARAVEL_TOKEN}"}
+    )
+    if r.status_code == 200:
+        # Хеш на сервере разошелся с нашим - он просит полное состояние
+        try:
+            return True, bool(r.json().get("full_state_required"))
+        except ValueError:
+            return True, False
+    if r.status_code != 409:
+        print(f"[heartbeat] Ошибка {r.status_code}: {r.text}")
+    # Сервер мог не принять дельту - следующим отправляем полное состояние
+    return False, True
 
 
 def send_heartbeat(logger=None):
+    """
+    Heartbeat по изменениям: при изменении состояния сразу отправляется дельта,
+    иначе - короткий keep-alive раз в HEARTBEAT_KEEPALIVE_INTERVAL.
+    Каждое сообщение несет порядковый номер и хеш полного состояния; полное
+    состояние отправляется при старте, после ошибки отправки и по запросу сервера.
+    Состояние (и опрос CUPS) собирается только по событию state_changed
+    (смена задания, пауза, здоровье CUPS) и раз в интервал keep-alive.
+    """
+    log = logger.info if logger else print
+    log_error = logger.error if logger else print
+
+    seq = 0
+    last_sent = None  # состояние, известное серверу
+    last_hash = None
+    last_sent_at = 0.0
+    full_required = True
+    last_collected_at = 0.0
+
     while True:
         try:
-            printer_worker = config.PRINTER
-            url = f"{config.LARAVEL_API}/v1/worker-status"
-            status = get_detailed_printer_status(printer_worker)
-            job_id = get_current_job_id()
+            # Не собираем состояние чаще HEARTBEAT_INTERVAL при серии событий
+            since_collected = time.monotonic() - last_collected_at
+            if since_collected < config.HEARTBEAT_INTERVAL:
+                time.sleep(config.HEARTBEAT_INTERVAL - since_collected)
+            state_changed.clear()
+            if full_state_requested.is_set():
+                full_state_requested.clear()
+                full_required = True
+            state = collect_status(include_throughput=full_required or last_sent is None)
+            last_collected_at = time.monotonic()
+            current_hash = state_hash(state)
+            now = time.monotonic()
 
             data = {
                 "worker_id": config.PRINTER_ID,
-                "printer_id": printer_worker,
-                "job_id": job_id,
-                "printer_status": status,
-                "timestamp": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+                "seq": seq + 1,
+                "state_hash": current_hash,
+                "timestamp": state["timestamp"]
             }
+            if full_required or last_sent is None:
+                data.update({"type": "full", "state": state})
+            elif current_hash != last_hash:
+                data.update({"type": "delta", "base_hash": last_hash, "delta": state_delta(last_sent, state)})
+            elif now - last_sent_at >= config.HEARTBEAT_KEEPALIVE_INTERVAL:
+                data["type"] = "keepalive"
+            else:
+                data = None
 
-            r = requests.post(
-                url,
-                json=data,
-                headers={"Authorization": f"Bearer {config.LARAVEL_TOKEN}"},
-                timeout=5
-            )
-
-            if r.status_code != 200:
-                print(f"[heartbeat] Ошибка {r.status_code}: {r.text}")
+            if data is not None:
+                delivered, full_required = deliver_heartbeat(data)
+                inc_counter("heartbeats_total", 1, "Отправленные heartbeat", type=data["type"],
+                            delivered=str(delivered).lower())
+                seq += 1
+                last_sent_at = now
+                if delivered:
+                    last_sent, last_hash = state, current_hash
 
-            if logger:
-                logger.info(f"Отправлен heartbeat: {data}")
-            else:
-                print(f"Отправлен heartbeat: {data}")
+                log(f"Отправлен heartbeat #{seq} ({data['type']}): {data.get('state') or data.get('delta') or current_hash}")
         except Exception as e:
-            if logger:
-                logger.error(f"Ошибка heartbeat: {e}")
-            else:
-                print(f"Ошибка heartbeat: {e}")
-        time.sleep(config.HEARTBEAT_INTERVAL)
+            full_required = True
+            log_error(f"Ошибка heartbeat: {e}")
+
+        # Ждем события изменения состояния; без событий - проверка в срок keep-alive
+        state_changed.wait(config.HEARTBEAT_KEEPALIVE_INTERVAL)
 
 
 def start_heartbeat_thread(logger=None):
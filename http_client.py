@@ -0,0 +1,143 @@
+"""
+Общий HTTP-клиент процесса для запросов к Laravel API.
+Соединения переиспользуются (keep-alive), у каждого вида запросов свои
+таймауты и политика повторов, длительности запросов собираются в гистограммы.
+Используется как воркером печати, так и службами сканирования.
+"""
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    from .metrics import Histogram, inc_counter, observe_histogram
+except ImportError:
+    from metrics import Histogram, inc_counter, observe_histogram
+
+# Политики по видам запросов:
+#   timeout - (подключение, чтение) в секундах
+#   retries - повторы при ошибке подключения и ответах RETRY_STATUSES
+#   retry_status - повторять ли при ответах RETRY_STATUSES (по умолчанию да)
+ENDPOINT_POLICIES = {
+    # Следующий heartbeat уйдет через несколько секунд - не повторяем
+    "heartbeat": {"timeout": (3, 5), "retries": 0},
+    "callback": {"timeout": (3, 10), "retries": 3},
+    # Ошибка шлюза могла прийти после сохранения файла сервером - повтор сохранил бы
+    # скан дважды; такие ответы повторяет UploadService со своей задержкой
+    "scan_upload": {"timeout": (5, 60), "retries": 2, "retry_status": False},
+}
+DEFAULT_POLICY = {"timeout": (3, 30), "retries": 1}
+RETRY_STATUSES = (502, 503, 504)
+
+def _make_retry(retries: int, backoff_factor: float, retry_status: bool = True) -> Retry:
+    kwargs = {
+        "total": retries,
+        "connect": retries,
+        "read": 0,  # запрос мог быть выполнен сервером - не повторяем
+        "status": retries if retry_status else 0,
+        "backoff_factor": backoff_factor,
+        "status_forcelist": RETRY_STATUSES if retry_status else (),
+        "raise_on_status": False,
+    }
+    try:
+        return Retry(allowed_methods=frozenset(["GET", "POST"]), **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=frozenset(["GET", "POST"]), **kwargs)
+
+class HttpClient:
+    """Пул HTTP-соединений с политиками по видам запросов и метриками"""
+
+    def __init__(self, pool_maxsize: int = 4, backoff_factor: float = 0.5):
+        self.pool_maxsize = pool_maxsize
+        self.backoff_factor = backoff_factor
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._stats = {}
+
+    def _policy(self, endpoint: str) -> dict:
+        return ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+
+    def _session(self, endpoint: str) -> requests.Session:
+        """Сессия вида запросов (создается при первом обращении)"""
+        with self._lock:
+            session = self._sessions.get(endpoint)
+            if session is None:
+                policy = self._policy(endpoint)
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=_make_retry(policy["retries"], self.backoff_factor,
+                                            policy.get("retry_status", True))
+                )
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[endpoint] = session
+            return session
+
+    def _record(self, endpoint: str, seconds: float, status=None, error: bool = False):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {
+                    "requests": 0,
+                    "errors": 0,
+                    "statuses": {},
+                    "latency": Histogram(f"http_{endpoint}")
+                }
+            stats["requests"] += 1
+            if error:
+                stats["errors"] += 1
+            if status is not None:
+                stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+        stats["latency"].observe(seconds)
+        observe_histogram("http_request_duration_seconds", seconds, "Длительность HTTP-запросов", endpoint=endpoint)
+        inc_counter("http_requests_total", 1, "HTTP-запросы", endpoint=endpoint,
+                    status=str(status) if status is not None else "error")
+
+    def request(self, method: str, url: str, endpoint: str = "default", **kwargs) -> requests.Response:
+        """Запрос с таймаутом и повторами вида endpoint"""
+        kwargs.setdefault("timeout", self._policy(endpoint)["timeout"])
+        started = time.monotonic()
+        try:
+            response = self._session(endpoint).request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(endpoint, time.monotonic() - started, error=True)
+            raise
+        self._record(endpoint, time.monotonic() - started, status=response.status_code,
+                     error=response.status_code >= 500)
+        return response
+
+    def post(self, url: str, endpoint: str = "default", **kwargs) -> requests.Response:
+        return self.request("POST", url, endpoint=endpoint, **kwargs)
+
+    def get(self, url: str, endpoint: str = "default", **kwargs) -> requests.Response:
+        return self.request("GET", url, endpoint=endpoint, **kwargs)
+
+    def metrics(self) -> dict:
+        """Счетчики и длительности запросов по видам"""
+        with self._lock:
+            stats = {endpoint: dict(values, statuses=dict(values["statuses"]))
+                     for endpoint, values in self._stats.items()}
+        return {
+            endpoint: {
+                "requests": values["requests"],
+                "errors": values["errors"],
+                "statuses": values["statuses"],
+                "latency": values["latency"].summary()
+            }
+            for endpoint, values in stats.items()
+        }
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+# Общий HTTP-клиент процесса
+http_client = HttpClient()
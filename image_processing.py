@@ -0,0 +1,198 @@
+"""
+Обработка изображений листов перед сохранением в PDF.
+Сжатие выбирается по режиму сканирования: JPEG для Color и Gray,
+CCITT G4 для Lineart. img2pdf встраивает JPEG и G4 в PDF без перекодирования.
+Пустые и черно-белые листы определяются по уменьшенной копии изображения (NumPy).
+"""
+
+import io
+import os
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+    print("⚠️  Pillow не установлен, сканы сохраняются без сжатия. Установите: pip install Pillow")
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    print("⚠️  NumPy не установлен, пустые листы не определяются. Установите: pip install numpy")
+
+import config
+
+CODEC_JPEG = "jpeg"
+CODEC_CCITT_G4 = "ccitt_g4"
+CODEC_NONE = "png"
+
+# Режимы SANE (у разных драйверов названия отличаются)
+BILEVEL_MODES = ("lineart", "binary", "halftone", "black & white")
+GRAY_MODES = ("gray", "grey", "grayscale", "gray8")
+
+def codec_for_mode(mode: str) -> str:
+    """Кодек сжатия для режима сканирования"""
+    if not getattr(config, 'SCAN_COMPRESSION', True):
+        return CODEC_NONE
+    mode = (mode or "").lower()
+    if mode in BILEVEL_MODES:
+        return CODEC_CCITT_G4
+    if mode in GRAY_MODES or mode == "color":
+        return CODEC_JPEG
+    return CODEC_NONE
+
+# Размер уменьшенной копии для анализа листа (по длинной стороне)
+ANALYSIS_SIZE = 512
+
+# Что делать с пустыми листами
+BLANK_SKIP = "skip"  # не сохранять и не загружать
+BLANK_FLAG = "flag"  # сохранить с пометкой blank в метаданных
+
+def _load_preview(image_path: str, color: bool = False):
+    """
+    Уменьшенная копия листа без полей: массив 0..255,
+    (высота, ширина, 3) для цветной копии или (высота, ширина) для серой.
+    """
+    target = "RGB" if color else "L"
+    with Image.open(image_path) as image:
+        image.draft(target, (ANALYSIS_SIZE, ANALYSIS_SIZE))
+        image = image.convert(target)
+        image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+        pixels = np.asarray(image, dtype=np.float32)
+
+    # Отрезаем поля: тени и край листа у автоподатчика дают ложную "краску"
+    margin = getattr(config, 'BLANK_PAGE_MARGIN', 0.05)
+    height, width = pixels.shape[:2]
+    dy, dx = int(height * margin), int(width * margin)
+    if height - 2 * dy > 0 and width - 2 * dx > 0:
+        pixels = pixels[dy:height - dy, dx:width - dx]
+    return pixels
+
+def _to_gray(pixels):
+    """Яркость цветной копии (ITU-R 601-2, как convert("L") в Pillow)"""
+    if pixels.ndim == 2:
+        return pixels
+    return pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+def detect_blank_page(image_path: str, preview=None) -> dict:
+    """
+    Проверяет, пустой ли лист.
+    Краска - пиксели заметно темнее фона (медианы листа), лист пустой, если доля
+    краски меньше BLANK_PAGE_INK_THRESHOLD и разброс яркости меньше BLANK_PAGE_MAX_STD.
+    Без NumPy/Pillow лист всегда считается непустым.
+    """
+    if np is None or Image is None or not getattr(config, 'BLANK_PAGE_DETECTION', True):
+        return {"blank": False, "checked": False}
+
+    pixels = _to_gray(preview if preview is not None else _load_preview(image_path))
+    background = float(np.median(pixels))
+    ink_delta = getattr(config, 'BLANK_PAGE_INK_DELTA', 60)
+    ink_coverage = float(np.count_nonzero(pixels < background - ink_delta)) / pixels.size
+    std = float(pixels.std())
+
+    blank = (ink_coverage < getattr(config, 'BLANK_PAGE_INK_THRESHOLD', 0.0005)
+             and std < getattr(config, 'BLANK_PAGE_MAX_STD', 12))
+    return {
+        "blank": blank,
+        "checked": True,
+        "ink_coverage": round(ink_coverage, 5),
+        "std": round(std, 2)
+    }
+
+def detect_page_mode(image_path: str, mode: str, preview=None) -> dict:
+    """
+    Определяет, в каком режиме достаточно хранить цветной лист.
+    Цветность пикселя - разница максимального и минимального канала; если цветных
+    пикселей меньше COLOR_PIXEL_RATIO, лист хранится в Gray, а если к тому же почти
+    нет полутонов (текст без иллюстраций) - в Lineart.
+    Листы, отсканированные не в Color, не меняются.
+    """
+    if (np is None or Image is None or (mode or "").lower() != "color"
+            or not getattr(config, 'COLOR_DOWNGRADE', True)):
+        return {"mode": mode, "checked": False}
+
+    pixels = preview if preview is not None and preview.ndim == 3 else _load_preview(image_path, color=True)
+    chroma = pixels.max(axis=2) - pixels.min(axis=2)
+    color_ratio = float(np.count_nonzero(chroma > getattr(config, 'COLOR_CHROMA_THRESHOLD', 40))) / chroma.size
+
+    gray = _to_gray(pixels)
+    midtone_ratio = float(np.count_nonzero((gray > 64) & (gray < 192))) / gray.size
+
+    effective_mode = mode
+    if color_ratio < getattr(config, 'COLOR_PIXEL_RATIO', 0.001):
+        bilevel = (getattr(config, 'COLOR_DOWNGRADE_BILEVEL', True)
+                   and midtone_ratio < getattr(config, 'BILEVEL_MIDTONE_RATIO', 0.01))
+        effective_mode = "Lineart" if bilevel else "Gray"
+
+    return {
+        "mode": effective_mode,
+        "checked": True,
+        "color_ratio": round(color_ratio, 5),
+        "midtone_ratio": round(midtone_ratio, 5)
+    }
+
+def analyze_page(image_path: str, mode: str):
+    """
+    Проверка листа на пустоту и выбор режима хранения по одной уменьшенной копии.
+    Возвращает (результат detect_blank_page, результат detect_page_mode).
+    """
+    preview = None
+    if np is not None and Image is not None:
+        preview = _load_preview(image_path, color=(mode or "").lower() == "color")
+    blank_check = detect_blank_page(image_path, preview)
+    if blank_check["blank"]:
+        return blank_check, {"mode": mode, "checked": False}
+    return blank_check, detect_page_mode(image_path, mode, preview)
+
+def blank_page_action() -> str:
+    action = getattr(config, 'BLANK_PAGE_ACTION', BLANK_FLAG)
+    return action if action in (BLANK_SKIP, BLANK_FLAG) else BLANK_FLAG
+
+def compress_image(image_path: str, mode: str, dpi: int = None):
+    """
+    Сжимает изображение листа по режиму сканирования.
+    Возвращает (данные изображения для img2pdf, сведения о сжатии).
+    Если сжатие недоступно или не уменьшает файл - возвращается исходное изображение.
+    """
+    original_bytes = os.path.getsize(image_path)
+    codec = codec_for_mode(mode) if Image is not None else CODEC_NONE
+
+    data = None
+    if codec != CODEC_NONE:
+        with Image.open(image_path) as image:
+            resolution = image.info.get("dpi") or ((dpi, dpi) if dpi else None)
+            save_options = {"dpi": resolution} if resolution else {}
+            buffer = io.BytesIO()
+            if codec == CODEC_JPEG:
+                target = "L" if (mode or "").lower() in GRAY_MODES or image.mode in ("1", "L") else "RGB"
+                image.convert(target).save(
+                    buffer, "JPEG",
+                    quality=getattr(config, 'SCAN_JPEG_QUALITY', 75),
+                    optimize=True,
+                    **save_options
+                )
+            else:
+                # Порог без растрирования: для текста растр только добавляет шум
+                image.convert("L").convert("1", dither=0).save(buffer, "TIFF", compression="group4", **save_options)
+            data = buffer.getvalue()
+
+    if data is None or len(data) >= original_bytes:
+        codec = CODEC_NONE
+        with open(image_path, "rb") as f:
+            data = f.read()
+
+    return data, {
+        "codec": codec,
+        "original_bytes": original_bytes,
+        "compressed_bytes": len(data),
+        "ratio": round(original_bytes / len(data), 2) if data else None
+    }
+
+def image_to_pdf(image_path: str, pdf_path: str, mode: str, dpi: int = None) -> dict:
+    """Сжимает изображение листа и сохраняет его как PDF. Возвращает сведения о сжатии"""
+    import img2pdf
+
+    data, compression = compress_image(image_path, mode, dpi)
+    with open(pdf_path, "wb") as f:
+        f.write(img2pdf.convert(data))
+    return compression
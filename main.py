@@ -15,6 +15,7 @@ sys.path.insert(0, current_dir)
 # Импортируем наши модули
 from scanner import scanner_manager
 from scan_uploader import scan_uploader
+from metrics import start_metrics_server
 import config
 
 # Глобальные переменные для evdev (будут установлены при необходимости)
@@ -489,6 +490,10 @@ class ScannerApp:
         
         self.is_running = True
 
+        # Метрики службы сканирования (GET /metrics)
+        if start_metrics_server(config.METRICS_HOST, config.SCAN_METRICS_PORT):
+            print(f"📊 Метрики: http://{config.METRICS_HOST}:{config.SCAN_METRICS_PORT}/metrics")
+
         # Проверяем доступность сканера
         print("\n🔍 Проверяем доступность сканера...")
         if scanner_manager.scanner_exists():
@@ -497,6 +502,9 @@ class ScannerApp:
         else:
             print("❌ Указанный сканер не найден")
             return
+
+        # Фоновая проверка готовности: нажатие кнопки не ждет проверки сканера
+        scanner_manager.readiness.start()
         
         # Запускаем слушатель клавиатуры
         print("\n🎹 Настройка клавиатуры...")
@@ -537,6 +545,8 @@ class ScannerApp:
         print("🛑 Останавливаем сервис...")
         self.is_running = False
         scanner_manager.stop_keyboard_listener()
+        scanner_manager.readiness.stop()
+        scanner_manager.backend.close()
         print("✅ Сервис остановлен")
 
 # Запуск приложения
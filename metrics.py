@@ -0,0 +1,315 @@
+"""
+Замеры длительности этапов обработки заданий, счетчики и показатели
+для экспорта в формате Prometheus (GET /metrics).
+Модуль не зависит от остального проекта и используется как воркером печати,
+так и службами сканирования.
+"""
+
+import subprocess
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Границы корзин гистограмм в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Histogram:
+    """
+    Гистограмма длительностей: счетчики по корзинам для экспорта
+    и скользящее окно последних значений для перцентилей.
+    """
+
+    def __init__(self, name: str, buckets=DEFAULT_BUCKETS, window: int = 1000):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._bucket_counts = [0] * (len(self.buckets) + 1)  # последняя - +Inf
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        with self._lock:
+            self._bucket_counts[bisect_left(self.buckets, value)] += 1
+            self._recent.append(value)
+            self.count += 1
+            self.sum += value
+
+    def percentile(self, q: float):
+        """Перцентиль q (0..100) по окну последних значений"""
+        with self._lock:
+            values = sorted(self._recent)
+        if not values:
+            return None
+        index = min(len(values) - 1, max(0, int(round(q / 100 * (len(values) - 1)))))
+        return values[index]
+
+    def cumulative_buckets(self):
+        """Накопительные счетчики [(граница, количество)], последняя граница - inf"""
+        with self._lock:
+            counts = list(self._bucket_counts)
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def summary(self) -> dict:
+        """Сводка в миллисекундах для heartbeat и логов"""
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        with self._lock:
+            count = self.count
+            total = self.sum
+            maximum = max(self._recent) if self._recent else None
+        return {
+            "count": count,
+            "avg_ms": ms(total / count) if count else None,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(maximum)
+        }
+
+# Гистограммы этапов конвейера печати: имя этапа -> Histogram
+stage_histograms = {}
+_stage_histograms_lock = threading.Lock()
+
+def get_stage_histogram(stage_name: str) -> Histogram:
+    with _stage_histograms_lock:
+        histogram = stage_histograms.get(stage_name)
+        if histogram is None:
+            histogram = stage_histograms[stage_name] = Histogram(stage_name)
+        return histogram
+
+def observe_stage(stage_name: str, seconds: float):
+    """Записывает длительность этапа напрямую в гистограмму"""
+    get_stage_histogram(stage_name).observe(seconds)
+
+def stage_summary() -> dict:
+    """Перцентили по всем этапам"""
+    with _stage_histograms_lock:
+        histograms = dict(stage_histograms)
+    return {name: histogram.summary() for name, histogram in sorted(histograms.items())}
+
+class JobTimer:
+    """Монотонные таймеры этапов одного задания"""
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id
+        self.started = time.monotonic()
+        self.stages = {}
+
+    def record(self, stage_name: str, seconds: float):
+        # При повторных попытках длительности этапа суммируются
+        self.stages[stage_name] = self.stages.get(stage_name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage_name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage_name, time.monotonic() - started)
+
+    def as_dict(self) -> dict:
+        """Длительности этапов в миллисекундах (для callback)"""
+        timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        timings["total"] = round((time.monotonic() - self.started) * 1000, 1)
+        return timings
+
+# Таймер задания, которое обрабатывается сейчас
+_current_timer = None
+_current_timer_lock = threading.Lock()
+
+def start_job_timer(job_id=None) -> JobTimer:
+    """Начинает замер нового задания"""
+    global _current_timer
+    timer = JobTimer(job_id)
+    with _current_timer_lock:
+        _current_timer = timer
+    return timer
+
+def get_job_timer():
+    """Таймер текущего задания (None если замер не начат)"""
+    with _current_timer_lock:
+        return _current_timer
+
+def finish_job_timer():
+    """Завершает замер текущего задания и переносит длительности в гистограммы"""
+    global _current_timer
+    with _current_timer_lock:
+        timer, _current_timer = _current_timer, None
+    if timer is None:
+        return None
+    for stage_name, seconds in timer.stages.items():
+        observe_stage(stage_name, seconds)
+    observe_stage("total", time.monotonic() - timer.started)
+    return timer.as_dict()
+
+@contextmanager
+def stage(stage_name: str):
+    """Замер этапа текущего задания (ничего не делает, если замер не начат)"""
+    timer = get_job_timer()
+    if timer is None:
+        yield
+        return
+    with timer.stage(stage_name):
+        yield
+
+class MetricsRegistry:
+    """
+    Счетчики (counter), показатели (gauge) и гистограммы с метками.
+    Серия метрики определяется набором меток: inc("jobs_total", outcome="success").
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # имя -> {"type", "help", "series": {метки: значение или Histogram}}
+
+    def _metric(self, name: str, kind: str, help_text: str) -> dict:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = {"type": kind, "help": help_text, "series": {}}
+        return metric
+
+    def inc(self, name: str, value: float = 1, help_text: str = "", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metric(name, "counter", help_text)["series"]
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, help_text: str = "", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._metric(name, "gauge", help_text)["series"][key] = value
+
+    def observe(self, name: str, seconds: float, help_text: str = "", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._metric(name, "histogram", help_text)["series"]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(name)
+        histogram.observe(seconds)
+
+    def collect(self) -> list:
+        """Снимок метрик: [(имя, тип, описание, {метки: значение})]"""
+        with self._lock:
+            return [(name, metric["type"], metric["help"], dict(metric["series"]))
+                    for name, metric in sorted(self._metrics.items())]
+
+# Общий реестр метрик процесса
+registry = MetricsRegistry()
+
+def inc_counter(name: str, value: float = 1, help_text: str = "", **labels):
+    registry.inc(name, value, help_text, **labels)
+
+def set_gauge(name: str, value: float, help_text: str = "", **labels):
+    registry.set(name, value, help_text, **labels)
+
+def observe_histogram(name: str, seconds: float, help_text: str = "", **labels):
+    registry.observe(name, seconds, help_text, **labels)
+
+def run_command(cmd, **kwargs):
+    """
+    subprocess.run с учетом числа запусков и длительности по имени команды.
+    Исключения (таймаут, команда не найдена) пробрасываются как есть.
+    """
+    command = cmd[0] if isinstance(cmd, (list, tuple)) else str(cmd).split()[0]
+    started = time.monotonic()
+    status = "error"
+    try:
+        result = subprocess.run(cmd, **kwargs)
+        status = "ok" if result.returncode == 0 else "error"
+        return result
+    except subprocess.TimeoutExpired:
+        status = "timeout"
+        raise
+    finally:
+        observe_histogram("subprocess_duration_seconds", time.monotonic() - started,
+                          "Длительность внешних команд", command=command)
+        inc_counter("subprocess_runs_total", 1, "Запуски внешних команд", command=command, status=status)
+
+def _format_labels(labels, extra=()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for key, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _render_histogram(lines: list, name: str, labels, histogram: Histogram):
+    for bound, count in histogram.cumulative_buckets():
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', _format_value(float(bound)))])} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+def render_prometheus() -> str:
+    """Все метрики процесса в текстовом формате Prometheus"""
+    lines = []
+    for name, kind, help_text, series in registry.collect():
+        if help_text:
+            lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(series.items()):
+            if kind == "histogram":
+                _render_histogram(lines, name, labels, value)
+            else:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    with _stage_histograms_lock:
+        histograms = dict(stage_histograms)
+    if histograms:
+        lines.append("# HELP stage_duration_seconds Длительность этапов обработки заданий")
+        lines.append("# TYPE stage_duration_seconds histogram")
+        for stage_name, histogram in sorted(histograms.items()):
+            _render_histogram(lines, "stage_duration_seconds", [("stage", stage_name)], histogram)
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics - метрики в формате Prometheus"""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        send_metrics(self)
+
+    def log_message(self, format, *args):
+        pass
+
+def send_metrics(handler: BaseHTTPRequestHandler):
+    """Отвечает на запрос метрик (используется и другими HTTP-обработчиками)"""
+    body = render_prometheus().encode()
+    handler.send_response(200)
+    handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+    handler.send_header("Content-Length", str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+def start_metrics_server(host: str, port: int):
+    """
+    Запускает отдельный HTTP-сервер метрик в фоновом потоке.
+    Возвращает None, если порт 0 (отключено) или занят.
+    """
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError:
+        return None
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
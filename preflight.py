@@ -0,0 +1,210 @@
+"""
+Предварительный разбор PDF: количество страниц, размер и размеры страниц.
+Страницы считаются по xref/trailer (Root -> Pages -> /Count) без полного
+разбора документа. Модуль не зависит от остального проекта и используется
+как воркером печати, так и службами сканирования.
+"""
+
+import mmap
+import os
+import re
+
+# Сколько байт с конца файла читать в поисках startxref
+TAIL_SIZE = 2048
+# Сколько байт объекта читать от его смещения
+OBJECT_WINDOW = 4096
+
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_XREF_SUBSECTION_RE = re.compile(rb"(\d+)\s+(\d+)\s*[\r\n]+")
+_XREF_ENTRY_RE = re.compile(rb"(\d{10})\s(\d{5})\s([nf])")
+_ROOT_RE = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PREV_RE = re.compile(rb"/Prev\s+(\d+)")
+_PAGES_REF_RE = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+_NUMBER = rb"\s*([-+]?\d*\.?\d+)"
+_MEDIABOX_RE = re.compile(rb"/MediaBox\s*\[" + _NUMBER * 4 + rb"\s*\]")
+_PAGES_OBJ_RE = re.compile(rb"/Type\s*/Pages\b")
+_PAGE_OBJ_RE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_OBJ_HEADER_RE = re.compile(rb"\s*\d+\s+\d+\s+obj")
+_XREF_STREAM_RE = re.compile(rb"/Type\s*/XRef\b")
+_ENCRYPT_RE = re.compile(rb"/Encrypt\s+\d+\s+\d+\s+R")
+
+# 1 pt = 1/72 дюйма
+POINTS_PER_MM = 72 / 25.4
+
+def is_pdf(data) -> bool:
+    return data[:1024].lstrip()[:5] == b"%PDF-"
+
+def _read_xref_offsets(data, offset: int, offsets: dict, visited: set):
+    """
+    Читает классическую таблицу xref и ее трейлер (с цепочкой /Prev).
+    Возвращает номер объекта Root или None для потоков xref (PDF 1.5+).
+    """
+    if offset in visited or offset >= len(data):
+        return None
+    visited.add(offset)
+
+    if data[offset:offset + 4] != b"xref":
+        return None
+
+    position = offset + 4
+    while True:
+        # Пропускаем пробелы между подразделами
+        while position < len(data) and data[position:position + 1] in b" \r\n\t":
+            position += 1
+        subsection = _XREF_SUBSECTION_RE.match(data, position)
+        if not subsection:
+            break
+        first, count = int(subsection.group(1)), int(subsection.group(2))
+        position = subsection.end()
+        for number in range(first, first + count):
+            entry = _XREF_ENTRY_RE.match(data, position)
+            if not entry:
+                return None
+            # Более новые секции (читаются раньше) имеют приоритет
+            if entry.group(3) == b"n" and number not in offsets:
+                offsets[number] = int(entry.group(1))
+            position = entry.end()
+            while data[position:position + 1] in (b" ", b"\r", b"\n"):
+                position += 1
+
+    trailer_end = data.find(b"startxref", position)
+    trailer = data[position:trailer_end if trailer_end != -1 else position + OBJECT_WINDOW]
+    root = _ROOT_RE.search(trailer)
+    prev = _PREV_RE.search(trailer)
+    if prev:
+        prev_root = _read_xref_offsets(data, int(prev.group(1)), offsets, visited)
+        if not root:
+            return prev_root
+    return int(root.group(1)) if root else None
+
+def _read_object(data, offsets: dict, number: int):
+    """Тело объекта по номеру (до endobj, не больше OBJECT_WINDOW байт)"""
+    offset = offsets.get(number)
+    if offset is None:
+        return None
+    chunk = data[offset:offset + OBJECT_WINDOW]
+    if not re.match(rb"\s*%d\s+\d+\s+obj" % number, chunk):
+        return None
+    end = chunk.find(b"endobj")
+    return chunk[:end] if end != -1 else chunk
+
+def _xref_kind(data):
+    """
+    Вид таблицы ссылок по последнему startxref: "table" (классическая xref),
+    "stream" (поток xref, PDF 1.5+) или None, если startxref нет или он
+    указывает мимо (обрезанный или поврежденный файл).
+    """
+    tail = data[max(0, len(data) - TAIL_SIZE):]
+    startxrefs = _STARTXREF_RE.findall(tail)
+    if not startxrefs:
+        return None
+    offset = int(startxrefs[-1])
+    if data[offset:offset + 4] == b"xref":
+        return "table"
+    window = data[offset:offset + OBJECT_WINDOW]
+    if _OBJ_HEADER_RE.match(window) and _XREF_STREAM_RE.search(window):
+        return "stream"
+    return None
+
+def _is_encrypted(data, xref_kind) -> bool:
+    """Ссылка /Encrypt в трейлере (или в словаре потока xref)"""
+    tail = data[max(0, len(data) - TAIL_SIZE):]
+    if _ENCRYPT_RE.search(tail):
+        return True
+    if xref_kind == "stream":
+        offset = int(_STARTXREF_RE.findall(tail)[-1])
+        return bool(_ENCRYPT_RE.search(data[offset:offset + OBJECT_WINDOW]))
+    return False
+
+def _page_size(box_match):
+    if not box_match:
+        return None
+    x0, y0, x1, y1 = (float(value) for value in box_match.groups())
+    return round(abs(x1 - x0), 2), round(abs(y1 - y0), 2)
+
+def _from_xref(data):
+    """Страницы и размер страницы через xref/trailer. (None, None) если не вышло"""
+    tail = data[max(0, len(data) - TAIL_SIZE):]
+    startxrefs = _STARTXREF_RE.findall(tail)
+    if not startxrefs:
+        return None, None
+
+    offsets = {}
+    root = _read_xref_offsets(data, int(startxrefs[-1]), offsets, set())
+    if root is None:
+        return None, None
+
+    catalog = _read_object(data, offsets, root)
+    pages_ref = _PAGES_REF_RE.search(catalog) if catalog else None
+    pages_obj = _read_object(data, offsets, int(pages_ref.group(1))) if pages_ref else None
+    count = _COUNT_RE.search(pages_obj) if pages_obj else None
+    if not count:
+        return None, None
+    return int(count.group(1)), _page_size(_MEDIABOX_RE.search(pages_obj))
+
+def _from_scan(data):
+    """
+    Запасной способ: поиск по всему файлу (сжатые потоки xref, поврежденные файлы).
+    Корневой узел дерева страниц содержит наибольший /Count.
+    """
+    counts = []
+    for match in _PAGES_OBJ_RE.finditer(data):
+        window = data[max(0, match.start() - 512):match.end() + 512]
+        counts.extend(int(value) for value in _COUNT_RE.findall(window))
+    pages = max(counts) if counts else None
+    if pages is None:
+        pages = sum(1 for _ in _PAGE_OBJ_RE.finditer(data)) or None
+    return pages, _page_size(_MEDIABOX_RE.search(data))
+
+def inspect_pdf(data) -> dict:
+    """
+    Разбирает PDF из байтов (или mmap).
+    Возвращает pages (None если не определено), bytes, page_width_pt, page_height_pt,
+    page_size_mm, method ("xref", "scan" или None для не-PDF), encrypted (есть /Encrypt)
+    и damaged (нет трейлера или startxref указывает мимо таблицы ссылок).
+    """
+    info = {
+        "pages": None,
+        "bytes": len(data),
+        "page_width_pt": None,
+        "page_height_pt": None,
+        "page_size_mm": None,
+        "method": None,
+        "encrypted": False,
+        "damaged": False
+    }
+    if not is_pdf(data):
+        return info
+
+    xref_kind = _xref_kind(data)
+    info["damaged"] = xref_kind is None
+    info["encrypted"] = _is_encrypted(data, xref_kind)
+
+    try:
+        pages, size = _from_xref(data)
+        method = "xref"
+    except (ValueError, IndexError):
+        pages, size = None, None
+    if pages is None:
+        pages, size = _from_scan(data)
+        method = "scan"
+    if not size:
+        # MediaBox задан не в корне дерева страниц, а у самих страниц
+        size = _page_size(_MEDIABOX_RE.search(data))
+
+    info["pages"] = pages
+    info["method"] = method if pages is not None else None
+    if size:
+        info["page_width_pt"], info["page_height_pt"] = size
+        info["page_size_mm"] = f"{round(size[0] / POINTS_PER_MM)}x{round(size[1] / POINTS_PER_MM)}"
+    return info
+
+def inspect_pdf_file(path: str) -> dict:
+    """Разбирает PDF-файл через mmap - файл не читается в память целиком"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return inspect_pdf(b"")
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return inspect_pdf(data)
@@ -7,20 +7,31 @@ import time
 import shutil
 import re
 import traceback
+import threading
+from collections import deque
 
 from . import config
 from .utils import cleanup_file, get_detailed_printer_status, setup_logger, update_current_job_id
-from .restart_cups import restart_cups_service
+from .cups_supervisor import cups_supervisor, printer_breaker
+from .control import job_control
+from .breaker import CircuitBreaker
+from .printer_registry import printer_registry
+from .metrics import stage, run_command, set_gauge
+from .preflight import inspect_pdf
+from . import errors
+from .errors import PrintError
 
 logger = setup_logger()
 
 def printer_exists(printer_name: str, try_recovery: bool = True, logger=None) -> bool:
     """
-    Проверяет существование принтера с безопасным восстановлением
+    Проверяет существование принтера.
+    Восстановление CUPS не выполняется здесь: при try_recovery оно
+    запрашивается у фонового контролера, а задание получает отказ сразу.
 
     Args:
         printer_name: имя принтера
-        try_recovery: пытаться ли восстановить принтер
+        try_recovery: запросить ли фоновое восстановление, если принтер не найден
         logger: логгер для сообщений
 
     Returns:
@@ -28,9 +39,13 @@ def printer_exists(printer_name: str, try_recovery: bool = True, logger=None) ->
     """
     log = logger or print
 
+    # Быстрая проверка по реестру - без запуска lpstat
+    if printer_registry.has_printer(printer_name):
+        return True
+
     # Базовая проверка
     try:
-        result = subprocess.run(
+        result = run_command(
             ["lpstat", "-p", printer_name],
             capture_output=True,
             text=True,
@@ -41,78 +56,262 @@ def printer_exists(printer_name: str, try_recovery: bool = True, logger=None) ->
             # Проверяем, что принтер действительно в списке
             output = result.stdout.lower()
             if printer_name.lower() in output and "unknown" not in output:
+                printer_registry.invalidate()
                 return True
 
         # Принтер не найден
-        if not try_recovery:
-            return False
+        if try_recovery:
+            log(f"⚠️ Принтер '{printer_name}' не найден, запрашиваем фоновое восстановление...")
+            cups_supervisor.request_recovery()
+        return False
 
-        log(f"⚠️ Принтер '{printer_name}' не найден, пытаемся восстановить...")
+    except Exception as e:
+        log(f"❌ Ошибка при проверке принтера '{printer_name}': {e}")
+        return False
 
-        # 1. Простая проверка через несколько секунд (может быть временная проблема)
-        time.sleep(2)
-        result = subprocess.run(
-            ["lpstat", "-p", printer_name],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+def get_available_printers():
+    """Получает список всех доступных принтеров (из реестра)"""
+    return printer_registry.destinations() or []
 
-        if result.returncode == 0:
-            log(f"✅ Принтер '{printer_name}' восстановился сам")
-            return True
+class PrinterPool:
+    """
+    Логическая очередь печати поверх нескольких взаимозаменяемых принтеров CUPS.
+    Выбирает наименее загруженный исправный принтер. Принтеры с разомкнутым
+    предохранителем (см. cups_supervisor.printer_breaker) не выбираются.
+    """
 
-        # 2. Пробуем безопасный перезапуск служб
-        log("🔄 Пробуем безопасный перезапуск служб...")
-        restart_cups_service(log, force=False)
+    def __init__(self, printers, history_size=20):
+        self.printers = list(printers)
+        self._lock = threading.Lock()
+        self._history_size = history_size
+        # История выполненных заданий: (страниц, секунд)
+        self._history = {printer: deque(maxlen=history_size) for printer in self.printers}
+        # Последний статус принтера, уже полученный воркером (проверка готовности, отправка, heartbeat)
+        self._status = {}
+
+    def observe_status(self, printer: str, status: dict):
+        """Запоминает статус принтера для выбора принтера без опроса CUPS"""
+        with self._lock:
+            self._status[printer] = status
+
+    def record_failure(self, printer: str):
+        """Принтер отказал при отправке задания - учитываем в его предохранителе"""
+        printer_breaker(printer).record_failure()
+
+    def record_job(self, printer: str, pages: int, duration: float):
+        """Запоминает время печати задания для оценки скорости принтера"""
+        with self._lock:
+            self._history.setdefault(printer, deque(maxlen=self._history_size)).append((max(pages, 1), duration))
+        printer_breaker(printer).record_success()
+
+    def pages_per_minute(self, printer: str):
+        """Скорость принтера по последним заданиям (None если данных нет)"""
+        with self._lock:
+            history = list(self._history.get(printer, ()))
+        total_seconds = sum(seconds for _, seconds in history)
+        if not history or total_seconds <= 0:
+            return None
+        return sum(pages for pages, _ in history) / total_seconds * 60
+
+    def throughput(self, printer: str) -> dict:
+        """
+        Модель скорости принтера по последним заданиям:
+        секунд на задание = накладные расходы + страниц * секунд на страницу
+        (метод наименьших квадратов).
+        """
+        with self._lock:
+            history = list(self._history.get(printer, ()))
+        model = {
+            "samples": len(history),
+            "pages_per_minute": None,
+            "seconds_per_page": None,
+            "job_overhead_seconds": None,
+            "avg_pages_per_job": None
+        }
+        if not history:
+            return model
+
+        count = len(history)
+        mean_pages = sum(pages for pages, _ in history) / count
+        mean_seconds = sum(seconds for _, seconds in history) / count
+        variance = sum((pages - mean_pages) ** 2 for pages, _ in history)
+        per_page, overhead = 0.0, -1.0
+        if variance > 0:
+            per_page = sum((pages - mean_pages) * (seconds - mean_seconds) for pages, seconds in history) / variance
+            overhead = mean_seconds - per_page * mean_pages
+        if per_page <= 0 or overhead < 0:
+            # Мало разброса по числу страниц - считаем без накладных расходов
+            per_page, overhead = mean_seconds / mean_pages, 0.0
+        if per_page <= 0:
+            return model
+
+        model.update({
+            "pages_per_minute": round(60 / per_page, 2),
+            "seconds_per_page": round(per_page, 2),
+            "job_overhead_seconds": round(overhead, 2),
+            "avg_pages_per_job": round(mean_pages, 2)
+        })
+        return model
+
+    def estimate_seconds(self, printer: str, jobs: int, pages: int = None):
+        """Оценка времени печати заданий (None если скорость принтера еще неизвестна)"""
+        model = self.throughput(printer)
+        if model["seconds_per_page"] is None:
+            return None
+        if pages is None:
+            pages = jobs * model["avg_pages_per_job"]
+        return jobs * model["job_overhead_seconds"] + pages * model["seconds_per_page"]
+
+    def retry_after(self) -> float:
+        """
+        0, если хотя бы один принтер пула может принимать задания,
+        иначе - через сколько секунд ближайший предохранитель пропустит пробу.
+        """
+        waits = []
+        for printer in self.printers:
+            breaker = printer_breaker(printer)
+            if breaker.state != breaker.OPEN:
+                return 0.0
+            waits.append(breaker.retry_after())
+        return min(waits) if waits else 0.0
+
+    def candidates(self, exclude=()) -> list:
+        """
+        Возвращает принтеры в порядке предпочтения по уже известному состоянию (CUPS не опрашивается):
+        с замкнутым предохранителем раньше полуразомкнутых, по возрастанию очереди
+        и убыванию скорости, затем неисправные по последнему статусу.
+        Принтеры с разомкнутым предохранителем и из exclude пропускаются.
+        """
+        ranked = []
+        unhealthy = []
+        for printer in self.printers:
+            breaker_state = printer_breaker(printer).state
+            if printer in exclude or breaker_state == CircuitBreaker.OPEN:
+                continue
+            with self._lock:
+                status = self._status.get(printer) or {}
+            if status and (not status.get("online") or status.get("paused") or
+                           status.get("paper_out") or status.get("door_open")):
+                unhealthy.append(printer)
+                continue
+            ppm = self.pages_per_minute(printer) or 0
+            ranked.append((breaker_state != CircuitBreaker.CLOSED, status.get("jobs_in_queue", 0), -ppm, printer))
 
-        # Даем время на восстановление
-        time.sleep(10)
+        ranked.sort()
+        # Неисправные оставляем в конце - лучше попробовать, чем не печатать вовсе
+        return [printer for *_, printer in ranked] + unhealthy
 
-        # 3. Финальная проверка
-        result = subprocess.run(
-            ["lpstat", "-p", printer_name],
-            capture_output=True,
-            text=True,
-            timeout=10
+# Глобальный пул принтеров воркера
+printer_pool = PrinterPool(config.PRINTER_POOL)
+
+def throughput_status(backlog_messages: int = None, statuses: dict = None) -> dict:
+    """
+    Скорость принтеров пула и оценка времени разбора очередей:
+    локальной очереди CUPS каждого принтера и очереди задач в RabbitMQ.
+    statuses - уже полученные статусы принтеров, чтобы не опрашивать CUPS повторно.
+    """
+    statuses = statuses or {}
+    printers = {}
+    local_etas = []
+    jobs_per_second = 0.0
+
+    for printer in printer_pool.printers:
+        status = statuses.get(printer) or get_detailed_printer_status(printer)
+        printer_pool.observe_status(printer, status)
+        jobs = status.get("jobs_in_queue", 0)
+        eta = printer_pool.estimate_seconds(printer, jobs)
+        available = status.get("online", False) and printer_breaker(printer).state != CircuitBreaker.OPEN
+        printers[printer] = dict(
+            printer_pool.throughput(printer),
+            jobs_in_queue=jobs,
+            queue_eta_seconds=round(eta, 1) if eta is not None else None,
+            available=available
         )
+        set_gauge("cups_queue_depth", jobs, "Задания в очереди CUPS", printer=printer)
+        set_gauge("printer_available", int(available), "Принтер доступен для печати", printer=printer)
+        if eta is not None:
+            local_etas.append(eta)
+        job_seconds = printer_pool.estimate_seconds(printer, 1)
+        if available and job_seconds:
+            jobs_per_second += 1 / job_seconds
+
+    # Принтеры пула разбирают очередь параллельно
+    local_eta = max(local_etas) if local_etas else None
+    backlog_eta = None
+    if backlog_messages is not None and jobs_per_second > 0:
+        backlog_eta = (local_eta or 0) + backlog_messages / jobs_per_second
+
+    return {
+        "printers": printers,
+        "local_queue_eta_seconds": round(local_eta, 1) if local_eta is not None else None,
+        "backlog_messages": backlog_messages,
+        "backlog_eta_seconds": round(backlog_eta, 1) if backlog_eta is not None else None,
+        "pool_jobs_per_minute": round(jobs_per_second * 60, 2) if jobs_per_second else None
+    }
 
-        if result.returncode == 0:
-            log(f"✅ Принтер '{printer_name}' восстановлен после перезапуска служб")
-            return True
-        else:
-            log(f"❌ Принтер '{printer_name}' все еще не найден после восстановления")
-            return False
+def acquire_printer(exclude=()) -> str:
+    """
+    Выбирает из пула принтер, готовый к печати (кроме exclude).
+    Если готовых нет - выбрасывает PrintError последнего проверенного принтера.
+    """
+    last_error = PrintError(
+        errors.CIRCUIT_OPEN,
+        f"Пул принтеров недоступен: предохранители разомкнуты, повтор через {printer_pool.retry_after():.0f} сек"
+    )
 
-    except Exception as e:
-        log(f"❌ Ошибка при проверке принтера '{printer_name}': {e}")
-        return False
+    for printer in printer_pool.candidates(exclude):
+        try:
+            with stage("check_printer_ready"):
+                wait_printer_ready(printer)
+            return printer
+        except PrintError as e:
+            last_error = e
 
-def get_available_printers():
-    """Получает список всех доступных принтеров"""
-    try:
-        result = subprocess.run(
-            ["lpstat", "-a"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if result.returncode == 0:
-            printers = []
-            for line in result.stdout.splitlines():
-                if line.strip():
-                    printer_name = line.split()[0]
-                    printers.append(printer_name)
-            return printers
-        return []
-    except Exception as e:
-        logger.error(f"Ошибка при получении списка принтеров: {e}")
-        return []
+    raise last_error
+
+def submit_with_failover(job_id: str, tmp_path, pages, requested_options: dict = None):
+    """
+    Отправляет задание на лучший готовый принтер пула.
+    Если принтер отказал до того, как CUPS принял задание, сбой учитывается его
+    предохранителем и задание уходит на следующий принтер.
+    Возвращает (принтер, результат print_cups последней попытки).
+    """
+    tried = []
+    printer, print_result = None, None
+    while True:
+        try:
+            printer = acquire_printer(exclude=tried)
+        except PrintError:
+            if print_result is None:
+                raise
+            # Готовых принтеров больше нет - возвращаем ошибку последней попытки
+            return printer, print_result
+
+        # Проверяем опции задания по возможностям принтера
+        lp_options, option_errors = printer_registry.validate_options(printer, requested_options)
+        if option_errors:
+            raise PrintError(errors.UNSUPPORTED_OPTIONS,
+                             f"Неподдерживаемые параметры печати: {'; '.join(option_errors)}")
+
+        logger.info(f"🚀 Отправляем задание {job_id} на печать ({printer})...")
+        started = time.monotonic()
+        print_result = print_cups(printer, tmp_path, job_id, timeout=completion_timeout(pages), options=lp_options)
+        if print_result["status"] == "success":
+            printer_pool.record_job(printer, pages or 1, time.monotonic() - started)
+            return printer, print_result
+
+        error_code = print_result.get("error_code")
+        if print_result["submitted"] or error_code not in errors.PRINTER_FAULT_CODES:
+            return printer, print_result
+
+        printer_pool.record_failure(printer)
+        tried.append(printer)
+        logger.warning(f"🔀 Принтер {printer} отказал [{error_code}], ищем другой принтер пула")
 
 def print_raw(printer: str, tmp_path: str):
     cmd = ["nc", "-w1", printer, "9100"]
     with open(tmp_path, "rb") as f:
-        result = subprocess.run(cmd, input=f.read(), capture_output=True)
+        result = run_command(cmd, input=f.read(), capture_output=True)
     if result.returncode != 0:
         stderr = result.stderr.decode(errors="ignore").strip()
         cli = f"nc -w1 {printer} < {tmp_path}"
@@ -120,12 +319,15 @@ def print_raw(printer: str, tmp_path: str):
 
 def wait_for_print_completion(printer_name: str, expected_job_id: str, timeout: int = 180):
     """
-    Ожидает завершения задания печати по job_id
+    Ожидает завершения задания печати по job_id.
+    Прерывается сразу, если задание отменено через канал управления.
     """
     logger.info(f"⏳ Ожидаем завершения печати задания {expected_job_id}...")
     start_time = time.time()
 
     while time.time() - start_time < timeout:
+        if job_control.current_cancelled():
+            raise PrintError(errors.CANCELLED, "Задание отменено")
         try:
             # Получаем статус принтера
             status = get_detailed_printer_status(printer_name)
@@ -142,70 +344,112 @@ def wait_for_print_completion(printer_name: str, expected_job_id: str, timeout:
                 # Продолжаем ждать - возможно наше задание следующее
 
             logger.info(f"⏳ Задание еще печатается... (очередь: {status['jobs_in_queue']})")
-            time.sleep(5)
+            job_control.wait_cancelled(5)
 
         except Exception as e:
             logger.error(f"Ошибка при проверке статуса печати: {e}")
-            time.sleep(5)
+            job_control.wait_cancelled(5)
 
     logger.error(f"❌ Таймаут ожидания печати задания {expected_job_id}")
     return False
 
-def print_cups(printer: str, tmp_path: str, job_id: str, timeout: int = 180):
+def completion_timeout(pages) -> int:
+    """Таймаут ожидания завершения печати по числу страниц"""
+    if not pages:
+        return config.PRINT_TIMEOUT_DEFAULT
+    timeout = config.PRINT_TIMEOUT_BASE + config.PRINT_TIMEOUT_PER_PAGE * pages
+    return min(timeout, config.PRINT_TIMEOUT_MAX)
+
+def preflight(file_content: bytes) -> dict:
+    """Предварительный разбор задания: страницы, размер и формат страницы"""
+    with stage("preflight"):
+        info = inspect_pdf(file_content)
+    logger.info(f"📄 Предварительный разбор: страниц {info['pages'] or '?'}, "
+                f"{info['bytes']} байт, формат {info['page_size_mm'] or '?'}")
+    if info["damaged"]:
+        logger.warning("⚠️ PDF поврежден или обрезан: таблица ссылок не найдена")
+    if info["encrypted"]:
+        logger.warning("⚠️ PDF зашифрован")
+    return info
+
+def printer_not_found_error(printer: str) -> PrintError:
+    available_printers = get_available_printers()
+    return PrintError(
+        errors.PRINTER_NOT_FOUND,
+        f"Принтер '{printer}' не найден в системе CUPS. "
+        f"Доступные принтеры: {', '.join(available_printers) if available_printers else 'не найдены'}"
+    )
+
+def print_cups(printer: str, tmp_path, job_id: str, timeout: int = 180, options: list = None):
     """
     Отправляем через CUPS и ждем завершения печати.
+    В результате при ошибке заполняется error_code (см. errors.py).
+    tmp_path может быть списком файлов - тогда они уходят одним заданием lp.
+    options - дополнительные аргументы lp, проверенные реестром принтеров.
+    submitted в результате - CUPS принял задание (повторная отправка напечатает его дважды).
     """
+    files = list(tmp_path) if isinstance(tmp_path, (list, tuple)) else [tmp_path]
+    options = options or []
+    if not any(arg.startswith("media=") for arg in options):
+        options = ["-o", "media=A4", *options]
     result = {
         "job_id": job_id,
         "printer": config.PRINTER_ID,
         "status": "success",
-        "error": None
+        "error": None,
+        "submitted": False
     }
 
     try:
         # Проверяем существование принтера
-        if not printer_exists(printer):
-            available_printers = get_available_printers()
-            raise Exception(
-                f"Принтер '{printer}' не найден в системе CUPS. "
-                f"Доступные принтеры: {', '.join(available_printers) if available_printers else 'не найдены'}"
-            )
+        with stage("printer_exists"):
+            exists = printer_exists(printer)
+        if not exists:
+            raise printer_not_found_error(printer)
 
         # Проверяем статус принтера перед отправкой
-        printer_status = get_detailed_printer_status(printer)
+        with stage("printer_status"):
+            printer_status = get_detailed_printer_status(printer)
+        printer_pool.observe_status(printer, printer_status)
 
         # Проверка статусов принтера
         if not printer_status["online"]:
-            raise Exception("Принтер не в сети")
+            raise PrintError(errors.code_from_status(printer_status) or errors.OFFLINE, "Принтер не в сети")
         if printer_status.get("paused", False):
-            raise Exception("Принтер на паузе")
+            raise PrintError(errors.PAUSED, "Принтер на паузе")
         if printer_status.get("paper_out", False):
-            raise Exception("Нет бумаги")
+            raise PrintError(errors.code_from_status(printer_status) or errors.MEDIA_EMPTY, "Нет бумаги")
         if printer_status.get("door_open", False):
-            raise Exception("Открыта крышка")
+            raise PrintError(errors.DOOR_OPEN, "Открыта крышка")
+
+        if job_control.current_cancelled():
+            raise PrintError(errors.CANCELLED, "Задание отменено")
 
         # Отправляем задание на печать
-        lp_result = subprocess.run(
-            ["lp", "-d", printer, "-o", "media=A4", tmp_path],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        with stage("lp_submit"):
+            lp_result = run_command(
+                ["lp", "-d", printer, *options, *files],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
 
         if lp_result.returncode != 0:
             error_msg = lp_result.stderr.strip()
             if "The printer or class does not exist" in error_msg:
-                available_printers = get_available_printers()
-                raise Exception(
-                    f"Принтер '{printer}' не существует. "
-                    f"Доступные принтеры: {', '.join(available_printers) if available_printers else 'не найдены'}"
-                )
+                printer_registry.invalidate()
+                raise printer_not_found_error(printer)
             elif "paused" in error_msg.lower():
-                raise Exception("Принтер на паузе")
+                raise PrintError(errors.PAUSED, "Принтер на паузе")
             elif "rejecting" in error_msg.lower():
-                raise Exception("Принтер отклоняет задания")
+                raise PrintError(errors.REJECTING_JOBS, "Принтер отклоняет задания")
+            elif "scheduler is not running" in error_msg.lower():
+                cups_supervisor.request_recovery()
+                raise PrintError(errors.CUPS_UNAVAILABLE, f"CUPS недоступен: {error_msg}")
             else:
-                raise Exception(f"Ошибка CUPS: {error_msg}")
+                raise PrintError(errors.CUPS_ERROR, f"Ошибка CUPS: {error_msg}")
+
+        result["submitted"] = True
 
         # Извлекаем внутренний job_id CUPS
         match = re.search(r"request id is (\S+)", lp_result.stdout)
@@ -213,25 +457,37 @@ def print_cups(printer: str, tmp_path: str, job_id: str, timeout: int = 180):
 
         if cups_job_id:
             logger.info(f"📋 CUPS job ID: {cups_job_id}")
+            job_control.attach_cups_job(printer, cups_job_id)
         else:
             logger.warning("⚠️ Не удалось извлечь CUPS job ID")
 
         # Ждем завершения печати
-        if not wait_for_print_completion(printer, cups_job_id or job_id, timeout):
-            raise Exception("Печать не завершилась в установленное время")
+        with stage("completion_wait"):
+            completed = wait_for_print_completion(printer, cups_job_id or job_id, timeout)
+        if not completed:
+            raise PrintError(errors.COMPLETION_TIMEOUT, "Печать не завершилась в установленное время")
 
         return result
 
     except subprocess.TimeoutExpired:
         result.update({
             "status": "error",
-            "error": "Таймаут отправки задания на печать"
+            "error": "Таймаут отправки задания на печать",
+            "error_code": errors.SUBMIT_TIMEOUT
+        })
+        return result
+    except PrintError as e:
+        result.update({
+            "status": "error",
+            "error": str(e),
+            "error_code": e.code
         })
         return result
     except Exception as e:
         result.update({
             "status": "error",
-            "error": str(e)
+            "error": str(e),
+            "error_code": errors.CUPS_ERROR
         })
         return result
 
@@ -240,13 +496,46 @@ def check_printer_ready(printer: str, max_wait: int = 60) -> bool:
     Проверяет, готов ли принтер к печати.
     Возвращает True если готов, False если нет.
     """
+    try:
+        wait_printer_ready(printer, max_wait)
+        return True
+    except PrintError:
+        return False
+
+def wait_printer_ready(printer: str, max_wait: int = 60):
+    """
+    Ждет готовности принтера к печати.
+    Если принтер не готов - выбрасывает PrintError с кодом причины.
+    Результат учитывается предохранителем принтера; пока он разомкнут,
+    CUPS не опрашивается вовсе.
+    """
+    breaker = printer_breaker(printer)
+    if breaker.state == breaker.OPEN:
+        raise PrintError(
+            errors.CIRCUIT_OPEN,
+            f"Принтер {printer} недоступен: предохранитель разомкнут, повтор через {breaker.retry_after():.0f} сек"
+        )
+
+    try:
+        _poll_printer_ready(printer, max_wait)
+    except PrintError as e:
+        # Занятый принтер исправен - это не сбой
+        if e.code != errors.PRINTER_BUSY:
+            breaker.record_failure()
+        raise
+    breaker.record_success()
+
+def _poll_printer_ready(printer: str, max_wait: int):
+    """Опрашивает статус принтера до готовности или истечения max_wait"""
     logger.info(f"🔍 Проверяем состояние принтера {printer}...")
     start_time = time.time()
 
     # Сначала проверяем существование принтера
-    if not printer_exists(printer):
+    with stage("printer_exists"):
+        exists = printer_exists(printer)
+    if not exists:
         logger.error(f"❌ Принтер {printer} не существует в системе CUPS")
-        return False
+        raise printer_not_found_error(printer)
 
     # Проверяем статус несколько раз с интервалами
     check_count = 0
@@ -256,11 +545,13 @@ def check_printer_ready(printer: str, max_wait: int = 60) -> bool:
 
         try:
             status = get_detailed_printer_status(printer)
+            printer_pool.observe_status(printer, status)
 
             # Логируем детальный статус для отладки
             logger.info(f"Статус принтера {printer}: online={status['online']}, "
                        f"can_print={status['can_print']}, errors={status['errors']}, "
-                       f"jobs_in_queue={status['jobs_in_queue']}")
+                       f"jobs_in_queue={status['jobs_in_queue']}, "
+                       f"state_reasons={status.get('state_reasons', [])}")
 
             # Если принтер полностью недоступен
             if not status["online"] and len(status["errors"]) > 0:
@@ -274,20 +565,22 @@ def check_printer_ready(printer: str, max_wait: int = 60) -> bool:
                     continue
 
                 logger.warning(f"❌ Критическая ошибка: {error_msg}")
-                return False
+                raise PrintError(errors.code_from_status(status) or errors.OFFLINE,
+                                 f"Принтер не готов к печати: {error_msg}")
 
             # Проверяем конкретные проблемы
             if status.get("paused", False):
                 logger.warning("❌ Принтер на паузе")
-                return False
+                raise PrintError(errors.PAUSED, "Принтер не готов к печати: принтер на паузе")
 
             if status["paper_out"]:
                 logger.warning("❌ Нет бумаги")
-                return False
+                raise PrintError(errors.code_from_status(status) or errors.MEDIA_EMPTY,
+                                 "Принтер не готов к печати: нет бумаги")
 
             if status["door_open"]:
                 logger.warning("❌ Открыта крышка")
-                return False
+                raise PrintError(errors.DOOR_OPEN, "Принтер не готов к печати: открыта крышка")
 
             if status["toner_low"]:
                 logger.warning("⚠️ Мало тонера, но продолжаем...")
@@ -296,7 +589,7 @@ def check_printer_ready(printer: str, max_wait: int = 60) -> bool:
             # Если принтер готов и очередь пуста - можно печатать
             if status["can_print"] and status["jobs_in_queue"] == 0:
                 logger.info("✅ Принтер готов к печати")
-                return True
+                return
 
             # Если есть задания в очереди, ждем их завершения
             if status["jobs_in_queue"] > 0:
@@ -309,7 +602,7 @@ def check_printer_ready(printer: str, max_wait: int = 60) -> bool:
                     continue
                 else:
                     logger.warning("⏳ Время ожидания занятого принтера истекло")
-                    return False
+                    raise PrintError(errors.PRINTER_BUSY, "Принтер не готов к печати: принтер занят")
 
             # Если принтер онлайн, но не can_print (например, печатает другое задание)
             if status["online"] and not status["can_print"]:
@@ -321,15 +614,16 @@ def check_printer_ready(printer: str, max_wait: int = 60) -> bool:
             logger.info("⏳ Неизвестное состояние принтера, ждем...")
             time.sleep(3)
 
+        except PrintError:
+            raise
         except Exception as e:
             logger.error(f"❌ Ошибка при проверке принтера: {e}")
             time.sleep(5)
 
     logger.error(f"❌ Принтер {printer} не готов в течение {max_wait} секунд")
-    return False
+    raise PrintError(errors.NOT_READY, "Принтер не готов к печати")
 
 def print_file(task: dict):
-    printer = config.PRINTER
     filename = task.get("filename", f"job_{uuid.uuid4().hex}.pdf")
     content_b64 = task.get("content")
     job_id = task.get("job_id", str(uuid.uuid4()))
@@ -349,7 +643,8 @@ def print_file(task: dict):
     if not content_b64:
         response.update({
             "status": "error",
-            "error": "Нет содержимого для печати"
+            "error": "Нет содержимого для печати",
+            "error_code": errors.NO_CONTENT
         })
         return response
 
@@ -361,36 +656,24 @@ def print_file(task: dict):
 
         logger.info(f"🖨️ Начинаем обработку задания {job_id}")
 
-        # Проверяем существование принтера
-        if not printer_exists(printer):
-            available_printers = get_available_printers()
-            error_msg = (
-                f"Принтер '{printer}' не найден в системе CUPS. "
-                f"Доступные принтеры: {', '.join(available_printers) if available_printers else 'не найдены'}"
-            )
-            logger.error(error_msg)
-            response.update({
-                "status": "error",
-                "error": error_msg
-            })
-            return response
-
-        # Проверяем готовность принтера
-        if not check_printer_ready(printer):
-            response.update({
-                "status": "error",
-                "error": "Принтер не готов к печати"
-            })
-            return response
+        # CUPS восстанавливается в фоне - откладываем задание, не трогая CUPS
+        if not cups_supervisor.is_ready():
+            raise PrintError(errors.CUPS_UNAVAILABLE, "CUPS недоступен: идет восстановление, задание отложено")
 
         # Сохраняем файл
+        with stage("base64_decode"):
+            file_content = base64.b64decode(content_b64)
         with open(tmp_path, "wb") as f:
-            f.write(base64.b64decode(content_b64))
+            f.write(file_content)
         logger.info(f"💾 Файл сохранен: {tmp_path}")
 
-        # Выполняем печать
-        logger.info(f"🚀 Отправляем задание {job_id} на печать...")
-        print_result = print_cups(printer, tmp_path, job_id)
+        info = preflight(file_content)
+        response["preflight"] = info
+        pages = info["pages"] or task.get("pages")
+
+        # Выполняем печать на готовом принтере пула (с переходом на следующий при отказе)
+        printer, print_result = submit_with_failover(job_id, tmp_path, pages, task.get("options"))
+        response["device"] = printer
 
         # Обновляем ответ
         response.update(print_result)
@@ -402,12 +685,21 @@ def print_file(task: dict):
 
         return response
 
+    except PrintError as e:
+        logger.error(f"❌ Ошибка печати задания {job_id} [{e.code}]: {e}")
+        response.update({
+            "status": "error",
+            "error": str(e),
+            "error_code": e.code
+        })
+        return response
     except Exception as e:
         error_msg = f"Критическая ошибка: {str(e)}"
         logger.error(f"❌ {error_msg}\n{traceback.format_exc()}")
         response.update({
             "status": "error",
-            "error": error_msg
+            "error": error_msg,
+            "error_code": errors.INTERNAL_ERROR
         })
         return response
     finally:
@@ -415,3 +707,114 @@ def print_file(task: dict):
         update_current_job_id({})
         # Удаляем временный файл
         cleanup_file(tmp_path)
+
+def is_small_job(task: dict) -> bool:
+    """Проверяет, подходит ли задание для объединения в пачку"""
+    content_b64 = task.get("content")
+    if not content_b64 or task.get("options"):
+        # Задания с собственными опциями печати не объединяем
+        return False
+    # Размер декодированного содержимого без фактического декодирования
+    return len(content_b64) * 3 // 4 <= config.PRINT_BATCH_MAX_BYTES
+
+def print_batch(tasks: list) -> list:
+    """
+    Печатает пачку мелких заданий одной отправкой CUPS.
+    Возвращает список ответов для Laravel в том же порядке, что и задания.
+    """
+    responses = [
+        {
+            "job_id": task.get("job_id", str(uuid.uuid4())),
+            "printer": config.PRINTER_ID,
+            "status": "success",
+            "error": None
+        }
+        for task in tasks
+    ]
+    tmp_paths = []
+
+    def fail_all(error_msg, error_code):
+        for response in responses:
+            if response["status"] == "success":
+                response.update({"status": "error", "error": error_msg, "error_code": error_code})
+
+    if not tasks:
+        return responses
+
+    update_current_job_id(tasks[0])
+
+    try:
+        if config.DISABLE_PRINT:
+            logger.info("Печать отключена (режим отладки)")
+            for response in responses:
+                response["log_status"] = "debug"
+            return responses
+
+        job_ids = [response["job_id"] for response in responses]
+        logger.info(f"🖨️ Начинаем обработку пачки из {len(tasks)} заданий: {', '.join(map(str, job_ids))}")
+
+        if not cups_supervisor.is_ready():
+            raise PrintError(errors.CUPS_UNAVAILABLE, "CUPS недоступен: идет восстановление, задание отложено")
+
+        # Сохраняем файлы пачки
+        submitted = []
+        pages = 0
+        for task, response in zip(tasks, responses):
+            content_b64 = task.get("content")
+            if not content_b64:
+                response.update({
+                    "status": "error",
+                    "error": "Нет содержимого для печати",
+                    "error_code": errors.NO_CONTENT
+                })
+                continue
+            filename = task.get("filename", f"job_{uuid.uuid4().hex}.pdf")
+            tmp_path = os.path.join(tempfile.gettempdir(), f"batch_{uuid.uuid4().hex}_{filename}")
+            with stage("base64_decode"):
+                file_content = base64.b64decode(content_b64)
+            with open(tmp_path, "wb") as f:
+                f.write(file_content)
+            info = preflight(file_content)
+            response["preflight"] = info
+            pages += info["pages"] or task.get("pages") or 1
+            tmp_paths.append(tmp_path)
+            submitted.append(response)
+
+        if not submitted:
+            return responses
+
+        batch_id = f"batch_{uuid.uuid4().hex[:8]}"
+        logger.info(f"📦 Пачка {batch_id}: {len(submitted)} документов")
+        printer, print_result = submit_with_failover(batch_id, tmp_paths, pages)
+
+        for response in submitted:
+            response.update({
+                "status": print_result["status"],
+                "error": print_result["error"],
+                "error_code": print_result.get("error_code"),
+                "submitted": print_result["submitted"],
+                "device": printer,
+                "batch_id": batch_id,
+                "batch_size": len(submitted)
+            })
+
+        if print_result["status"] == "success":
+            logger.info(f"🎉 Пачка {batch_id} успешно распечатана")
+        else:
+            logger.error(f"❌ Ошибка печати пачки {batch_id}: {print_result['error']}")
+
+        return responses
+
+    except PrintError as e:
+        logger.error(f"❌ Ошибка печати пачки [{e.code}]: {e}")
+        fail_all(str(e), e.code)
+        return responses
+    except Exception as e:
+        error_msg = f"Критическая ошибка: {str(e)}"
+        logger.error(f"❌ {error_msg}\n{traceback.format_exc()}")
+        fail_all(error_msg, errors.INTERNAL_ERROR)
+        return responses
+    finally:
+        update_current_job_id({})
+        for tmp_path in tmp_paths:
+            cleanup_file(tmp_path)
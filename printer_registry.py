@@ -0,0 +1,176 @@
+import os
+import threading
+import time
+
+from . import config
+from .utils import setup_logger
+from .metrics import run_command
+
+logger = setup_logger()
+
+# Файл конфигурации CUPS - меняется при добавлении/удалении/изменении принтеров
+CUPS_PRINTERS_CONF = "/etc/cups/printers.conf"
+
+# Стандартные опции IPP, которые lp принимает независимо от PPD
+STANDARD_OPTIONS = {
+    "media", "sides", "copies", "orientation-requested", "page-ranges",
+    "number-up", "fit-to-page", "print-quality", "collate", "outputorder"
+}
+
+class PrinterRegistry:
+    """
+    Кеш принтеров CUPS и их возможностей (опции PPD, форматы бумаги).
+    Загружается один раз и обновляется при изменении printers.conf,
+    явной инвалидации или по истечении длинного TTL.
+    """
+
+    def __init__(self, ttl: int = 3600):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._destinations = None
+        self._options = {}
+        self._loaded_at = 0
+        self._conf_mtime = None
+
+    def _get_conf_mtime(self):
+        try:
+            return os.stat(CUPS_PRINTERS_CONF).st_mtime
+        except OSError:
+            return None
+
+    def _is_stale(self) -> bool:
+        if self._destinations is None:
+            return True
+        if time.monotonic() - self._loaded_at > self.ttl:
+            return True
+        return self._get_conf_mtime() != self._conf_mtime
+
+    def invalidate(self):
+        """Сбрасывает кеш - следующее обращение перечитает данные CUPS"""
+        with self._lock:
+            self._destinations = None
+            self._options = {}
+
+    def refresh(self):
+        """Перечитывает список принтеров из CUPS"""
+        destinations = self._load_destinations()
+        with self._lock:
+            self._conf_mtime = self._get_conf_mtime()
+            self._destinations = destinations
+            self._options = {}
+            self._loaded_at = time.monotonic()
+        if destinations is not None:
+            logger.info(f"📋 Реестр принтеров обновлен: {', '.join(destinations) if destinations else 'нет принтеров'}")
+
+    def _load_destinations(self):
+        """Список принтеров через lpstat -e (или lpstat -a для старых CUPS)"""
+        for cmd in (["lpstat", "-e"], ["lpstat", "-a"]):
+            try:
+                result = run_command(cmd, capture_output=True, text=True, timeout=10)
+                if result.returncode == 0:
+                    return [line.split()[0] for line in result.stdout.splitlines() if line.strip()]
+            except Exception as e:
+                logger.warning(f"Ошибка выполнения команды {' '.join(cmd)}: {e}")
+        return None
+
+    def _load_options(self, printer: str) -> dict:
+        """Опции PPD принтера через lpoptions -l: {имя: {"choices": [...], "default": ...}}"""
+        options = {}
+        try:
+            result = run_command(
+                ["lpoptions", "-p", printer, "-l"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            if result.returncode != 0:
+                return options
+
+            # Формат строки: "PageSize/Media Size: Letter *A4 Legal"
+            for line in result.stdout.splitlines():
+                if ":" not in line:
+                    continue
+                key_part, choices_part = line.split(":", 1)
+                name = key_part.split("/", 1)[0].strip()
+                choices = []
+                default = None
+                for choice in choices_part.split():
+                    if choice.startswith("*"):
+                        choice = choice[1:]
+                        default = choice
+                    choices.append(choice)
+                options[name] = {"choices": choices, "default": default}
+        except Exception as e:
+            logger.warning(f"Не удалось получить опции принтера {printer}: {e}")
+        return options
+
+    def destinations(self):
+        """Список принтеров CUPS (None если CUPS не ответил)"""
+        with self._lock:
+            stale = self._is_stale()
+        if stale:
+            self.refresh()
+        with self._lock:
+            return list(self._destinations) if self._destinations is not None else None
+
+    def has_printer(self, printer: str):
+        """True/False по данным реестра, None если реестр недоступен"""
+        destinations = self.destinations()
+        if destinations is None:
+            return None
+        return printer in destinations
+
+    def options(self, printer: str) -> dict:
+        """Опции PPD принтера (загружаются один раз)"""
+        self.destinations()
+        with self._lock:
+            cached = self._options.get(printer)
+        if cached is not None:
+            return cached
+        options = self._load_options(printer)
+        with self._lock:
+            self._options[printer] = options
+        return options
+
+    def media(self, printer: str) -> list:
+        """Поддерживаемые форматы бумаги"""
+        options = self.options(printer)
+        for name in ("PageSize", "media", "MediaSize"):
+            if name in options:
+                return options[name]["choices"]
+        return []
+
+    def validate_options(self, printer: str, requested: dict):
+        """
+        Проверяет опции задания по возможностям принтера.
+        Возвращает (аргументы для lp, список ошибок).
+        """
+        args = []
+        errors = []
+        if not requested:
+            return args, errors
+
+        ppd_options = self.options(printer)
+        ppd_lookup = {name.lower(): name for name in ppd_options}
+
+        for key, value in requested.items():
+            value = str(value)
+            if key.lower() in ppd_lookup:
+                choices = ppd_options[ppd_lookup[key.lower()]]["choices"]
+                if choices and value not in choices:
+                    errors.append(f"{key}={value} (допустимо: {', '.join(choices)})")
+                    continue
+            elif key == "media":
+                media = self.media(printer)
+                if media and value not in media:
+                    errors.append(f"media={value} (допустимо: {', '.join(media)})")
+                    continue
+            elif key not in STANDARD_OPTIONS:
+                errors.append(f"{key} (неизвестная опция)")
+                continue
+            args.extend(["-o", f"{key}={value}"])
+
+        return args, errors
+
+# Глобальный реестр принтеров
+printer_registry = PrinterRegistry(ttl=config.PRINTER_REGISTRY_TTL)
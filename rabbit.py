@@ -2,72 +2,186 @@ import pika
 import json
 import sys
 import time
+import threading
 import traceback
 
 from . import config
-from .printer import print_file
+from .printer import print_file, print_batch, is_small_job, printer_pool
 from .callback import send_callback
 from .utils import setup_logger, update_current_job_id
+from .control import job_control
+from .amqp_results import results_publisher, amqp_results_enabled
+from .metrics import start_job_timer, get_job_timer, finish_job_timer, observe_stage, stage, inc_counter
+from . import errors
 
 logger = setup_logger()
 
 connection = None
 channel = None
 
+# Политики повторов по коду ошибки (errors.py):
+#   delays       - задержки перед повторными попытками, сек (их число = число повторов)
+#   on_exhausted - что делать, когда повторы исчерпаны:
+#                  "requeue" - вернуть в очередь, "park" - переложить в очередь отложенных,
+#                  "drop" - сообщить об ошибке и подтвердить сообщение,
+#                  "defer" - отложить в очередь с задержкой, не занимая воркер
+RETRY_POLICIES = {
+    errors.CIRCUIT_OPEN: {"delays": [], "on_exhausted": "defer"},
+    errors.MEDIA_EMPTY: {"delays": [60, 120, 300, 300, 300], "on_exhausted": "requeue"},
+    errors.MEDIA_JAM: {"delays": [60, 120, 300, 300, 300], "on_exhausted": "requeue"},
+    errors.DOOR_OPEN: {"delays": [30, 60, 120, 300, 300], "on_exhausted": "requeue"},
+    errors.PAUSED: {"delays": [60, 120, 300, 300, 300], "on_exhausted": "requeue"},
+    errors.OFFLINE: {"delays": [15, 30, 60, 120, 300], "on_exhausted": "requeue"},
+    errors.PRINTER_BUSY: {"delays": [15, 30, 60, 120, 300], "on_exhausted": "requeue"},
+    errors.NOT_READY: {"delays": [15, 30, 60, 120, 300], "on_exhausted": "requeue"},
+    errors.TONER_EMPTY: {"delays": [300, 600], "on_exhausted": "park"},
+    errors.CUPS_UNAVAILABLE: {"delays": [15, 30, 60, 120, 300], "on_exhausted": "requeue"},
+    errors.SUBMIT_TIMEOUT: {"delays": [15, 30, 60], "on_exhausted": "requeue"},
+    errors.PRINTER_NOT_FOUND: {"delays": [30, 120], "on_exhausted": "park"},
+    errors.REJECTING_JOBS: {"delays": [60, 300], "on_exhausted": "park"},
+    # Задание уже в очереди CUPS - повторная отправка напечатает его дважды
+    errors.COMPLETION_TIMEOUT: {"delays": [], "on_exhausted": "drop"},
+    errors.CANCELLED: {"delays": [], "on_exhausted": "drop"},
+    errors.CUPS_ERROR: {"delays": [15, 30], "on_exhausted": "drop"},
+    errors.NO_CONTENT: {"delays": [], "on_exhausted": "drop"},
+    errors.UNSUPPORTED_OPTIONS: {"delays": [], "on_exhausted": "drop"},
+    errors.INTERNAL_ERROR: {"delays": [15, 30], "on_exhausted": "drop"},
+}
+DEFAULT_RETRY_POLICY = {"delays": [15, 30, 60, 120, 240], "on_exhausted": "requeue"}
+
+def get_retry_policy(error_code: str) -> dict:
+    return RETRY_POLICIES.get(error_code, DEFAULT_RETRY_POLICY)
+
+def count_job(outcome: str):
+    """Счетчик заданий по исходу: success, requeue, park, drop, defer, cancelled"""
+    inc_counter("print_jobs_total", 1, "Задания печати по исходу", outcome=outcome)
+
+def queue_name() -> str:
+    return f"print_tasks_printer_{config.PRINTER_ID}"
+
+def parked_queue_name() -> str:
+    return f"{queue_name()}_parked"
+
+def defer_delays() -> list:
+    """
+    Ступени задержки отложенных задач, сек: от PRINTER_BREAKER_RESET с удвоением
+    до PRINTER_BREAKER_MAX_RESET. На каждую ступень - своя очередь с общим TTL:
+    брокер истекает сообщения только в голове очереди, поэтому разные задержки
+    в одной очереди задерживали бы короткие за длинными.
+    """
+    delays = []
+    delay = max(int(config.PRINTER_BREAKER_RESET), 1)
+    while delay < config.PRINTER_BREAKER_MAX_RESET:
+        delays.append(delay)
+        delay *= 2
+    delays.append(int(config.PRINTER_BREAKER_MAX_RESET))
+    return delays
+
+def delayed_queue_name(delay: int) -> str:
+    return f"{queue_name()}_delayed_{delay}s"
+
+def declare_delayed_queues(ch):
+    """Очереди задержки: по истечении TTL задачи возвращаются в основную очередь (dead-letter)"""
+    for delay in defer_delays():
+        ch.queue_declare(
+            queue=delayed_queue_name(delay),
+            durable=True,
+            exclusive=False,
+            auto_delete=False,
+            arguments={
+                "x-message-ttl": delay * 1000,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue_name()
+            }
+        )
+
+def control_exchange_name() -> str:
+    return f"print_control_printer_{config.PRINTER_ID}"
+
+# Очередь задач в RabbitMQ по последнему опросу (сообщений, ожидающих выдачи)
+queue_backlog = {"messages": None, "consumers": None, "updated": None}
+
+def get_queue_backlog():
+    """Число задач в очереди RabbitMQ (None если еще не опрашивалась)"""
+    return queue_backlog["messages"]
+
+# Мелкие задания, ожидающие совместной отправки: список (delivery_tag, task)
+pending_batch = []
+batch_timer = None
+
+def send_result(result: dict) -> bool:
+    """
+    Отправляет результат задачи вместе с длительностями этапов.
+    Возвращает False, если результат не сохранен в очередь отправки.
+    """
+    timer = get_job_timer()
+    if timer is not None:
+        result["timings"] = timer.as_dict()
+    with stage("send_callback"):
+        return send_callback(result)
+
+def requeue_unsaved(ch, delivery_tag, job_id):
+    """Результат не сохранен - возвращаем задачу в очередь, чтобы он не потерялся"""
+    logger.error(f"❌ Результат задачи {job_id} не сохранен - задача возвращена в очередь")
+    ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+    count_job("unsaved")
+
 def process_task(task):
     """
     Обработка одной задачи печати.
-    Возвращает:
-      - True, если напечатано успешно
-      - False, если нужно повторить позже (временная ошибка)
-      - None, если фатальная ошибка (не повторять)
+    Возвращает результат print_file; при ошибке в нем заполнен error_code,
+    по которому handle_task выбирает политику повторов.
     """
     try:
         result = print_file(task)
     except Exception as e:
         logger.error(f"Критическая ошибка в print_file: {e}\n{traceback.format_exc()}")
-        send_callback({
+        result = {
             "status": "error",
             "job_id": task.get("job_id"),
-            "error": f"Критическая ошибка: {str(e)}"
-        })
-        return None
+            "error": f"Критическая ошибка: {str(e)}",
+            "error_code": errors.INTERNAL_ERROR
+        }
 
     if result["status"] == "success":
-        send_callback(result)
+        result["persisted"] = send_result(result)
         logger.info(f"[OK] Задача {result['job_id']} успешно напечатана.")
         update_current_job_id({})
-        return True
     else:
-        error_msg = result.get("error", "")
-        logger.warning(f"[ERROR] Ошибка печати: {error_msg}")
-
-        # Временные ошибки (повторяем)
-        temporary_errors = [
-            "недоступен", "timeout", "wait", "занят",
-            "очередь", "busy", "unavailable", "время",
-            "паузе", "paused", "paper", "бумаг", "door", "крышк", "toner", "тонер"
-        ]
-
-        # Ошибка "Печать не завершилась в установленное время" - ВРЕМЕННАЯ ошибка
-        if "печать не завершилась" in error_msg.lower() or "время" in error_msg.lower():
-            logger.info("Таймаут печати - временная ошибка, повторяем позже")
-            return False
+        result.setdefault("error_code", errors.INTERNAL_ERROR)
+        logger.warning(f"[ERROR] Ошибка печати [{result['error_code']}]: {result.get('error', '')}")
+
+    return result
+
+def park_task(ch, task, result):
+    """Перекладывает задачу в очередь отложенных для ручного разбора"""
+    parked = dict(task)
+    parked["parked_error"] = result.get("error")
+    parked["parked_error_code"] = result.get("error_code")
+    ch.basic_publish(
+        exchange="",
+        routing_key=parked_queue_name(),
+        body=json.dumps(parked),
+        properties=pika.BasicProperties(delivery_mode=2)
+    )
+    logger.warning(f"📦 Задача {task.get('job_id')} перемещена в очередь {parked_queue_name()}")
 
-        if any(keyword in error_msg.lower() for keyword in temporary_errors):
-            return False  # Временная ошибка - повторяем
-        else:
-            # Фатальная ошибка - не повторяем
-            send_callback({
-                "status": "error",
-                "job_id": task.get("job_id"),
-                "error": error_msg
-            })
-            return None
+def finish_failed_task(ch, delivery_tag, task, result, action: str):
+    """
+    Завершает задачу с ошибкой без повторной печати: сообщает результат
+    и подтверждает сообщение, при action == "park" - перекладывает в очередь отложенных.
+    """
+    if not send_result(dict(result, job_id=task.get("job_id"))):
+        requeue_unsaved(ch, delivery_tag, task.get("job_id"))
+        return
+    if action == "park":
+        park_task(ch, task, result)
+    ch.basic_ack(delivery_tag=delivery_tag)
+    count_job(action)
 
 def wait_with_connection_check(seconds, connection):
     """
-    Ожидание с проверкой соединения
+    Ожидание с проверкой соединения (прерывается отменой текущего задания)
     Возвращает True если соединение активно, False если разорвано
     """
     interval = 0.5
@@ -75,7 +189,8 @@ def wait_with_connection_check(seconds, connection):
     for i in range(steps):
         if connection is None or connection.is_closed:
             return False
-        time.sleep(interval)
+        if job_control.wait_cancelled(interval):
+            return True
         # Периодически обрабатываем события соединения
         if i % 10 == 0:  # Каждые 5 секунд
             try:
@@ -84,12 +199,50 @@ def wait_with_connection_check(seconds, connection):
                 return False
     return True
 
+def wait_while_paused(connection):
+    """
+    Ожидание снятия паузы с обслуживанием соединения.
+    Возвращает True если соединение активно, False если разорвано
+    """
+    i = 0
+    while job_control.paused:
+        if connection is None or connection.is_closed:
+            return False
+        job_control.wait_resumed(0.5)
+        i += 1
+        if i % 10 == 0:  # Каждые 5 секунд
+            try:
+                connection.process_data_events()
+            except:
+                return False
+    return True
+
+def skip_cancelled(ch, delivery_tag, task):
+    """Подтверждает отмененную задачу без печати и сообщает об отмене"""
+    job_id = task.get("job_id")
+    count_job("cancelled")
+    logger.info(f"🛑 Задача {job_id} отменена - пропускаем")
+    persisted = send_result({
+        "job_id": job_id,
+        "printer": config.PRINTER_ID,
+        "status": "error",
+        "error": "Задание отменено",
+        "error_code": errors.CANCELLED
+    })
+    if not persisted:
+        # Задача останется в наборе отмененных и будет пропущена снова
+        requeue_unsaved(ch, delivery_tag, job_id)
+        return
+    ch.basic_ack(delivery_tag=delivery_tag)
+    job_control.forget(job_id)
+
 def callback(ch, method, properties, body):
     """
     Обработчик входящих сообщений из RabbitMQ.
     """
-    global connection
+    global batch_timer
 
+    decode_started = time.monotonic()
     try:
         task = json.loads(body.decode())
         logger.info(f"Получена задача: {task.get('job_id', 'unknown')}")
@@ -97,65 +250,224 @@ def callback(ch, method, properties, body):
         logger.error(f"Ошибка: неверный формат задачи ({e})")
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         return
+    decode_seconds = time.monotonic() - decode_started
+
+    if config.PRINT_BATCH_WINDOW > 0 and is_small_job(task):
+        observe_stage("json_decode", decode_seconds)
+        pending_batch.append((method.delivery_tag, task))
+        if len(pending_batch) >= config.PRINT_BATCH_MAX_JOBS:
+            flush_batch(ch)
+        elif batch_timer is None:
+            batch_timer = connection.call_later(config.PRINT_BATCH_WINDOW, lambda: on_batch_timer(ch))
+        return
+
+    # Крупное задание - сначала отправляем накопленную пачку, чтобы сохранить порядок
+    if pending_batch:
+        flush_batch(ch)
+
+    run_task(ch, method.delivery_tag, task, decode_seconds)
 
-    max_retries = 5
-    retry_count = 0
+def run_task(ch, delivery_tag, task, decode_seconds=None):
+    """Обрабатывает задачу с замером длительности этапов"""
+    timer = start_job_timer(task.get("job_id"))
+    if decode_seconds is not None:
+        timer.record("json_decode", decode_seconds)
+    job_control.begin_job(task.get("job_id"))
+    try:
+        handle_task(ch, delivery_tag, task)
+    finally:
+        job_control.end_job()
+        finish_job_timer()
+
+def on_batch_timer(ch):
+    """Истекло окно ожидания пачки"""
+    global batch_timer
+    batch_timer = None
+    flush_batch(ch)
+
+def flush_batch(ch):
+    """
+    Отправляет накопленные мелкие задания одной пачкой.
+    Если пачка не дошла до CUPS, задания обрабатываются по отдельности с обычными повторами.
+    Если CUPS уже принял пачку, повтор напечатает документы дважды - ошибка пачки
+    применяется к каждому заданию по итоговому действию политики (park или drop).
+    """
+    global pending_batch, batch_timer
 
-    while retry_count <= max_retries:
+    if batch_timer is not None:
         try:
-            # Проверяем соединение перед обработкой
-            if connection is None or connection.is_closed:
-                logger.warning("Соединение разорвано, прерываем обработку задачи")
-                return
+            connection.remove_timeout(batch_timer)
+        except Exception:
+            pass
+        batch_timer = None
 
-            result = process_task(task)
+    batch, pending_batch = pending_batch, []
 
-            if result is True:
-                # Успех - подтверждаем сообщение
-                ch.basic_ack(delivery_tag=method.delivery_tag)
-                return
-            elif result is False:
-                # Временная ошибка - повторяем после ожидания
-                retry_count += 1
-                if retry_count <= max_retries:
-                    # Увеличиваем задержку с каждой попыткой (exponential backoff)
-                    delay = min(15 * (2 ** (retry_count - 1)), 300)  # max 5 минут
-                    logger.info(f"Повторная попытка {retry_count}/{max_retries} через {delay} сек")
-                    if not wait_with_connection_check(delay, connection):
-                        logger.warning("Соединение разорвано во время ожидания")
-                        return
-                else:
-                    logger.warning(f"Превышено количество попыток для задачи {task.get('job_id')}")
-                    # ВОЗВРАЩАЕМ ЗАДАЧУ В ОЧЕРЕДЬ вместо подтверждения
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                    return
-            else:
-                # Фатальная ошибка - подтверждаем и не повторяем
-                logger.error(f"Фатальная ошибка для задачи {task.get('job_id')}")
-                # ch.basic_ack(delivery_tag=method.delivery_tag) # повторяем
-                return
+    # Отмененные задания пачки подтверждаем без печати
+    staged = []
+    for delivery_tag, task in batch:
+        if job_control.is_cancelled(task.get("job_id")):
+            skip_cancelled(ch, delivery_tag, task)
+        else:
+            staged.append((delivery_tag, task))
+    batch = staged
+
+    if not batch:
+        return
+
+    if len(batch) == 1:
+        run_task(ch, *batch[0])
+        return
+
+    start_job_timer(f"batch_{len(batch)}")
+    try:
+        results = print_batch([task for _, task in batch])
+    except Exception as e:
+        logger.error(f"Критическая ошибка в print_batch: {e}\n{traceback.format_exc()}")
+        results = [None] * len(batch)
+    finally:
+        batch_timings = finish_job_timer()
+
+    for (delivery_tag, task), result in zip(batch, results):
+        if result is not None and result["status"] == "success":
+            result["timings"] = batch_timings
+            callback_started = time.monotonic()
+            persisted = send_callback(result)
+            observe_stage("send_callback", time.monotonic() - callback_started)
+            logger.info(f"[OK] Задача {result['job_id']} успешно напечатана в составе пачки.")
+            if not persisted:
+                requeue_unsaved(ch, delivery_tag, result['job_id'])
+                continue
+            ch.basic_ack(delivery_tag=delivery_tag)
+            count_job("success")
+        elif result is None or not result.get("submitted"):
+            run_task(ch, delivery_tag, task)
+        else:
+            error_code = result.get("error_code") or errors.INTERNAL_ERROR
+            action = "park" if get_retry_policy(error_code)["on_exhausted"] == "park" else "drop"
+            logger.warning(f"[{error_code}] Пачка уже принята CUPS - задача {task.get('job_id')} "
+                           f"не повторяется, действие: {action}")
+            try:
+                finish_failed_task(ch, delivery_tag, task, result, action)
+            except Exception as e:
+                logger.error(f"Не удалось завершить обработку сообщения - соединение разорвано: {e}")
+
+def defer_task(ch, delivery_tag, task, delay: float):
+    """
+    Откладывает задачу в очередь с задержкой: по истечении TTL брокер
+    вернет ее в основную очередь (dead-letter). CUPS при этом не опрашивается.
+    Исходное сообщение подтверждается только после подтверждения публикации брокером.
+    """
+    delays = defer_delays()
+    delay = next((step for step in delays if step >= delay), delays[-1])
+    try:
+        ch.basic_publish(
+            exchange="",
+            routing_key=delayed_queue_name(delay),
+            body=json.dumps(task),
+            properties=pika.BasicProperties(delivery_mode=2),
+            mandatory=True
+        )
+    except (pika.exceptions.UnroutableError, pika.exceptions.NackError) as e:
+        logger.error(f"❌ Брокер не принял отложенную задачу {task.get('job_id')}: {e} - возвращаем в очередь")
+        ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        count_job("requeue")
+        return
+    ch.basic_ack(delivery_tag=delivery_tag)
+    count_job("defer")
+    logger.info(f"⏸️ Задача {task.get('job_id')} отложена на {delay:.0f} сек: принтеры недоступны")
+
+def handle_task(ch, delivery_tag, task):
+    """
+    Обрабатывает задачу с повторами по политике кода ошибки
+    и подтверждает/возвращает сообщение.
+    """
+    attempt = 0
+
+    while True:
+        # Проверяем соединение перед обработкой
+        if connection is None or connection.is_closed:
+            logger.warning("Соединение разорвано, прерываем обработку задачи")
+            return
 
+        # Воркер на паузе - не берем задачу в работу до снятия паузы
+        if not wait_while_paused(connection):
+            logger.warning("Соединение разорвано во время паузы")
+            return
+
+        if job_control.is_cancelled(task.get("job_id")):
+            try:
+                skip_cancelled(ch, delivery_tag, task)
+            except Exception as e:
+                logger.error(f"Не удалось подтвердить отмененную задачу - соединение разорвано: {e}")
+            return
+
+        # Все предохранители принтеров разомкнуты - откладываем, не трогая CUPS
+        retry_after = printer_pool.retry_after()
+        if retry_after > 0:
+            try:
+                defer_task(ch, delivery_tag, task, retry_after)
+            except Exception as e:
+                logger.error(f"Не удалось отложить задачу - соединение разорвано: {e}")
+            return
+
+        try:
+            result = process_task(task)
         except Exception as e:
             logger.error(f"Ошибка обработки задачи: {e}\n{traceback.format_exc()}")
-            retry_count += 1
-            if retry_count <= max_retries:
-                delay = min(15 * (2 ** (retry_count - 1)), 300)
-                if not wait_with_connection_check(delay, connection):
-                    return
-            else:
-                logger.error("Превышено количество попыток из-за исключений")
-                # ВОЗВРАЩАЕМ ЗАДАЧУ В ОЧЕРЕДЬ при исключениях
-                try:
-                    ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-                except:
-                    logger.error("Не удалось отправить NACK - соединение разорвано")
+            result = {
+                "status": "error",
+                "job_id": task.get("job_id"),
+                "error": f"Ошибка обработки задачи: {str(e)}",
+                "error_code": errors.INTERNAL_ERROR
+            }
+
+        if result["status"] == "success":
+            if not result.get("persisted", True):
+                requeue_unsaved(ch, delivery_tag, task.get("job_id"))
+                return
+            # Успех - подтверждаем сообщение
+            ch.basic_ack(delivery_tag=delivery_tag)
+            count_job("success")
+            return
+
+        error_code = result["error_code"]
+        policy = get_retry_policy(error_code)
+        delays = policy["delays"]
+
+        if result.get("submitted"):
+            # CUPS уже принял задание - повтор напечатает его дважды
+            delays = []
+
+        if attempt < len(delays):
+            delay = delays[attempt]
+            attempt += 1
+            inc_counter("print_retries_total", 1, "Повторные попытки печати по коду ошибки", code=error_code)
+            logger.info(f"[{error_code}] Повторная попытка {attempt}/{len(delays)} через {delay} сек")
+            if not wait_with_connection_check(delay, connection):
+                logger.warning("Соединение разорвано во время ожидания")
                 return
+            continue
 
-    # Если вышли из цикла - ВОЗВРАЩАЕМ В ОЧЕРЕДЬ
-    try:
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
-    except:
-        logger.error("Не удалось отправить NACK - соединение разорвано")
+        action = policy["on_exhausted"]
+        if result.get("submitted") and action not in ("park", "drop"):
+            action = "drop"
+        logger.warning(f"[{error_code}] Повторы исчерпаны для задачи {task.get('job_id')}, действие: {action}")
+        try:
+            if action == "requeue":
+                # ВОЗВРАЩАЕМ ЗАДАЧУ В ОЧЕРЕДЬ вместо подтверждения
+                ch.basic_nack(delivery_tag=delivery_tag, requeue=True)
+                count_job("requeue")
+            elif action == "defer":
+                defer_task(ch, delivery_tag, task, printer_pool.retry_after())
+            elif action == "park":
+                finish_failed_task(ch, delivery_tag, task, result, "park")
+            else:
+                # Фатальная ошибка - сообщаем и больше не повторяем
+                finish_failed_task(ch, delivery_tag, task, result, "drop")
+        except Exception as e:
+            logger.error(f"Не удалось завершить обработку сообщения - соединение разорвано: {e}")
+        return
 
 def create_connection():
     """Создает новое соединение с увеличенным heartbeat"""
@@ -176,8 +488,86 @@ def create_connection():
 
     return pika.BlockingConnection(parameters)
 
+def on_control_message(ch, method, properties, body):
+    """Обработчик команд канала управления (cancel, pause, resume)"""
+    try:
+        command = json.loads(body.decode())
+        logger.info(f"Получена команда управления: {command}")
+        job_control.handle_command(command)
+    except Exception as e:
+        logger.error(f"Ошибка: неверный формат команды управления ({e})")
+
+def poll_queue_backlog(control_connection, control_channel):
+    """
+    Периодически узнает размер основной очереди.
+    Выполняется в потоке канала управления - поток печати не блокируется.
+    """
+    try:
+        declared = control_channel.queue_declare(queue=queue_name(), durable=True, exclusive=False, auto_delete=False)
+        queue_backlog.update({
+            "messages": declared.method.message_count,
+            "consumers": declared.method.consumer_count,
+            "updated": time.time()
+        })
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось получить размер очереди: {e}")
+        return
+    control_connection.call_later(
+        config.QUEUE_BACKLOG_INTERVAL,
+        lambda: poll_queue_backlog(control_connection, control_channel)
+    )
+
+def consume_control():
+    """
+    Потребитель канала управления на собственном соединении:
+    команды обрабатываются параллельно с печатью.
+    """
+    reconnect_delay = 5
+    max_reconnect_delay = 60
+
+    while True:
+        control_connection = None
+        try:
+            control_connection = create_connection()
+            control_channel = control_connection.channel()
+
+            exchange = control_exchange_name()
+            control_channel.exchange_declare(exchange=exchange, exchange_type="fanout", durable=True)
+            # Команды актуальны только для запущенного воркера - временная очередь
+            declared = control_channel.queue_declare(queue="", exclusive=True, auto_delete=True)
+            control_channel.queue_bind(exchange=exchange, queue=declared.method.queue)
+            control_channel.basic_consume(
+                queue=declared.method.queue,
+                on_message_callback=on_control_message,
+                auto_ack=True
+            )
+
+            logger.info(f"✅ Канал управления подключен: {exchange}")
+            reconnect_delay = 5
+            poll_queue_backlog(control_connection, control_channel)
+            if amqp_results_enabled():
+                results_publisher.attach(control_connection)
+            control_channel.start_consuming()
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка канала управления: {e}")
+
+        results_publisher.detach()
+        try:
+            if control_connection and control_connection.is_open:
+                control_connection.close()
+        except:
+            pass
+
+        time.sleep(reconnect_delay)
+        reconnect_delay = min(reconnect_delay * 2, max_reconnect_delay)
+
+def start_control_thread():
+    t = threading.Thread(target=consume_control, daemon=True)
+    t.start()
+
 def start_rabbit():
-    global connection, channel
+    global connection, channel, batch_timer
 
     reconnect_delay = 5  # Начальная задержка переподключения
     max_reconnect_delay = 60  # Максимальная задержка
@@ -187,13 +577,19 @@ def start_rabbit():
             logger.info(f"Попытка подключения к RabbitMQ...")
             connection = create_connection()
             channel = connection.channel()
-
-            queue_name = f"print_tasks_printer_{config.PRINTER_ID}"
-            channel.queue_declare(queue=queue_name, durable=True, exclusive=False, auto_delete=False)
-            channel.basic_qos(prefetch_count=1)
-            channel.basic_consume(queue=queue_name, on_message_callback=callback)
-
-            logger.info(f"✅ Успешное подключение к RabbitMQ. Очередь: {queue_name}")
+            # Публикации в очереди задержки и отложенных подтверждаются брокером
+            channel.confirm_delivery()
+
+            main_queue = queue_name()
+            channel.queue_declare(queue=main_queue, durable=True, exclusive=False, auto_delete=False)
+            channel.queue_declare(queue=parked_queue_name(), durable=True, exclusive=False, auto_delete=False)
+            declare_delayed_queues(channel)
+            # При объединении заданий брокер должен выдавать сразу несколько сообщений
+            prefetch_count = config.PRINT_BATCH_MAX_JOBS if config.PRINT_BATCH_WINDOW > 0 else 1
+            channel.basic_qos(prefetch_count=prefetch_count)
+            channel.basic_consume(queue=main_queue, on_message_callback=callback)
+
+            logger.info(f"✅ Успешное подключение к RabbitMQ. Очередь: {main_queue}")
             logger.info(f"✅ Heartbeat установлен на 600 секунд")
 
             # Сброс задержки переподключения при успешном подключении
@@ -211,6 +607,10 @@ def start_rabbit():
         except Exception as e:
             logger.error(f"❌ Неожиданная ошибка: {e}\n{traceback.format_exc()}")
 
+        # Неподтвержденные сообщения пачки брокер вернет в очередь сам
+        pending_batch.clear()
+        batch_timer = None
+
         # Закрытие соединения при ошибке
         try:
             if connection and connection.is_open:
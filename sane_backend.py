@@ -0,0 +1,247 @@
+"""
+Бэкенды доступа к сканеру.
+scanimage - внешняя команда на каждую операцию (по умолчанию),
+sane - библиотека python-sane внутри процесса: устройство открывается один раз
+и остается открытым между сканированиями,
+fake - генерирует листы без сканера (для тестов и отладки).
+"""
+
+import os
+import struct
+import subprocess
+import threading
+import zlib
+
+try:
+    import sane
+except ImportError:
+    sane = None
+
+import config
+from utils import setup_logger
+from metrics import run_command
+
+logger = setup_logger()
+
+class ScanBackendError(Exception):
+    """Ошибка сканирования в бэкенде (текст как у stderr scanimage)"""
+
+def _device_line(name: str, vendor: str, model: str, kind: str) -> str:
+    """Строка устройства в формате вывода scanimage -L"""
+    return f"device `{name}' is a {vendor} {model} {kind}"
+
+def _parse_options(options) -> dict:
+    """Опции вида --name=value из SCANNER_ADF_OPTIONS в словарь name -> value"""
+    parsed = {}
+    for option in options or []:
+        if not option.startswith("--"):
+            continue
+        name, _, value = option[2:].partition("=")
+        parsed[name] = value if value else True
+    return parsed
+
+class ScanimageBackend:
+    """Сканирование внешней командой scanimage (сканирует сам ScannerManager)"""
+
+    name = "scanimage"
+    in_process = False
+
+    def list_devices(self) -> list:
+        """Строки scanimage -L (пустой список, если команда завершилась с ошибкой)"""
+        result = run_command(
+            ["scanimage", "-L"],
+            capture_output=True,
+            text=True,
+            timeout=80
+        )
+        if result.returncode != 0:
+            return []
+        return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+    def is_ready(self, device: str) -> bool:
+        try:
+            result = run_command(
+                ["scanimage", f"--device-name={device}", "--help"],
+                capture_output=True,
+                text=True,
+                timeout=10
+            )
+            return result.returncode == 0
+        except (subprocess.TimeoutExpired, subprocess.SubprocessError, FileNotFoundError):
+            return False
+
+    def close(self):
+        pass
+
+class SaneBackend:
+    """
+    Сканирование через python-sane внутри процесса.
+    Устройство открывается при первом обращении и остается открытым, поэтому
+    поиск устройства и открытие бэкенда (airscan/eSCL) не повторяются на каждом скане.
+    При ошибке устройство закрывается и будет открыто заново при следующем обращении.
+    """
+
+    name = "sane"
+    in_process = True
+
+    def __init__(self):
+        if sane is None:
+            raise ScanBackendError("python-sane не установлен. Установите: pip install python-sane")
+        self._lock = threading.RLock()
+        self._initialized = False
+        self._device_name = None
+        self._handle = None
+
+    def _ensure_init(self):
+        if not self._initialized:
+            version = sane.init()
+            self._initialized = True
+            logger.info(f"✅ SANE инициализирован (версия {version})")
+
+    def _open(self, device: str):
+        if self._handle is not None and self._device_name == device:
+            return self._handle
+        self._close_handle()
+        self._ensure_init()
+        logger.info(f"🔌 Открываем устройство SANE: {device}")
+        self._handle = sane.open(device)
+        self._device_name = device
+        return self._handle
+
+    def _close_handle(self):
+        if self._handle is not None:
+            try:
+                self._handle.close()
+            except Exception as e:
+                logger.debug(f"Ошибка закрытия устройства SANE: {e}")
+        self._handle = None
+        self._device_name = None
+
+    def list_devices(self) -> list:
+        with self._lock:
+            self._ensure_init()
+            return [_device_line(*device) for device in sane.get_devices()]
+
+    def is_ready(self, device: str) -> bool:
+        """Устройство открыто и отвечает на запрос параметров"""
+        with self._lock:
+            try:
+                self._open(device).get_parameters()
+                return True
+            except Exception as e:
+                logger.debug(f"Устройство SANE не готово: {e}")
+                self._close_handle()
+                return False
+
+    def _configure(self, handle, dpi: int, mode: str, use_adf: bool):
+        handle.resolution = int(dpi)
+        handle.mode = mode
+        if use_adf:
+            options = {"source": "ADF"}
+            options.update(_parse_options(getattr(config, 'SCANNER_ADF_OPTIONS', [])))
+            for name, value in options.items():
+                attribute = name.replace("-", "_")
+                if attribute not in handle.opt:
+                    logger.debug(f"Опция {name} не поддерживается устройством, пропускаем")
+                    continue
+                setattr(handle, attribute, value)
+
+    def scan_pages(self, device: str, dpi: int, mode: str, use_adf: bool, output_dir: str, prefix: str):
+        """
+        Сканирует листы и сохраняет каждый в PNG, возвращая путь сразу после сохранения.
+        С автоподатчиком сканирует до опустошения лотка.
+        """
+        with self._lock:
+            try:
+                handle = self._open(device)
+                self._configure(handle, dpi, mode, use_adf)
+                images = handle.multi_scan() if use_adf else iter([handle.scan()])
+                for page_number, image in enumerate(images, 1):
+                    page_path = os.path.join(output_dir, f"{prefix}_p{page_number:04d}.png")
+                    image.save(page_path, "PNG", dpi=(dpi, dpi))
+                    yield page_path
+            except Exception as e:
+                self._close_handle()
+                raise ScanBackendError(str(e)) from e
+
+    def close(self):
+        with self._lock:
+            self._close_handle()
+            if self._initialized:
+                sane.exit()
+                self._initialized = False
+
+def _write_png(path: str, width: int, height: int, rows):
+    """PNG в оттенках серого без Pillow: rows - строки пикселей (bytes длиной width)"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+
+    raw = b"".join(b"\x00" + bytes(row) for row in rows)
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw)))
+        f.write(chunk(b"IEND", b""))
+
+class FakeBackend:
+    """
+    Сканер без оборудования: каждый лист - белая страница с черными строками "текста".
+    Число листов ADF задается FAKE_SCANNER_PAGES, готовность - атрибутом ready.
+    """
+
+    name = "fake"
+    in_process = True
+
+    def __init__(self, pages: int = None, width: int = 248, height: int = 350):
+        # Имя устройства из конфига, чтобы поиск SCANNER_DEVICE находил фейковый сканер
+        self.device = getattr(config, 'SCANNER_DEVICE', None) or "fake:scanner"
+        self.pages = pages if pages is not None else getattr(config, 'FAKE_SCANNER_PAGES', 3)
+        self.width = width
+        self.height = height
+        self.ready = True
+        self.scans = 0
+
+    def list_devices(self) -> list:
+        return [_device_line(self.device, "Fake", "Scanner", "virtual device")]
+
+    def is_ready(self, device: str) -> bool:
+        return self.ready
+
+    def _page_rows(self):
+        white = bytes([255]) * self.width
+        line = bytes([255] * 20 + [0] * (self.width - 40) + [255] * 20)
+        for y in range(self.height):
+            yield line if 30 <= y < self.height - 30 and y % 12 < 4 else white
+
+    def scan_pages(self, device: str, dpi: int, mode: str, use_adf: bool, output_dir: str, prefix: str):
+        if not self.ready:
+            raise ScanBackendError("scanner not ready")
+        self.scans += 1
+        for page_number in range(1, (self.pages if use_adf else 1) + 1):
+            page_path = os.path.join(output_dir, f"{prefix}_p{page_number:04d}.png")
+            _write_png(page_path, self.width, self.height, self._page_rows())
+            yield page_path
+
+    def close(self):
+        pass
+
+BACKENDS = {
+    ScanimageBackend.name: ScanimageBackend,
+    SaneBackend.name: SaneBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+def create_backend(name: str = None):
+    """Бэкенд по имени из SCANNER_BACKEND; при недоступном бэкенде - scanimage"""
+    name = (name or getattr(config, 'SCANNER_BACKEND', ScanimageBackend.name)).lower()
+    backend_class = BACKENDS.get(name)
+    if backend_class is None:
+        logger.warning(f"⚠️ Неизвестный бэкенд сканера '{name}', используем scanimage")
+        return ScanimageBackend()
+    try:
+        backend = backend_class()
+    except ScanBackendError as e:
+        logger.warning(f"⚠️ {e}. Используем scanimage")
+        return ScanimageBackend()
+    logger.info(f"🔧 Бэкенд сканера: {backend.name}")
+    return backend
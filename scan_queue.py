@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+
+import config
+from utils import setup_logger
+from metrics import set_gauge, inc_counter
+
+logger = setup_logger()
+
+class ScanRequestQueue:
+    """
+    Очередь запросов на сканирование.
+    Слушатель кнопок только ставит запрос в очередь, сканирование выполняет
+    отдельный поток по одному запросу за раз. Нажатия чаще SCAN_COALESCE_WINDOW
+    (двойное нажатие, удержание кнопки) объединяются в один запрос, при
+    заполненной очереди (SCAN_QUEUE_SIZE) новые нажатия отклоняются.
+    """
+
+    def __init__(self, maxsize: int = None, coalesce_window: float = None):
+        self.maxsize = maxsize or getattr(config, 'SCAN_QUEUE_SIZE', 5)
+        self.coalesce_window = (coalesce_window if coalesce_window is not None
+                                else getattr(config, 'SCAN_COALESCE_WINDOW', 1.5))
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        self._lock = threading.Lock()
+        self._last_trigger = 0.0
+        self._running = False
+        self._thread = None
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _update_depth(self):
+        set_gauge("scan_queue_depth", self._queue.qsize(), "Запросы на сканирование в очереди")
+
+    def submit(self, callback, source: str = "button") -> bool:
+        """Ставит сканирование в очередь. Возвращает False, если нажатие объединено или отклонено"""
+        now = time.monotonic()
+        # Окно отсчитывается от последнего поставленного в очередь нажатия,
+        # иначе серия частых нажатий продлевала бы его бесконечно
+        with self._lock:
+            since_last = now - self._last_trigger
+            if since_last >= self.coalesce_window:
+                try:
+                    self._queue.put_nowait((callback, source, time.time()))
+                    self._last_trigger = now
+                    outcome = "queued"
+                except queue.Full:
+                    outcome = "rejected"
+            else:
+                outcome = "coalesced"
+
+        if outcome == "coalesced":
+            logger.debug(f"🔁 Повторное нажатие через {since_last:.1f} сек - объединено с предыдущим")
+            inc_counter("scan_requests_total", 1, "Запросы на сканирование", outcome="coalesced")
+            return False
+        if outcome == "rejected":
+            logger.warning(f"⚠️ Очередь сканирования заполнена ({self.maxsize}), нажатие отклонено")
+            inc_counter("scan_requests_total", 1, "Запросы на сканирование", outcome="rejected")
+            return False
+
+        inc_counter("scan_requests_total", 1, "Запросы на сканирование", outcome="queued")
+        self._update_depth()
+        pending = self._queue.qsize()
+        if pending > 1:
+            logger.info(f"📥 Сканирование поставлено в очередь (ожидают: {pending})")
+        return True
+
+    def _run(self):
+        logger.info("📋 Исполнитель очереди сканирования запущен")
+        while self._running:
+            try:
+                callback, source, queued_at = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._update_depth()
+            waited = time.time() - queued_at
+            if waited >= 1:
+                logger.info(f"🎯 Запускаем сканирование из очереди (ожидало {waited:.0f} сек)")
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Ошибка сканирования из очереди ({source}): {e}")
+            finally:
+                self._queue.task_done()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        """Останавливает исполнитель; текущее сканирование завершается, ожидающие отбрасываются"""
+        self._running = False
+        dropped = 0
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+                dropped += 1
+            except queue.Empty:
+                break
+        if dropped:
+            logger.warning(f"⚠️ Отменено ожидающих сканирований: {dropped}")
+        self._update_depth()
+        if self._thread:
+            self._thread.join(timeout)
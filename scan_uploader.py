@@ -7,6 +7,7 @@ import os
 
 import config
 from utils import setup_logger
+from http_client import http_client
 
 logger = setup_logger()
 
@@ -77,12 +78,12 @@ class ScanUploader:
             logger.info(f"📤 Отправка скана {scan_result['scan_id']} на {upload_url}")
 
             # Отправляем запрос
-            response = requests.post(
+            response = http_client.post(
                 upload_url,
+                endpoint="scan_upload",
                 files=files,
                 data=data,
-                headers=headers,
-                timeout=30
+                headers=headers
             )
 
             if response.status_code == 200:
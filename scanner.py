@@ -9,6 +9,8 @@ import threading
 import logging
 import re
 import json
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 
 try:
@@ -19,6 +21,14 @@ except ImportError:
 
 import config
 from utils import setup_logger
+from preflight import inspect_pdf_file
+from metrics import run_command, inc_counter, observe_histogram
+from image_processing import image_to_pdf, detect_page_mode
+from adf_pages import get_page_pool, reset_page_pool, convert_adf_page
+from sane_backend import create_backend, ScanBackendError
+from scanner_monitor import ReadinessMonitor
+from scanner_wakeup import WakeUpStrategy
+from scan_queue import ScanRequestQueue
 
 logger = setup_logger()
 
@@ -68,7 +78,9 @@ class ScanStorage:
                 "file_size": os.path.getsize(scan_path),
                 "format": file_extension,
                 "dpi": getattr(config, 'SCANNER_DPI', 300),
-                "mode": getattr(config, 'SCANNER_MODE', 'Color'),
+                "mode": scan_result.get("mode", getattr(config, 'SCANNER_MODE', 'Color')),
+                "scanned_mode": getattr(config, 'SCANNER_MODE', 'Color'),
+                "compression": scan_result.get("compression"),
                 "created_at": datetime.now().isoformat(),
                 "status": "pending",  # pending, uploaded, error
                 "upload_attempts": 0,
@@ -105,124 +117,129 @@ class ScannerManager:
         self.keyboard_listener = None
         self.current_scan_callback = None
 
-        # Защита от множественного запуска
+        # Идет ли сейчас сканирование (очередность обеспечивает scan_queue)
         self.scan_in_progress = False
-        self.last_scan_time = 0
-        self.scan_cooldown = 3
+
+        # Нажатия кнопок ставят сканирование в очередь, сканирует отдельный поток
+        self.scan_queue = ScanRequestQueue()
 
         # Хранилище сканов
         self.storage = ScanStorage()
 
-        # Кеш для данных сканера
-        self._scanner_cache = None
-        self._scanner_cache_time = 0
-        self._scanner_cache_ttl = 900
+        # Доступ к сканеру: scanimage, python-sane или fake (SCANNER_BACKEND)
+        self.backend = create_backend()
 
-        # Кеш для доступных сканеров
+        # Кеш найденных сканеров (строки scanimage -L), сохраняется на диск между перезапусками
+        self._scanner_cache_ttl = getattr(config, 'SCANNER_CACHE_TTL', 900)
+        self._scanner_cache_path = getattr(config, 'SCANNER_CACHE_PATH', 'scanner_cache.json')
         self._available_scanners_cache = None
         self._available_scanners_cache_time = 0
+        self._discovery_lock = threading.Lock()
+        self._discovery_thread = None
+        # Сохраненный список используется сразу, но при первом обращении перепроверяется
+        self._revalidate_pending = False
+        self._load_scanner_cache()
 
-    def _get_scanner_cache(self):
-        """Получает кешированные данные сканера, если они еще актуальны"""
-        if (self._scanner_cache and
-            time.time() - self._scanner_cache_time < self._scanner_cache_ttl):
-            return self._scanner_cache
-        return None
+        # Пробуждение сканера с учетом истории успешных способов
+        self.wakeup = WakeUpStrategy(self._check_scanner_ready)
 
-    def _set_scanner_cache(self, value):
-        """Устанавливает кеш сканера"""
-        self._scanner_cache = value
-        self._scanner_cache_time = time.time()
+        # Устройство занимает либо сканирование, либо фоновая проверка готовности
+        self.device_lock = threading.Lock()
 
-    def can_start_scan(self):
-        """Проверяет, можно ли начать новое сканирование"""
-        if self.scan_in_progress:
-            logger.debug("⏳ Сканирование уже выполняется, пропускаем")
-            return False
+        # Фоновая проверка готовности и keep-alive сканера (запускается службой)
+        self.readiness = ReadinessMonitor(self)
 
-        current_time = time.time()
-        if current_time - self.last_scan_time < self.scan_cooldown:
-            logger.debug("⏳ Сканирование было недавно, пропускаем")
-            return False
+    def _load_scanner_cache(self):
+        """Загружает список сканеров, найденный при прошлом запуске"""
+        try:
+            with open(self._scanner_cache_path, "r", encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("backend") != self.backend.name:
+                return
+            self._available_scanners_cache = cached["scanners"]
+            self._available_scanners_cache_time = cached["timestamp"]
+            self._revalidate_pending = True
+            age = int(time.time() - self._available_scanners_cache_time)
+            logger.info(f"📂 Загружен сохраненный список сканеров ({len(cached['scanners'])} шт., возраст {age} сек)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать кеш сканеров {self._scanner_cache_path}: {e}")
 
-        return True
+    def _save_scanner_cache(self):
+        """Сохраняет список сканеров на диск (через временный файл)"""
+        tmp_path = f"{self._scanner_cache_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                json.dump({
+                    "backend": self.backend.name,
+                    "timestamp": self._available_scanners_cache_time,
+                    "scanners": self._available_scanners_cache
+                }, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self._scanner_cache_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить кеш сканеров: {e}")
 
-    def scanner_exists(self) -> bool:
-        """Проверяет, доступен ли указанный в конфиге сканер (с кешированием)"""
-        cached_result = self._get_scanner_cache()
-        if cached_result is not None:
-            logger.debug("✅ Используем кешированные данные сканера")
-            return cached_result
+    def _scanner_cache_stale(self) -> bool:
+        return time.time() - self._available_scanners_cache_time >= self._scanner_cache_ttl
 
+    def _discover_scanners(self):
+        """
+        Поиск сканеров через бэкенд. Обновляет кеш и возвращает список,
+        при ошибке возвращает None, кеш не меняется.
+        """
         try:
-            result = subprocess.run(
-                ["scanimage", "-L"],
-                capture_output=True,
-                text=True,
-                timeout=80
-            )
-
-            scanner_available = False
-            if result.returncode == 0:
-                if hasattr(config, 'SCANNER_DEVICE') and config.SCANNER_DEVICE:
-                    scanner_available = config.SCANNER_DEVICE in result.stdout
-                else:
-                    scanner_available = bool(result.stdout.strip())
+            scanners = self.backend.list_devices()
+        except subprocess.TimeoutExpired:
+            logger.error("❌ Таймаут при получении списка сканеров")
+            return None
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении списка сканеров: {e}")
+            return None
 
-            # Кешируем результат
-            self._set_scanner_cache(scanner_available)
+        self._available_scanners_cache = scanners
+        self._available_scanners_cache_time = time.time()
+        self._save_scanner_cache()
+        logger.info(f"✅ Получен список сканеров ({len(scanners)} шт.), данные закешированы")
+        return scanners
+
+    def refresh_scanners_async(self):
+        """Перепроверяет список сканеров в фоновом потоке (не более одной проверки одновременно)"""
+        with self._discovery_lock:
+            if self._discovery_thread and self._discovery_thread.is_alive():
+                return
+            self._discovery_thread = threading.Thread(target=self._discover_scanners, daemon=True)
+            self._discovery_thread.start()
+        logger.debug("🔄 Фоновая проверка списка сканеров запущена")
 
-            if scanner_available:
-                logger.info("✅ Сканер доступен (данные закешированы)")
-            else:
-                logger.warning("❌ Сканер недоступен")
+    def scanner_exists(self) -> bool:
+        """Проверяет, доступен ли указанный в конфиге сканер (по кешу списка сканеров)"""
+        scanners = self.get_available_scanners()
 
-            return scanner_available
+        if hasattr(config, 'SCANNER_DEVICE') and config.SCANNER_DEVICE:
+            scanner_available = any(config.SCANNER_DEVICE in scanner for scanner in scanners)
+        else:
+            scanner_available = bool(scanners)
 
-        except subprocess.TimeoutExpired:
-            logger.error("❌ Таймаут при проверке сканера")
-            # Не кешируем при ошибке таймаута
-            return False
-        except Exception as e:
-            logger.error(f"❌ Ошибка при проверке сканера: {e}")
-            return False
+        if not scanner_available:
+            logger.warning("❌ Сканер недоступен")
+        return scanner_available
 
     def get_available_scanners(self):
-        """Получает список доступных сканеров (с кешированием)"""
-        # Используем кеш, если он есть и не старше 5 минут
-        if (self._available_scanners_cache and
-            time.time() - self._available_scanners_cache_time < 300):
+        """
+        Получает список доступных сканеров.
+        Кеш (в том числе сохраненный при прошлом запуске) используется сразу, устаревший
+        перепроверяется в фоне. Поиск блокирует вызов только если кеша еще нет совсем.
+        """
+        if self._available_scanners_cache:
+            if self._revalidate_pending or self._scanner_cache_stale():
+                self._revalidate_pending = False
+                self.refresh_scanners_async()
             logger.debug("✅ Используем кешированный список сканеров")
             return self._available_scanners_cache
 
-        try:
-            result = subprocess.run(
-                ["scanimage", "-L"],
-                capture_output=True,
-                text=True,
-                timeout=80
-            )
-
-            scanners = []
-            if result.returncode == 0:
-                for line in result.stdout.splitlines():
-                    if line.strip():
-                        scanners.append(line.strip())
-
-            # Кешируем результат
-            self._available_scanners_cache = scanners
-            self._available_scanners_cache_time = time.time()
-
-            logger.info(f"✅ Получен список сканеров ({len(scanners)} шт.), данные закешированы")
-            return scanners
-
-        except subprocess.TimeoutExpired:
-            logger.error("❌ Таймаут при получении списка сканеров")
-            # Возвращаем кеш, даже если старый, при таймауте
-            return self._available_scanners_cache or []
-        except Exception as e:
-            logger.error(f"❌ Ошибка при получении списка сканеров: {e}")
-            return self._available_scanners_cache or []
+        scanners = self._discover_scanners()
+        return scanners if scanners is not None else (self._available_scanners_cache or [])
 
     def get_scanner_device(self):
         """Возвращает устройство сканера для использования (с кешированием)"""
@@ -283,8 +300,12 @@ class ScannerManager:
             result["log_status"] = "debug"
             return result
 
+        # Сканирование и фоновая проверка готовности не обращаются к устройству одновременно
+        if not self.device_lock.acquire(blocking=False):
+            logger.info("⏳ Ждем завершения фоновой проверки сканера...")
+            self.device_lock.acquire()
         self.scan_in_progress = True
-        self.last_scan_time = time.time()
+        scan_started = time.monotonic()
 
         try:
             logger.info(f"🔍 Начинаем сканирование (ID: {result['scan_id']})")
@@ -310,15 +331,24 @@ class ScannerManager:
             logger.info(f"🎯 Используем сканер: {scanner_device}")
 
             # ПРЕДВАРИТЕЛЬНАЯ ПРОВЕРКА И ПРОБУЖДЕНИЕ СКАНЕРА
-            if not self._check_scanner_ready(scanner_device):
+            # (монитор готовности уже проверил сканер в фоне - синхронная проверка не нужна)
+            if self.readiness.is_ready():
+                logger.debug("✅ Сканер готов (фоновая проверка)")
+            elif not self._check_scanner_ready(scanner_device):
                 logger.warning("😴 Сканер не отвечает. Пытаемся разбудить...")
                 if not self._wake_up_scanner_advanced(scanner_device):
+                    # Сканер мог сменить адрес - перепроверяем список для следующего нажатия
+                    self.refresh_scanners_async()
                     error_msg = "Не удалось разбудить сканер. Проверьте питание и подключение."
                     logger.error(f"❌ {error_msg}")
                     result.update({"status": "error", "error": error_msg})
                     return result
                 logger.info("✅ Сканер разбужен, продолжаем сканирование...")
 
+            # Бэкенд внутри процесса сам читает листы с открытого устройства
+            if self.backend.in_process:
+                return self._scan_in_process(scanner_device, result, format_type, dpi, mode, use_adf)
+
             # РАЗДЕЛЯЕМ ЛОГИКУ ДЛЯ ADF И ОБЫЧНОГО СКАНИРОВАНИЯ
             if use_adf:
                 # ДЛЯ ADF: сканируем в отдельные PNG файлы, затем сохраняем каждый как отдельный PDF
@@ -333,13 +363,21 @@ class ScannerManager:
             return result
         finally:
             self.scan_in_progress = False
+            self.device_lock.release()
+            if self.readiness.running and result.get("scan_type"):
+                # Обрыв стопки может означать, что сканер уснул или отвалился - перепроверяем
+                self.readiness.mark(result["status"] == "success" and not result.get("incomplete"))
+            observe_histogram("scan_duration_seconds", time.monotonic() - scan_started,
+                              "Длительность сканирования", source=result["scan_type"], mode=mode)
+            inc_counter("scans_total", 1, "Сканирования по исходу", source=result["scan_type"],
+                        outcome="incomplete" if result.get("incomplete") else result["status"])
 
     def _scan_with_adf_images(self, scanner_device, result, dpi, mode):
         """
-        Сканирование с ADF через отдельные PNG файлы с сохранением каждого листа в отдельный PDF
+        Сканирование с ADF через отдельные PNG файлы с сохранением каждого листа в отдельный PDF.
+        В потоковом режиме (ADF_STREAMING) лист обрабатывается сразу после сканирования.
         """
         import glob
-        import img2pdf
 
         temp_dir = tempfile.gettempdir()
 
@@ -366,215 +404,399 @@ class ScannerManager:
                 scan_args.extend(config.SCANNER_ADF_OPTIONS)
                 logger.info(f"🔧 Используем опции автоподатчика: {config.SCANNER_ADF_OPTIONS}")
 
-            logger.info(f"📸 Выполняем ADF сканирование в отдельные PNG...")
-            logger.debug(f"Параметры: {' '.join(scan_args)}")
+            if getattr(config, 'ADF_STREAMING', True):
+                # Шаги 1-3 совмещены: каждый лист сохраняется, пока сканируются следующие
+                logger.info(f"📸 Выполняем потоковое ADF сканирование...")
+                pdf_files_info = self._scan_adf_streaming(scanner_device, scan_args, result, dpi, mode,
+                                                          tmp_files_to_cleanup)
+                if result["status"] == "error":
+                    return result
+                page_count = result["pages"]
+            else:
+                logger.info(f"📸 Выполняем ADF сканирование в отдельные PNG...")
+                logger.debug(f"Параметры: {' '.join(scan_args)}")
+
+                # Выполняем сканирование с возможностью пробуждения сканера
+                max_retries = 2
+                retry_count = 0
+                scan_successful = False
+
+                while retry_count <= max_retries and not scan_successful:
+                    try:
+                        scan_result = run_command(
+                            scan_args,
+                            capture_output=True,
+                            text=True,
+                            timeout=300
+                        )
+
+                        if scan_result.returncode == 0:
+                            scan_successful = True
+                            break
+
+                        error_msg = scan_result.stderr.strip()
+
+                        if "Document feeder out of documents" in error_msg:
+                            logger.info("📄 Автоподатчик: все документы отсканированы")
+                            scan_successful = True
+                            break
+
+                        if retry_count == 0 and self._is_scanner_sleep_error(error_msg):
+                            logger.warning("😴 Сканер, возможно, в спящем режиме. Пытаемся разбудить...")
+                            if self._wake_up_scanner_advanced(scanner_device):
+                                retry_count += 1
+                                time.sleep(5)
+                                continue
+                            else:
+                                logger.error("❌ Не удалось разбудить сканер")
+
+                        logger.error(f"❌ Ошибка сканирования: {error_msg}")
+                        result.update({"status": "error", "error": f"Ошибка сканирования: {error_msg}"})
+                        return result
 
-            # Выполняем сканирование с возможностью пробуждения сканера
-            max_retries = 2
-            retry_count = 0
-            scan_successful = False
+                    except subprocess.TimeoutExpired:
+                        if retry_count == 0:
+                            logger.warning("⏰ Таймаут сканирования. Пытаемся разбудить сканер...")
+                            if self._wake_up_scanner_advanced(scanner_device):
+                                retry_count += 1
+                                time.sleep(8)
+                                continue
+                            else:
+                                error_msg = "Не удалось разбудить сканер после таймаута"
+                                logger.error(f"❌ {error_msg}")
+                                result.update({"status": "error", "error": error_msg})
+                                return result
+                        else:
+                            error_msg = "Таймаут сканирования после попытки пробуждения"
+                            logger.error(f"❌ {error_msg}")
+                            result.update({"status": "error", "error": error_msg})
+                            return result
 
-            while retry_count <= max_retries and not scan_successful:
-                try:
-                    scan_result = subprocess.run(
-                        scan_args,
-                        capture_output=True,
-                        text=True,
-                        timeout=300
-                    )
-
-                    if scan_result.returncode == 0:
-                        scan_successful = True
-                        break
+                if not scan_successful:
+                    error_msg = "Сканирование не удалось после нескольких попыток"
+                    logger.error(f"❌ {error_msg}")
+                    result.update({"status": "error", "error": error_msg})
+                    return result
 
-                    error_msg = scan_result.stderr.strip()
+                # Шаг 2: Находим все созданные PNG файлы
+                png_files = sorted(glob.glob(png_pattern))
+                if not png_files:
+                    error_msg = "ADF сканирование завершилось, но PNG файлы не созданы"
+                    logger.error(f"❌ {error_msg}")
+                    result.update({"status": "error", "error": error_msg})
+                    return result
 
-                    if "Document feeder out of documents" in error_msg:
-                        logger.info("📄 Автоподатчик: все документы отсканированы")
-                        scan_successful = True
-                        break
+                # Добавляем PNG файлы в список для очистки
+                tmp_files_to_cleanup.extend(png_files)
 
-                    if retry_count == 0 and self._is_scanner_sleep_error(error_msg):
-                        logger.warning("😴 Сканер, возможно, в спящем режиме. Пытаемся разбудить...")
-                        if self._wake_up_scanner_advanced(scanner_device):
-                            retry_count += 1
-                            time.sleep(5)
-                            continue
-                        else:
-                            logger.error("❌ Не удалось разбудить сканер")
+                page_count = len(png_files)
+                result["pages"] = page_count
+                logger.info(f"📄 ADF отсканировано страниц: {page_count}")
 
-                    logger.error(f"❌ Ошибка сканирования: {error_msg}")
-                    result.update({"status": "error", "error": f"Ошибка сканирования: {error_msg}"})
-                    return result
+                # Шаг 3: Сохраняем каждый лист как отдельный PDF файл (параллельно, порядок листов сохраняется)
+                pool, _ = get_page_pool()
+                futures = [
+                    pool.submit(convert_adf_page, self.storage.storage_dir, result['scan_id'], png_file, i + 1, dpi, mode)
+                    for i, png_file in enumerate(png_files)
+                ]
+                pdf_files_info = self._collect_adf_pages(futures, result)
 
-                except subprocess.TimeoutExpired:
-                    if retry_count == 0:
-                        logger.warning("⏰ Таймаут сканирования. Пытаемся разбудить сканер...")
-                        if self._wake_up_scanner_advanced(scanner_device):
-                            retry_count += 1
-                            time.sleep(8)
-                            continue
-                        else:
-                            error_msg = "Не удалось разбудить сканер после таймаута"
-                            logger.error(f"❌ {error_msg}")
-                            result.update({"status": "error", "error": error_msg})
-                            return result
-                    else:
-                        error_msg = "Таймаут сканирования после попытки пробуждения"
-                        logger.error(f"❌ {error_msg}")
-                        result.update({"status": "error", "error": error_msg})
-                        return result
+            return self._finish_adf_scan(result, pdf_files_info, page_count, dpi, mode)
 
-            if not scan_successful:
-                error_msg = "Сканирование не удалось после нескольких попыток"
-                logger.error(f"❌ {error_msg}")
-                result.update({"status": "error", "error": error_msg})
-                return result
+        except Exception as e:
+            error_msg = f"Ошибка при обработке ADF сканирования: {str(e)}"
+            logger.error(f"❌ {error_msg}")
+            result.update({"status": "error", "error": error_msg})
+            return result
+        finally:
+            # Очистка временных файлов
+            self._cleanup_temp_files(tmp_files_to_cleanup)
+
+    def _scan_adf_streaming(self, scanner_device, scan_args, result, dpi, mode, tmp_files_to_cleanup):
+        """
+        Потоковое ADF сканирование: scanimage --batch-print сообщает имя каждого
+        готового листа, и лист сразу передается на конвертацию и сохранение.
+        Возвращает сохраненные листы; при ошибке заполняет result.
+        """
+        retry_count = 0
 
-            # Шаг 2: Находим все созданные PNG файлы
-            png_files = sorted(glob.glob(png_pattern))
-            if not png_files:
+        while True:
+            pdf_files_info, page_count, error_msg, timed_out = self._stream_adf_pages(
+                scan_args + ["--batch-print"], result, dpi, mode, tmp_files_to_cleanup
+            )
+            result["pages"] = page_count
+
+            if page_count:
+                if error_msg or timed_out:
+                    self._mark_incomplete(result, page_count, error_msg or "таймаут ожидания листа")
+                logger.info(f"📄 ADF отсканировано страниц: {page_count}")
+                return pdf_files_info
+
+            if error_msg is None and not timed_out:
                 error_msg = "ADF сканирование завершилось, но PNG файлы не созданы"
                 logger.error(f"❌ {error_msg}")
                 result.update({"status": "error", "error": error_msg})
-                return result
+                return []
+
+            # Ни одного листа - как и в пакетном режиме, пробуем разбудить сканер
+            if retry_count == 0 and (timed_out or self._is_scanner_sleep_error(error_msg)):
+                logger.warning("😴 Сканер, возможно, в спящем режиме. Пытаемся разбудить...")
+                if self._wake_up_scanner_advanced(scanner_device):
+                    retry_count += 1
+                    time.sleep(5)
+                    continue
+                logger.error("❌ Не удалось разбудить сканер")
 
-            # Добавляем PNG файлы в список для очистки
-            tmp_files_to_cleanup.extend(png_files)
+            error_msg = error_msg or "Таймаут сканирования после попытки пробуждения"
+            logger.error(f"❌ Ошибка сканирования: {error_msg}")
+            result.update({"status": "error", "error": f"Ошибка сканирования: {error_msg}"})
+            return []
 
-            page_count = len(png_files)
-            result["pages"] = page_count
-            logger.info(f"📄 ADF отсканировано страниц: {page_count}")
+    def _stream_adf_pages(self, scan_args, result, dpi, mode, tmp_files_to_cleanup):
+        """
+        Один запуск scanimage в потоковом режиме.
+        Возвращает (сохраненные листы, отсканировано листов, ошибка или None, был ли таймаут).
+        """
+        import queue
 
-            # Шаг 3: Сохраняем каждый лист как отдельный PDF файл
-            pdf_files_info = []
+        page_timeout = getattr(config, 'ADF_PAGE_TIMEOUT', 60)
+        logger.debug(f"Параметры: {' '.join(scan_args)}")
 
-            for i, png_file in enumerate(png_files):
+        started = time.monotonic()
+        process = subprocess.Popen(scan_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+        # stdout и stderr читаем в отдельных потоках, чтобы scanimage не блокировался на записи
+        lines = queue.Queue()
+        stderr_chunks = []
+
+        def read_stdout():
+            for line in process.stdout:
+                lines.put(line.strip())
+            lines.put(None)
+
+        def read_stderr():
+            stderr_chunks.append(process.stderr.read())
+
+        readers = [threading.Thread(target=read_stdout, daemon=True),
+                   threading.Thread(target=read_stderr, daemon=True)]
+        for reader in readers:
+            reader.start()
+
+        futures = []
+        in_flight = set()
+        timed_out = False
+        try:
+            while True:
                 try:
-                    # Создаем отдельный PDF для каждого листа
-                    page_scan_id = f"{result['scan_id']}_page_{i+1:03d}"
-                    page_filename = f"scan_{page_scan_id}.pdf"
-                    page_pdf_path = os.path.join(self.storage.storage_dir, page_filename)
-
-                    # Конвертируем PNG в PDF
-                    with open(page_pdf_path, "wb") as f:
-                        f.write(img2pdf.convert(png_file))
-
-                    file_size = os.path.getsize(page_pdf_path)
-
-                    # Создаем метаданные для каждого PDF файла
-                    page_metadata = {
-                        "scan_id": page_scan_id,
-                        "filename": page_filename,
-                        "original_filename": page_filename,
-                        "file_path": page_pdf_path,
-                        "file_size": file_size,
-                        "format": "pdf",
-                        "dpi": dpi,
-                        "mode": mode,
-                        "page_number": i + 1,
-                        "parent_scan_id": result['scan_id'],
-                        "created_at": datetime.now().isoformat(),
-                        "status": "pending",
-                        "upload_attempts": 0,
-                        "last_upload_attempt": None,
-                        "upload_error": None
-                    }
-
-                    # Сохраняем метаданные
-                    metadata_filename = f"scan_{page_scan_id}.json"
-                    metadata_path = os.path.join(self.storage.storage_dir, metadata_filename)
-
-                    with open(metadata_path, "w", encoding='utf-8') as f:
-                        json.dump(page_metadata, f, indent=2, ensure_ascii=False)
-
-                    pdf_files_info.append({
-                        'scan_id': page_scan_id,
-                        'filename': page_filename,
-                        'file_path': page_pdf_path,
-                        'file_size': file_size,
-                        'page_number': i + 1
-                    })
-
-                    logger.info(f"💾 Сохранен лист {i+1} как отдельный PDF: {page_filename} ({file_size} байт)")
-
-                except Exception as e:
-                    logger.error(f"❌ Ошибка сохранения листа {i+1}: {e}")
+                    page_file = lines.get(timeout=page_timeout)
+                except queue.Empty:
+                    logger.warning(f"⏰ Нет нового листа {page_timeout} сек - останавливаем сканирование")
+                    timed_out = True
+                    process.kill()
+                    break
+                if page_file is None:
+                    break
+                if not page_file or not os.path.exists(page_file):
                     continue
 
-            if not pdf_files_info:
-                error_msg = "Не удалось создать ни одного PDF файла"
-                logger.error(f"❌ {error_msg}")
-                result.update({"status": "error", "error": error_msg})
-                return result
+                tmp_files_to_cleanup.append(page_file)
+                in_flight = self._submit_adf_page(result, page_file, dpi, mode, futures, in_flight)
 
-            # Шаг 4: Подготавливаем результат для основного скана
-            # Основной скан теперь содержит информацию о всех созданных PDF файлах
-            result["individual_pdfs"] = pdf_files_info
-            result["file_size"] = sum(pdf_info['file_size'] for pdf_info in pdf_files_info)
-            result["filename"] = f"scan_{result['scan_id']}_multiple.pdf"  # Флаг что это множественные файлы
-
-            # Сохраняем основную метадату (для информации)
-            main_metadata = {
-                "scan_id": result['scan_id'],
-                "filename": result['filename'],
-                "original_filename": result['filename'],
-                "file_path": None,  # Нет единого файла
-                "file_size": result["file_size"],
-                "format": "multiple_pdf",
-                "dpi": dpi,
-                "mode": mode,
-                "total_pages": page_count,
-                "individual_files": pdf_files_info,
-                "created_at": datetime.now().isoformat(),
-                "status": "processed",  # Основной скан обработан, отдельные файлы будут загружаться
-                "upload_attempts": 0,
-                "last_upload_attempt": None,
-                "upload_error": None
-            }
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            for reader in readers:
+                reader.join(timeout=5)
+        finally:
+            wait(futures)
+            status = "timeout" if timed_out else ("ok" if process.returncode == 0 else "error")
+            observe_histogram("subprocess_duration_seconds", time.monotonic() - started,
+                              "Длительность внешних команд", command="scanimage")
+            inc_counter("subprocess_runs_total", 1, "Запуски внешних команд", command="scanimage", status=status)
+
+        pdf_files_info = self._collect_adf_pages(futures, result)
+
+        stderr = "".join(stderr_chunks).strip()
+        error_msg = None
+        if not timed_out and process.returncode != 0:
+            if "Document feeder out of documents" in stderr:
+                logger.info("📄 Автоподатчик: все документы отсканированы")
+            else:
+                error_msg = stderr or f"scanimage завершился с кодом {process.returncode}"
+
+        return pdf_files_info, len(futures), error_msg, timed_out
+
+    def _submit_adf_page(self, result, page_file, dpi, mode, futures, in_flight):
+        """Передает отсканированный лист в пул конвертации, возвращает незавершенные задачи"""
+        pool, workers = get_page_pool()
+        page_number = len(futures) + 1
+        logger.info(f"📄 Лист {page_number} отсканирован, сохраняем...")
+        # Не держим в очереди пула больше двух листов на процесс
+        if len(in_flight) >= workers * 2:
+            _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+        future = pool.submit(convert_adf_page, self.storage.storage_dir, result['scan_id'],
+                             page_file, page_number, dpi, mode)
+        futures.append(future)
+        in_flight.add(future)
+        return in_flight
+
+    def _scan_in_process(self, scanner_device, result, format_type, dpi, mode, use_adf):
+        """
+        Сканирование бэкендом внутри процесса (python-sane, fake).
+        Листы ADF, как и в потоковом режиме, конвертируются по мере сканирования.
+        """
+        temp_dir = tempfile.gettempdir()
+        prefix = f"{'adf' if use_adf else 'flatbed'}_scan_{result['scan_id']}"
+        tmp_files_to_cleanup = []
+        futures = []
+        in_flight = set()
+        error_msg = None
 
-            main_metadata_path = os.path.join(self.storage.storage_dir, f"scan_{result['scan_id']}.json")
-            with open(main_metadata_path, "w", encoding='utf-8') as f:
-                json.dump(main_metadata, f, indent=2, ensure_ascii=False)
+        logger.info(f"📸 Сканирование через бэкенд {self.backend.name}...")
+        try:
+            try:
+                for page_file in self.backend.scan_pages(scanner_device, dpi, mode, use_adf, temp_dir, prefix):
+                    tmp_files_to_cleanup.append(page_file)
+                    if not use_adf:
+                        break
+                    in_flight = self._submit_adf_page(result, page_file, dpi, mode, futures, in_flight)
+            except ScanBackendError as e:
+                error_msg = str(e)
+            finally:
+                wait(futures)
+
+            if not use_adf:
+                if error_msg or not tmp_files_to_cleanup:
+                    error_msg = f"Ошибка сканирования: {error_msg or 'лист не получен'}"
+                    logger.error(f"❌ {error_msg}")
+                    result.update({"status": "error", "error": error_msg})
+                    return result
+                return self._finish_flatbed_scan(result, tmp_files_to_cleanup[0], format_type, dpi, mode)
 
-            logger.info(f"✅ ADF сканирование {result['scan_id']} успешно завершено")
-            logger.info(f"📊 Итоги: создано {len(pdf_files_info)} отдельных PDF файлов")
+            pdf_files_info = self._collect_adf_pages(futures, result)
+            result["pages"] = len(futures)
+            if error_msg and not futures:
+                logger.error(f"❌ Ошибка сканирования: {error_msg}")
+                result.update({"status": "error", "error": f"Ошибка сканирования: {error_msg}"})
+                return result
+            if error_msg:
+                self._mark_incomplete(result, len(futures), error_msg)
+            logger.info(f"📄 ADF отсканировано страниц: {len(futures)}")
+            return self._finish_adf_scan(result, pdf_files_info, len(futures), dpi, mode)
+        finally:
+            self._cleanup_temp_files(tmp_files_to_cleanup)
 
-            return result
+    def _mark_incomplete(self, result, page_count, error_msg):
+        """
+        Стопка ADF отсканирована не полностью. Листы до сбоя уже сохранены и будут
+        отправлены, но результат помечается incomplete с текстом ошибки.
+        """
+        error_msg = f"ADF сканирование прервано после {page_count} листов: {error_msg}"
+        logger.warning(f"⚠️ {error_msg}")
+        result.update({"incomplete": True, "error": error_msg})
 
-        except Exception as e:
-            error_msg = f"Ошибка при обработке ADF сканирования: {str(e)}"
+    def _collect_adf_pages(self, futures, result):
+        """
+        Результаты конвертации в порядке листов (листы с ошибкой пропускаются).
+        Номера пропущенных пустых листов записываются в result["blank_pages"].
+        """
+        pdf_files_info = []
+        blank_pages = []
+        for page_number, future in enumerate(futures, 1):
+            try:
+                page_info = future.result()
+                if page_info.get('skipped'):
+                    blank_pages.append(page_number)
+                else:
+                    pdf_files_info.append(page_info)
+            except BrokenProcessPool as e:
+                logger.error(f"❌ Процесс конвертации листа {page_number} завершился аварийно: {e}")
+                reset_page_pool()
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения листа {page_number}: {e}")
+        result["blank_pages"] = blank_pages
+        if blank_pages:
+            logger.info(f"⬜ Пропущено пустых листов: {len(blank_pages)} из {len(futures)}")
+        return pdf_files_info
+
+    def _finish_adf_scan(self, result, pdf_files_info, page_count, dpi, mode):
+        """Заполняет результат ADF сканирования и сохраняет основную метадату"""
+        if not pdf_files_info:
+            if result.get("blank_pages"):
+                error_msg = f"Все отсканированные листы пустые ({len(result['blank_pages'])})"
+            else:
+                error_msg = "Не удалось создать ни одного PDF файла"
             logger.error(f"❌ {error_msg}")
             result.update({"status": "error", "error": error_msg})
             return result
-        finally:
-            # Очистка временных файлов
-            self._cleanup_temp_files(tmp_files_to_cleanup)
+
+        # Основной скан содержит информацию о всех созданных PDF файлах
+        result["individual_pdfs"] = pdf_files_info
+        result["file_size"] = sum(pdf_info['file_size'] for pdf_info in pdf_files_info)
+        result["filename"] = f"scan_{result['scan_id']}_multiple.pdf"  # Флаг что это множественные файлы
+        original_bytes = sum(pdf_info.get('compression', {}).get('original_bytes', 0) for pdf_info in pdf_files_info)
+        compressed_bytes = sum(pdf_info.get('compression', {}).get('compressed_bytes', 0) for pdf_info in pdf_files_info)
+        result["compression_ratio"] = round(original_bytes / compressed_bytes, 2) if compressed_bytes else None
+
+        # Сохраняем основную метадату (для информации)
+        main_metadata = {
+            "scan_id": result['scan_id'],
+            "filename": result['filename'],
+            "original_filename": result['filename'],
+            "file_path": None,  # Нет единого файла
+            "file_size": result["file_size"],
+            "format": "multiple_pdf",
+            "dpi": dpi,
+            "mode": mode,
+            "total_pages": page_count,
+            "compression_ratio": result["compression_ratio"],
+            "blank_pages": result.get("blank_pages", []),
+            "incomplete": result.get("incomplete", False),
+            "scan_error": result.get("error"),
+            "individual_files": pdf_files_info,
+            "created_at": datetime.now().isoformat(),
+            "status": "processed",  # Основной скан обработан, отдельные файлы будут загружаться
+            "upload_attempts": 0,
+            "last_upload_attempt": None,
+            "upload_error": None
+        }
+
+        main_metadata_path = os.path.join(self.storage.storage_dir, f"scan_{result['scan_id']}.json")
+        with open(main_metadata_path, "w", encoding='utf-8') as f:
+            json.dump(main_metadata, f, indent=2, ensure_ascii=False)
+
+        if result.get("incomplete"):
+            logger.warning(f"⚠️ ADF сканирование {result['scan_id']} завершено не полностью")
+        else:
+            logger.info(f"✅ ADF сканирование {result['scan_id']} успешно завершено")
+        logger.info(f"📊 Итоги: создано {len(pdf_files_info)} отдельных PDF файлов")
+
+        return result
 
     def _scan_flatbed(self, scanner_device, result, format_type, dpi, mode):
         """
         Обычное сканирование (планшет)
         """
         temp_dir = tempfile.gettempdir()
-        effective_format = format_type.lower()
-        file_extension = "pdf" if effective_format == "pdf" else "png"
-        filename = f"scan_{result['scan_id']}.{file_extension}"
-        tmp_path = os.path.join(temp_dir, filename)
+        # PDF собираем сами из PNG, чтобы сжать изображение по режиму сканирования
+        png_path = os.path.join(temp_dir, f"scan_{result['scan_id']}.png")
 
         scan_args = [
             "scanimage",
             f"--device-name={scanner_device}",
             f"--resolution={dpi}",
             f"--mode={mode}",
-            f"--format={effective_format}",
-            f"--output-file={tmp_path}"
+            "--format=png",
+            f"--output-file={png_path}"
         ]
 
         logger.info(f"📸 Выполняем планшетное сканирование...")
         logger.debug(f"Параметры: {' '.join(scan_args)}")
 
         # Выполняем сканирование
-        scan_result = subprocess.run(
+        scan_result = run_command(
             scan_args,
             capture_output=True,
             text=True,
@@ -587,13 +809,36 @@ class ScannerManager:
             result.update({"status": "error", "error": f"Ошибка сканирования: {error_msg}"})
             return result
 
+        return self._finish_flatbed_scan(result, png_path, format_type, dpi, mode)
+
+    def _finish_flatbed_scan(self, result, png_path, format_type, dpi, mode):
+        """Собирает результат планшетного сканирования из отсканированного PNG"""
+        temp_dir = tempfile.gettempdir()
+        effective_format = format_type.lower()
+        file_extension = "pdf" if effective_format == "pdf" else "png"
+        filename = f"scan_{result['scan_id']}.{file_extension}"
+        tmp_path = os.path.join(temp_dir, filename)
+
         # Проверяем файл
-        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+        if not os.path.exists(png_path) or os.path.getsize(png_path) == 0:
             error_msg = "Сканирование завершилось, но файл не создан или пустой"
             logger.error(f"❌ {error_msg}")
             result.update({"status": "error", "error": error_msg})
             return result
 
+        if effective_format == "pdf":
+            try:
+                mode_check = detect_page_mode(png_path, mode)
+                if mode_check["mode"] != mode:
+                    logger.info(f"🎨 Скан без цвета - сохраняем в режиме {mode_check['mode']}")
+                result["mode"] = mode_check["mode"]
+                result["compression"] = image_to_pdf(png_path, tmp_path, mode_check["mode"], dpi)
+            finally:
+                self._cleanup_temp_files([png_path])
+            logger.info(f"🗜️ Сжатие {result['compression']['codec']}: x{result['compression']['ratio']}")
+        else:
+            tmp_path = png_path
+
         file_size = os.path.getsize(tmp_path)
         result["file_size"] = file_size
         result["filename"] = filename
@@ -632,20 +877,9 @@ class ScannerManager:
 
     def _check_scanner_ready(self, scanner_device):
         """
-        Проверяет, готов ли сканер к работе, отправляя тестовую команду
+        Проверяет, готов ли сканер к работе (scanimage --help или запрос к открытому устройству)
         """
-        try:
-            # Простая команда для проверки доступности сканера
-            test_cmd = ["scanimage", f"--device-name={scanner_device}", "--help"]
-            result = subprocess.run(
-                test_cmd,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, subprocess.SubprocessError, FileNotFoundError):
-            return False
+        return self.backend.is_ready(scanner_device)
 
     def _is_scanner_sleep_error(self, error_msg):
         """
@@ -689,73 +923,11 @@ class ScannerManager:
 
     def _wake_up_scanner_advanced(self, scanner_device):
         """
-        Пытается "разбудить" сканер, используя расширенные методы
+        Пытается "разбудить" сканер: сначала способом, который раньше срабатывал
+        для этого устройства, остальные параллельно, до первого успеха
         Возвращает True если сканер удалось разбудить
         """
-        logger.info(f"🔔 Пытаемся разбудить сканер: {scanner_device}")
-
-        wake_up_methods = [
-            # Метод 2: Запрос доступных опций
-            {"cmd": ["scanimage", f"--device-name={scanner_device}", "-A"], "desc": "запрос опций"},
-
-            # Метод 1: Простой запрос информации о сканере
-            {"cmd": ["scanimage", f"--device-name={scanner_device}", "--help"], "desc": "запрос справки"},
-
-            # Метод 4: Перезапрос списка сканеров
-            {"cmd": ["scanimage", "-L"], "desc": "обновление списка сканеров"},
-
-            # Метод 5: Для сетевых сканеров - попытка ping (если это сетевой сканер)
-            {"cmd": ["ping", "-c", "2", scanner_device.split(':')[1] if ':' in scanner_device else scanner_device], "desc": "ping сетевого сканера"},
-
-            # Метод 6: Проверка состояния через SANE
-            {"cmd": ["scanimage", "--test"], "desc": "тест SANE"},
-
-            # Метод 7: Для USB сканеров - перечисление USB устройств
-            {"cmd": ["lsusb"], "desc": "проверка USB устройств"}
-        ]
-
-        success_count = 0
-        total_methods = len(wake_up_methods)
-
-        for i, method in enumerate(wake_up_methods, 1):
-            try:
-                logger.debug(f"🔧 Метод пробуждения {i}/{total_methods}: {method['desc']}")
-                result = subprocess.run(
-                    method["cmd"],
-                    capture_output=True,
-                    text=True,
-                    timeout=15
-                )
-
-                if result.returncode == 0:
-                    logger.info(f"✅ Метод пробуждения '{method['desc']}' выполнен успешно")
-                    success_count += 1
-                else:
-                    logger.debug(f"⚠️ Метод пробуждения '{method['desc']}' завершился с кодом {result.returncode}")
-
-            except subprocess.TimeoutExpired:
-                logger.debug(f"⏰ Таймаут метода пробуждения '{method['desc']}'")
-            except Exception as e:
-                logger.debug(f"⚠️ Ошибка метода пробуждения '{method['desc']}': {e}")
-
-        # Очищаем временный файл если он был создан
-        wakeup_file = "/tmp/wakeup_test.png"
-        if os.path.exists(wakeup_file):
-            try:
-                os.remove(wakeup_file)
-            except:
-                pass
-
-        # Считаем сканер разбуженным если хотя бы некоторые методы сработали
-        if success_count >= 2:
-            logger.info(f"✅ Сканер успешно разбужен ({success_count}/{total_methods} методов сработало)")
-            return True
-        elif success_count > 0:
-            logger.warning(f"⚠️ Сканер частично отвечает ({success_count}/{total_methods} методов сработало)")
-            return True
-        else:
-            logger.error(f"❌ Не удалось разбудить сканер (0/{total_methods} методов сработало)")
-            return False
+        return self.wakeup.wake(scanner_device)
 
     def _count_pdf_pages(self, pdf_path, file_size):
         """
@@ -768,9 +940,19 @@ class ScannerManager:
 
         methods_tried = []
 
+        # Метод 0: Читаем /Count из xref/trailer без внешних процессов
+        try:
+            pages = inspect_pdf_file(pdf_path)["pages"]
+            if pages:
+                methods_tried.append(f"xref: {pages}")
+                return pages
+            methods_tried.append("xref: failed")
+        except Exception as e:
+            methods_tried.append(f"xref: error ({str(e)})")
+
         # Метод 1: Используем pdfinfo (poppler-utils)
         try:
-            result = subprocess.run(
+            result = run_command(
                 ["pdfinfo", pdf_path],
                 capture_output=True,
                 text=True,
@@ -937,12 +1119,9 @@ class ScannerManager:
                                 logger.info(f"🔘 Нажата кнопка: {key_name}")
 
                                 if self.is_trigger_key(key_event):
-                                    # Проверяем, можно ли начать сканирование
-                                    if self.can_start_scan():
-                                        logger.info(f"🎯 ТРИГГЕР! Запускаем сканирование")
-                                        callback()
-                                    else:
-                                        logger.debug("⏳ Сканирование уже выполняется или недавно было, пропускаем")
+                                    # Слушатель не ждет сканирования - запрос уходит в очередь
+                                    if self.scan_queue.submit(callback):
+                                        logger.info(f"🎯 ТРИГГЕР! Сканирование поставлено в очередь")
                                 else:
                                     logger.debug(f"❌ Кнопка {key_name} не в списке триггеров")
 
@@ -963,6 +1142,7 @@ class ScannerManager:
         logger.info("🎹 Запускаем слушатель устройства ввода...")
         self.scanning = True
         self.current_scan_callback = scan_callback
+        self.scan_queue.start()
 
         self.keyboard_listener = threading.Thread(
             target=self.keyboard_listener_worker,
@@ -981,6 +1161,7 @@ class ScannerManager:
 
         if self.keyboard_listener and self.keyboard_listener.is_alive():
             self.keyboard_listener.join(timeout=5)
+        self.scan_queue.stop()
         logger.info("✅ Слушатель устройства остановлен")
 
 # Глобальный экземпляр менеджера сканера
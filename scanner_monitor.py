@@ -0,0 +1,132 @@
+import threading
+import time
+
+import config
+from utils import setup_logger
+from metrics import set_gauge, inc_counter
+
+logger = setup_logger()
+
+class ReadinessMonitor:
+    """
+    Фоновое слежение за готовностью сканера.
+    Пока сканер готов, раз в SCANNER_KEEPALIVE_INTERVAL секунд (меньше таймера сна
+    устройства) отправляется дешевый запрос, чтобы сканер не засыпал. Неготовый сканер
+    будится в фоне и перепроверяется чаще. Путь нажатия кнопки только читает флаг.
+    """
+
+    def __init__(self, manager, keepalive_interval: float = None, retry_interval: float = None):
+        self.manager = manager
+        self.keepalive_interval = keepalive_interval or getattr(config, 'SCANNER_KEEPALIVE_INTERVAL', 240)
+        self.retry_interval = retry_interval or getattr(config, 'SCANNER_READY_RETRY_INTERVAL', 30)
+        self._lock = threading.Lock()
+        self._ready = False
+        self._checked_at = 0.0
+        self._failures = 0
+        self._probe_now = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_ready(self) -> bool:
+        """
+        Готов ли сканер по последней проверке. Без работающего монитора
+        или при устаревшей проверке возвращает False - нужна синхронная проверка.
+        """
+        with self._lock:
+            fresh = time.monotonic() - self._checked_at < self.keepalive_interval * 2
+            return self.running and fresh and self._ready
+
+    def mark(self, ready: bool):
+        """
+        Результат, полученный вне монитора (сканирование или синхронная проверка).
+        Успешное сканирование само по себе держит сканер бодрствующим.
+        """
+        self._set_ready(ready)
+        if not ready:
+            self.request_probe()
+
+    def request_probe(self):
+        """Внеочередная проверка (например, после ошибки сканирования)"""
+        self._probe_now.set()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                "ready": self._ready,
+                "checked_seconds_ago": round(time.monotonic() - self._checked_at, 1) if self._checked_at else None,
+                "failures": self._failures
+            }
+
+    def _set_ready(self, ready: bool):
+        with self._lock:
+            changed = ready != self._ready
+            self._ready = ready
+            self._checked_at = time.monotonic()
+            self._failures = 0 if ready else self._failures + 1
+        set_gauge("scanner_ready", 1 if ready else 0, "Готовность сканера по фоновой проверке")
+        if changed:
+            if ready:
+                logger.info("✅ Сканер готов к работе")
+            else:
+                logger.warning("😴 Сканер не отвечает")
+
+    def probe(self) -> bool:
+        """
+        Проверка готовности, при неготовности - попытка разбудить.
+        Вызывающий держит manager.device_lock, чтобы проверка не пересеклась со сканированием.
+        """
+        device = self.manager.get_scanner_device()
+        if not device:
+            self._set_ready(False)
+            return False
+
+        ready = self.manager._check_scanner_ready(device)
+        inc_counter("scanner_probes_total", 1, "Фоновые проверки сканера", result="ok" if ready else "fail")
+        if not ready:
+            logger.info("🔔 Фоновое пробуждение сканера...")
+            ready = (self.manager._wake_up_scanner_advanced(device)
+                     and self.manager._check_scanner_ready(device))
+        self._set_ready(ready)
+        return ready
+
+    def _run(self):
+        logger.info(f"🩺 Мониторинг готовности сканера запущен (keep-alive каждые {self.keepalive_interval} сек)")
+        while not self._stop.is_set():
+            with self._lock:
+                ready, since = self._ready, time.monotonic() - self._checked_at
+            interval = self.keepalive_interval if ready else self.retry_interval
+
+            if since >= interval or self._probe_now.is_set():
+                # Сканирование идет - устройство занято и не спит, проверим после него.
+                # Блокировка держится всю проверку, сканирование дождется ее окончания
+                if not self.manager.device_lock.acquire(blocking=False):
+                    self._stop.wait(1)
+                    continue
+                self._probe_now.clear()
+                try:
+                    self.probe()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка фоновой проверки сканера: {e}")
+                    self._set_ready(False)
+                finally:
+                    self.manager.device_lock.release()
+                continue
+            self._probe_now.wait(interval - since)
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._probe_now.set()  # первая проверка сразу
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._probe_now.set()
+        if self._thread:
+            self._thread.join(timeout=5)
@@ -0,0 +1,217 @@
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import config
+from utils import setup_logger
+from metrics import Histogram, run_command, observe_histogram, inc_counter
+
+logger = setup_logger()
+
+def wake_up_methods(scanner_device: str) -> list:
+    """
+    Способы разбудить сканер.
+    confirms - успешный ответ сам подтверждает, что устройство проснулось;
+    остальные только "толкают" устройство, после них готовность проверяется отдельно.
+    opens_device - команда открывает устройство; такие команды не выполняются одновременно.
+    """
+    host = scanner_device.split(':')[1] if ':' in scanner_device else scanner_device
+    return [
+        {"name": "options", "cmd": ["scanimage", f"--device-name={scanner_device}", "-A"],
+         "desc": "запрос опций", "confirms": True, "opens_device": True},
+        {"name": "help", "cmd": ["scanimage", f"--device-name={scanner_device}", "--help"],
+         "desc": "запрос справки", "confirms": True, "opens_device": True},
+        {"name": "list", "cmd": ["scanimage", "-L"],
+         "desc": "обновление списка сканеров", "confirms": False, "opens_device": False},
+        {"name": "ping", "cmd": ["ping", "-c", "2", host],
+         "desc": "ping сетевого сканера", "confirms": False, "opens_device": False},
+        {"name": "sane_test", "cmd": ["scanimage", "--test"],
+         "desc": "тест SANE", "confirms": False, "opens_device": True},
+        {"name": "lsusb", "cmd": ["lsusb"],
+         "desc": "проверка USB устройств", "confirms": False, "opens_device": False},
+    ]
+
+class WakeUpStrategy:
+    """
+    Пробуждение сканера с учетом истории.
+    Способ, который чаще всего будил это устройство, запускается первым, остальные
+    подключаются с шагом SCANNER_WAKE_STAGGER секунд. Параллельно выполняются только
+    независимые проверки (ping, lsusb, -L); команды, открывающие устройство, и проверка
+    готовности после "толчка" идут по очереди. Первый успех завершает пробуждение, общее
+    время ограничено SCANNER_WAKE_DEADLINE.
+    Статистика способов сохраняется на диск между перезапусками.
+    """
+
+    def __init__(self, check_ready, stats_path: str = None, deadline: float = None,
+                 stagger: float = None, probe_timeout: float = 15):
+        self.check_ready = check_ready
+        self.stats_path = stats_path or getattr(config, 'SCANNER_WAKE_STATS_PATH', 'scanner_wake_stats.json')
+        self.deadline = deadline or getattr(config, 'SCANNER_WAKE_DEADLINE', 30)
+        self.stagger = stagger if stagger is not None else getattr(config, 'SCANNER_WAKE_STAGGER', 2)
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._device_lock = threading.Lock()  # устройство открывает одна проверка за раз
+        self._stats = self._load_stats()  # устройство -> способ -> {"attempts", "successes"}
+        self._latency = Histogram("scanner_wakeup")
+
+    def _load_stats(self) -> dict:
+        try:
+            with open(self.stats_path, "r", encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать статистику пробуждения {self.stats_path}: {e}")
+            return {}
+
+    def _save_stats(self):
+        tmp_path = f"{self.stats_path}.tmp"
+        try:
+            with self._lock:
+                data = json.dumps(self._stats, indent=2, ensure_ascii=False)
+            with open(tmp_path, "w", encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.stats_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить статистику пробуждения: {e}")
+
+    def _record(self, device: str, method: str, success: bool):
+        with self._lock:
+            stats = self._stats.setdefault(device, {}).setdefault(method, {"attempts": 0, "successes": 0})
+            stats["attempts"] += 1
+            if success:
+                stats["successes"] += 1
+
+    def ranked_methods(self, scanner_device: str) -> list:
+        """Способы по убыванию доли успехов для устройства (без истории - исходный порядок)"""
+        methods = wake_up_methods(scanner_device)
+        with self._lock:
+            device_stats = dict(self._stats.get(scanner_device, {}))
+
+        def score(indexed):
+            index, method = indexed
+            stats = device_stats.get(method["name"])
+            if not stats or not stats["attempts"]:
+                return (0, 0, index)
+            return (-stats["successes"] / stats["attempts"], -stats["successes"], index)
+
+        return [method for _, method in sorted(enumerate(methods), key=score)]
+
+    def _acquire_device(self, cancelled: threading.Event) -> bool:
+        """Ждет своей очереди к устройству; False - пробуждение уже завершено"""
+        while not cancelled.is_set():
+            if self._device_lock.acquire(timeout=0.2):
+                if cancelled.is_set():
+                    self._device_lock.release()
+                    return False
+                return True
+        return False
+
+    def _run_method(self, method: dict) -> bool:
+        try:
+            result = run_command(method["cmd"], capture_output=True, text=True, timeout=self.probe_timeout)
+        except subprocess.TimeoutExpired:
+            logger.debug(f"⏰ Таймаут метода пробуждения '{method['desc']}'")
+            return False
+        except Exception as e:
+            logger.debug(f"⚠️ Ошибка метода пробуждения '{method['desc']}': {e}")
+            return False
+
+        if result.returncode != 0:
+            logger.debug(f"⚠️ Метод пробуждения '{method['desc']}' завершился с кодом {result.returncode}")
+            return False
+        return True
+
+    def _probe(self, scanner_device: str, method: dict, cancelled: threading.Event) -> bool:
+        if method["opens_device"]:
+            if not self._acquire_device(cancelled):
+                return False
+            try:
+                success = self._run_method(method)
+            finally:
+                self._device_lock.release()
+        else:
+            success = not cancelled.is_set() and self._run_method(method)
+
+        if not success or method["confirms"] or cancelled.is_set():
+            return success and not cancelled.is_set()
+        # Устройство "толкнули" - проверяем, что оно действительно отвечает (это тоже открывает устройство)
+        if not self._acquire_device(cancelled):
+            return False
+        try:
+            return self.check_ready(scanner_device)
+        except Exception as e:
+            logger.debug(f"⚠️ Ошибка проверки после '{method['desc']}': {e}")
+            return False
+        finally:
+            self._device_lock.release()
+
+    def wake(self, scanner_device: str) -> bool:
+        """Пытается разбудить сканер, возвращает True при первом успешном способе"""
+        methods = self.ranked_methods(scanner_device)
+        logger.info(f"🔔 Пытаемся разбудить сканер: {scanner_device} "
+                    f"(порядок: {', '.join(method['name'] for method in methods)})")
+
+        started = time.monotonic()
+        deadline = started + self.deadline
+        cancelled = threading.Event()
+        pool = ThreadPoolExecutor(max_workers=len(methods), thread_name_prefix="scanner-wakeup")
+        pending = {}
+        winner = None
+        try:
+            for index, method in enumerate(methods):
+                future = pool.submit(self._probe, scanner_device, method, cancelled)
+                pending[future] = method
+                # Следующий способ подключается, только если текущие не справились за stagger
+                step_deadline = (min(deadline, time.monotonic() + self.stagger)
+                                 if index < len(methods) - 1 else deadline)
+                winner = self._wait_first_success(scanner_device, pending, step_deadline)
+                if winner or time.monotonic() >= deadline:
+                    break
+        finally:
+            cancelled.set()
+            # Незапущенные проверки отменяются, независимые (ping, lsusb, -L) завершатся сами.
+            # Проверку, которая сейчас открывает устройство, дожидаемся, чтобы она не
+            # столкнулась со сканированием (ограничено таймаутом команды)
+            pool.shutdown(wait=False, cancel_futures=True)
+            with self._device_lock:
+                pass
+
+        elapsed = time.monotonic() - started
+        self._latency.observe(elapsed)
+        observe_histogram("scanner_wakeup_seconds", elapsed, "Длительность пробуждения сканера",
+                          outcome="ok" if winner else "fail")
+        inc_counter("scanner_wakeups_total", 1, "Пробуждения сканера",
+                    method=winner["name"] if winner else "none")
+        self._save_stats()
+
+        if winner:
+            logger.info(f"✅ Сканер разбужен способом '{winner['desc']}' за {elapsed:.1f} сек")
+            return True
+        logger.error(f"❌ Не удалось разбудить сканер за {elapsed:.1f} сек")
+        return False
+
+    def _wait_first_success(self, scanner_device: str, pending: dict, until: float):
+        """Ждет завершения проверок до until, возвращает первый успешный способ"""
+        while pending:
+            timeout = until - time.monotonic()
+            if timeout <= 0:
+                return None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                method = pending.pop(future)
+                success = future.result()
+                self._record(scanner_device, method["name"], success)
+                if success:
+                    return method
+        # Все запущенные способы не сработали - сразу подключаем следующий
+        return None
+
+    def stats(self) -> dict:
+        """Статистика способов по устройствам и длительности пробуждений"""
+        with self._lock:
+            methods = json.loads(json.dumps(self._stats))
+        return {"methods": methods, "latency": self._latency.summary()}
@@ -0,0 +1,52 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import config
+from .heartbeat import collect_status
+from .metrics import send_metrics
+from .utils import setup_logger
+
+logger = setup_logger()
+
+class StatusHandler(BaseHTTPRequestHandler):
+    """
+    GET /status - состояние воркера: принтер, скорость, оценки времени очередей.
+    GET /metrics - метрики в формате Prometheus.
+    """
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            send_metrics(self)
+            return
+        if self.path.split("?")[0].rstrip("/") not in ("", "/status"):
+            self.send_error(404)
+            return
+        try:
+            body = json.dumps(collect_status(), ensure_ascii=False, default=str).encode()
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения состояния воркера: {e}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"[status] {self.address_string()} {format % args}")
+
+def start_status_server():
+    """Запускает локальный API состояния в фоновом потоке (если STATUS_PORT задан)"""
+    if not config.STATUS_PORT:
+        return None
+    try:
+        server = ThreadingHTTPServer((config.STATUS_HOST, config.STATUS_PORT), StatusHandler)
+    except OSError as e:
+        logger.error(f"❌ Не удалось запустить API состояния на порту {config.STATUS_PORT}: {e}")
+        return None
+    t = threading.Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    logger.info(f"📊 API состояния: http://{config.STATUS_HOST}:{config.STATUS_PORT}/status")
+    return server
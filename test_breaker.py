@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+import unittest
+from unittest.mock import patch, MagicMock
+
+from . import breaker as breaker_module
+from .breaker import CircuitBreaker
+from . import cups_supervisor as supervisor_module
+from .cups_supervisor import CupsSupervisor
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch.object(breaker_module.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, max_reset_timeout=100)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_closed_until_threshold(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.is_closed())
+
+    def test_open_becomes_half_open_after_timeout(self):
+        self.open_breaker()
+        self.clock.advance(29)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertAlmostEqual(self.breaker.retry_after(), 1)
+
+        self.clock.advance(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertEqual(self.breaker.retry_after(), 0.0)
+
+    def test_half_open_allows_single_probe(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_success_closes(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.allow_request()
+        self.breaker.record_success()
+        self.assertTrue(self.breaker.is_closed())
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_half_open_failure_reopens_with_doubled_timeout(self):
+        self.open_breaker()
+        self.clock.advance(30)
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        self.clock.advance(59)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.clock.advance(1)
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_reset_timeout_is_capped(self):
+        self.open_breaker()
+        for _ in range(5):
+            self.clock.advance(self.breaker.snapshot()["retry_after"])
+            self.breaker.allow_request()
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.snapshot()["retry_after"], 100)
+
+class TestCupsSupervisorRecovery(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patchers = [
+            patch.object(breaker_module.time, 'monotonic', self.clock),
+            patch.object(supervisor_module, 'notify_state_change'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.supervisor = CupsSupervisor()
+        self.supervisor.check_health = MagicMock(return_value=False)
+        self.supervisor.recover = MagicMock()
+        self.supervisor.probe_printers = MagicMock()
+
+    def tick(self, seconds: float = 10):
+        self.supervisor.check_once()
+        self.clock.advance(seconds)
+
+    def test_no_restart_storm_while_open(self):
+        """Перезапуск CUPS - один раз при размыкании и по одному на каждую пробу half_open"""
+        for _ in range(3):
+            self.tick()
+        self.assertFalse(self.supervisor.is_ready())
+        self.assertEqual(self.supervisor.recover.call_count, 1)
+
+        # Открыт 30 сек: проверки идут, перезапусков нет
+        self.tick()
+        self.tick()
+        self.assertEqual(self.supervisor.recover.call_count, 1)
+
+        # half_open - одна попытка восстановления, затем таймаут удваивается
+        self.tick()
+        self.assertEqual(self.supervisor.recover.call_count, 2)
+        for _ in range(5):
+            self.tick()
+        self.assertEqual(self.supervisor.recover.call_count, 2)
+        self.tick()
+        self.assertEqual(self.supervisor.recover.call_count, 3)
+
+    def test_explicit_request_ignored_while_open(self):
+        for _ in range(3):
+            self.tick()
+        self.supervisor.request_recovery()
+        self.tick()
+        self.assertEqual(self.supervisor.recover.call_count, 1)
+
+    def test_explicit_request_runs_when_closed(self):
+        self.supervisor.check_health.return_value = True
+        self.supervisor.request_recovery()
+        self.tick()
+        self.assertEqual(self.supervisor.recover.call_count, 1)
+        self.assertTrue(self.supervisor.is_ready())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+from . import callback_outbox as outbox_module
+from .callback_outbox import CallbackOutbox
+from . import callback
+
+def make_response(status_code: int):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = ""
+    return response
+
+class TestCallbackOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, "outbox.db")
+        self.outbox = CallbackOutbox(self.path, batch_size=10)
+        patcher = patch.object(outbox_module, 'amqp_results_enabled', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def test_enqueue_persists_before_delivery(self):
+        """Результат лежит на диске сразу после enqueue и переживает перезапуск"""
+        self.outbox.enqueue({"job_id": 1, "status": "success"})
+
+        restarted = CallbackOutbox(self.path)
+        self.assertEqual(restarted.pending_count(), 1)
+
+    @patch.object(outbox_module, 'http_client')
+    def test_bulk_delivery_deletes_rows(self, mock_http):
+        mock_http.post.return_value = make_response(200)
+        self.outbox.enqueue({"job_id": 1, "status": "success"})
+        self.outbox.enqueue({"job_id": 2, "status": "error"})
+
+        self.assertEqual(self.outbox.flush_once(), 2)
+
+        self.assertEqual(mock_http.post.call_count, 1)
+        self.assertTrue(mock_http.post.call_args[0][0].endswith("/v1/print-callback/batch"))
+        self.assertEqual(len(mock_http.post.call_args[1]["json"]["callbacks"]), 2)
+        self.assertEqual(self.outbox.pending_count(), 0)
+
+    @patch.object(outbox_module, 'http_client')
+    def test_bulk_not_supported_falls_back_to_single(self, mock_http):
+        mock_http.post.side_effect = [make_response(404), make_response(200), make_response(200)]
+        self.outbox.enqueue({"job_id": 1, "status": "success"})
+        self.outbox.enqueue({"job_id": 2, "status": "success"})
+
+        self.outbox.flush_once()
+
+        urls = [call[0][0] for call in mock_http.post.call_args_list]
+        self.assertTrue(urls[0].endswith("/batch"))
+        self.assertTrue(all(url.endswith("/v1/print-callback") for url in urls[1:]))
+        self.assertFalse(self.outbox._bulk_supported)
+        self.assertEqual(self.outbox.pending_count(), 0)
+
+        # Следующие пачки сразу отправляются по одному
+        mock_http.post.side_effect = [make_response(200)]
+        self.outbox.enqueue({"job_id": 3, "status": "success"})
+        self.outbox.flush_once()
+        self.assertTrue(mock_http.post.call_args[0][0].endswith("/v1/print-callback"))
+
+    @patch.object(outbox_module, 'http_client')
+    def test_failed_delivery_is_postponed_with_backoff(self, mock_http):
+        mock_http.post.return_value = make_response(500)
+        self.outbox.enqueue({"job_id": 1, "status": "success"})
+
+        self.outbox.flush_once()
+
+        self.assertEqual(self.outbox.pending_count(), 1)
+        self.assertEqual(self.outbox._due(10), [])  # повтор отложен
+        attempts, next_attempt = self.outbox._connect().execute(
+            "SELECT attempts, next_attempt FROM outbox").fetchone()
+        self.assertEqual(attempts, 1)
+        self.assertGreater(next_attempt, time.time())
+
+    @patch.object(outbox_module, 'http_client')
+    def test_network_error_is_postponed(self, mock_http):
+        mock_http.post.side_effect = ConnectionError("нет сети")
+        self.outbox.enqueue({"job_id": 1, "status": "success"})
+
+        self.outbox.flush_once()
+
+        self.assertEqual(self.outbox.pending_count(), 1)
+        self.assertEqual(self.outbox._due(10), [])
+
+class TestSendCallback(unittest.TestCase):
+
+    @patch.object(callback, 'callback_outbox')
+    def test_reports_persisted_result(self, mock_outbox):
+        self.assertTrue(callback.send_callback({"job_id": 1, "status": "success"}))
+        mock_outbox.enqueue.assert_called_once()
+
+    @patch.object(callback, 'callback_outbox')
+    def test_reports_failure_when_not_persisted(self, mock_outbox):
+        """Ошибка записи в SQLite - задачу нельзя подтверждать"""
+        mock_outbox.enqueue.side_effect = OSError("disk full")
+        self.assertFalse(callback.send_callback({"job_id": 1, "status": "success"}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+import os
+import sys
+import unittest
+
+# Добавляем текущую директорию в путь Python
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from image_processing import detect_blank_page, blank_page_action, BLANK_FLAG, np, Image
+
+# Уменьшенная копия листа A4 без полей (как после _load_preview)
+PREVIEW_SHAPE = (460, 325)
+
+def white_page(level: float = 245):
+    return np.full(PREVIEW_SHAPE, level, dtype=np.float32)
+
+@unittest.skipUnless(np is not None and Image is not None, "нужны NumPy и Pillow")
+class TestBlankPageDetection(unittest.TestCase):
+
+    def test_truly_blank_page(self):
+        result = detect_blank_page(None, preview=white_page())
+        self.assertTrue(result["blank"])
+        self.assertEqual(result["ink_coverage"], 0)
+
+    def test_noisy_blank_page(self):
+        """Шум сенсора и несколько пылинок - лист все равно пустой"""
+        rng = np.random.default_rng(44)
+        pixels = np.clip(white_page(240) + rng.normal(0, 4, PREVIEW_SHAPE), 0, 255).astype(np.float32)
+        for y, x in rng.integers(0, min(PREVIEW_SHAPE), size=(10, 2)):
+            pixels[y, x] = 40
+        result = detect_blank_page(None, preview=pixels)
+        self.assertTrue(result["blank"], result)
+
+    def test_one_line_page_is_not_blank(self):
+        """Одна строка текста (~0.13% краски на 300 dpi A4) не должна считаться пустой"""
+        pixels = white_page()
+        pixels[100:105, 40:280:6] = 20
+        result = detect_blank_page(None, preview=pixels)
+        self.assertAlmostEqual(result["ink_coverage"], 0.00134, places=4)
+        self.assertFalse(result["blank"], result)
+
+class TestBlankPageAction(unittest.TestCase):
+
+    def test_default_action_keeps_page(self):
+        """По умолчанию пустой лист сохраняется с пометкой, а не удаляется"""
+        self.assertEqual(blank_page_action(), BLANK_FLAG)
+
+if __name__ == '__main__':
+    unittest.main()
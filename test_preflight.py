@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+import os
+import tempfile
+import unittest
+
+from .preflight import inspect_pdf, inspect_pdf_file
+
+A4 = b"[0 0 595 842]"
+
+def build_pdf(pages: int = 3, trailer_extra: bytes = b"", xref_stream: bool = False) -> bytes:
+    """Минимальный PDF: каталог, дерево страниц и pages листов с таблицей ссылок"""
+    kids = b" ".join(b"%d 0 R" % (3 + index) for index in range(pages))
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + kids + b"] /Count %d /MediaBox " % pages + A4 + b" >>",
+    ] + [b"<< /Type /Page /Parent 2 0 R >>"] * pages
+
+    data = b"%PDF-1.7\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+
+    xref_offset = len(data)
+    size = len(objects) + 1
+    if xref_stream:
+        # Содержимое потока не разбирается - страницы находятся поиском по файлу
+        data += (b"%d 0 obj\n<< /Type /XRef /Size %d /Root 1 0 R " % (size, size + 1) + trailer_extra +
+                 b"/Length 0 >>\nstream\n\nendstream\nendobj\n")
+    else:
+        data += b"xref\n0 %d\n0000000000 65535 f \n" % size
+        data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        data += b"trailer\n<< /Size %d /Root 1 0 R " % size + trailer_extra + b">>\n"
+    data += b"startxref\n%d\n%%%%EOF\n" % xref_offset
+    return data
+
+class TestInspectPdf(unittest.TestCase):
+
+    def test_normal_file(self):
+        info = inspect_pdf(build_pdf(pages=3))
+
+        self.assertEqual(info["pages"], 3)
+        self.assertEqual(info["method"], "xref")
+        self.assertEqual(info["page_size_mm"], "210x297")
+        self.assertFalse(info["damaged"])
+        self.assertFalse(info["encrypted"])
+
+    def test_xref_stream(self):
+        """Поток xref (PDF 1.5+) не разбирается, страницы находятся поиском по файлу"""
+        info = inspect_pdf(build_pdf(pages=4, xref_stream=True))
+
+        self.assertEqual(info["pages"], 4)
+        self.assertEqual(info["method"], "scan")
+        self.assertFalse(info["damaged"])
+
+    def test_truncated_file(self):
+        data = build_pdf(pages=2)
+        info = inspect_pdf(data[:data.index(b"xref")])
+
+        self.assertTrue(info["damaged"])
+        self.assertEqual(info["pages"], 2)
+        self.assertEqual(info["method"], "scan")
+
+    def test_encrypted_file(self):
+        info = inspect_pdf(build_pdf(pages=2, trailer_extra=b"/Encrypt 9 0 R "))
+
+        self.assertTrue(info["encrypted"])
+        self.assertEqual(info["pages"], 2)
+
+    def test_encrypted_xref_stream(self):
+        info = inspect_pdf(build_pdf(pages=2, trailer_extra=b"/Encrypt 9 0 R ", xref_stream=True))
+
+        self.assertTrue(info["encrypted"])
+
+    def test_file_without_trailer(self):
+        data = build_pdf(pages=5)
+        info = inspect_pdf(data[:data.index(b"trailer")])
+
+        self.assertTrue(info["damaged"])
+        self.assertEqual(info["pages"], 5)
+
+    def test_not_pdf(self):
+        info = inspect_pdf(b"hello")
+
+        self.assertIsNone(info["pages"])
+        self.assertIsNone(info["method"])
+        self.assertFalse(info["damaged"])
+
+class TestInspectPdfFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, name))
+        os.rmdir(self.tmp_dir)
+
+    def write(self, data: bytes) -> str:
+        path = os.path.join(self.tmp_dir, f"file_{len(os.listdir(self.tmp_dir))}.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_reads_file_through_mmap(self):
+        info = inspect_pdf_file(self.write(build_pdf(pages=7)))
+
+        self.assertEqual(info["pages"], 7)
+        self.assertEqual(info["method"], "xref")
+
+    def test_empty_file(self):
+        info = inspect_pdf_file(self.write(b""))
+
+        self.assertEqual(info["bytes"], 0)
+        self.assertIsNone(info["pages"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+import unittest
+import uuid
+from unittest.mock import patch
+
+from . import printer
+from . import errors
+from .printer import PrinterPool, submit_with_failover
+
+def cups_result(status="success", error_code=None, submitted=None):
+    return {
+        "status": status,
+        "error": None if status == "success" else "ошибка",
+        "error_code": error_code,
+        "submitted": status == "success" if submitted is None else submitted
+    }
+
+class TestPrinterFailover(unittest.TestCase):
+
+    def setUp(self):
+        # Уникальные имена - предохранители принтеров общие на процесс
+        suffix = uuid.uuid4().hex[:6]
+        self.first, self.second = f"first_{suffix}", f"second_{suffix}"
+        self.pool = PrinterPool([self.first, self.second])
+        patchers = [
+            patch.object(printer, 'printer_pool', self.pool),
+            patch.object(printer, 'wait_printer_ready'),
+            patch.object(printer.printer_registry, 'validate_options', return_value=([], [])),
+            patch.object(printer, 'get_detailed_printer_status'),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.status_calls = printer.get_detailed_printer_status
+
+    def test_candidates_use_cached_status(self):
+        """Выбор принтера не опрашивает CUPS, занятый принтер уходит назад"""
+        self.pool.observe_status(self.first, {"online": True, "jobs_in_queue": 3})
+        self.pool.observe_status(self.second, {"online": True, "jobs_in_queue": 0})
+
+        self.assertEqual(self.pool.candidates(), [self.second, self.first])
+        self.status_calls.assert_not_called()
+
+    def test_failed_submission_moves_to_next_printer(self):
+        results = [cups_result("error", errors.REJECTING_JOBS), cups_result()]
+        with patch.object(printer, 'print_cups', side_effect=results) as mock_print:
+            device, result = submit_with_failover("job", "/tmp/job.pdf", 1)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(device, self.second)
+        self.assertEqual([call[0][0] for call in mock_print.call_args_list], [self.first, self.second])
+        self.assertEqual(printer.printer_breaker(self.first).snapshot()["failures"], 1)
+
+    def test_accepted_job_is_not_sent_again(self):
+        """CUPS уже принял задание - другой принтер его не получает"""
+        results = [cups_result("error", errors.CUPS_ERROR, submitted=True)]
+        with patch.object(printer, 'print_cups', side_effect=results) as mock_print:
+            device, result = submit_with_failover("job", "/tmp/job.pdf", 1)
+
+        self.assertEqual(mock_print.call_count, 1)
+        self.assertEqual(result["error_code"], errors.CUPS_ERROR)
+
+    def test_all_printers_failed_returns_last_error(self):
+        results = [cups_result("error", errors.OFFLINE), cups_result("error", errors.MEDIA_EMPTY)]
+        with patch.object(printer, 'print_cups', side_effect=results):
+            device, result = submit_with_failover("job", "/tmp/job.pdf", 1)
+
+        self.assertEqual(device, self.second)
+        self.assertEqual(result["error_code"], errors.MEDIA_EMPTY)
+
+if __name__ == '__main__':
+    unittest.main()
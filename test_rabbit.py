@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+import unittest
+from unittest.mock import patch, MagicMock
+
+import pika
+
+from . import rabbit
+from . import errors
+
+def batch_results(tasks, **fields):
+    return [dict({"job_id": task["job_id"], "status": "error", "error": "ошибка"}, **fields) for task in tasks]
+
+class TestFlushBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.ch = MagicMock()
+        rabbit.pending_batch = [(1, {"job_id": "a"}), (2, {"job_id": "b"})]
+        patchers = [
+            patch.object(rabbit, 'run_task'),
+            patch.object(rabbit, 'send_callback', return_value=True),
+            patch.object(rabbit, 'park_task'),
+        ]
+        self.run_task, self.send_callback, self.park_task = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def flush(self, results):
+        with patch.object(rabbit, 'print_batch', side_effect=lambda tasks: results(tasks)):
+            rabbit.flush_batch(self.ch)
+
+    def test_batch_not_submitted_is_retried_per_job(self):
+        """Пачка не дошла до CUPS - задания печатаются по отдельности"""
+        self.flush(lambda tasks: batch_results(tasks, error_code=errors.OFFLINE, submitted=False))
+
+        self.assertEqual(self.run_task.call_count, 2)
+        self.ch.basic_ack.assert_not_called()
+
+    def test_completion_timeout_is_not_reprinted(self):
+        """CUPS принял пачку - задания не печатаются повторно, ошибка сообщается"""
+        self.flush(lambda tasks: batch_results(tasks, error_code=errors.COMPLETION_TIMEOUT, submitted=True))
+
+        self.run_task.assert_not_called()
+        self.assertEqual(self.send_callback.call_count, 2)
+        self.assertEqual(self.ch.basic_ack.call_count, 2)
+        self.park_task.assert_not_called()
+
+    def test_submitted_batch_follows_park_policy(self):
+        self.flush(lambda tasks: batch_results(tasks, error_code=errors.TONER_EMPTY, submitted=True))
+
+        self.run_task.assert_not_called()
+        self.assertEqual(self.park_task.call_count, 2)
+        self.assertEqual(self.ch.basic_ack.call_count, 2)
+
+class TestDeferTask(unittest.TestCase):
+
+    def setUp(self):
+        self.ch = MagicMock()
+
+    def test_delay_rounded_up_to_queue_step(self):
+        """Каждая задержка - в своей очереди с TTL на уровне очереди"""
+        with patch.object(rabbit.config, 'PRINTER_BREAKER_RESET', 5), \
+                patch.object(rabbit.config, 'PRINTER_BREAKER_MAX_RESET', 60):
+            self.assertEqual(rabbit.defer_delays(), [5, 10, 20, 40, 60])
+            rabbit.defer_task(self.ch, 7, {"job_id": "a"}, 12)
+
+        self.assertEqual(self.ch.basic_publish.call_args[1]["routing_key"], rabbit.delayed_queue_name(20))
+        self.ch.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_unconfirmed_publish_keeps_message(self):
+        """Брокер не подтвердил публикацию - исходное сообщение не подтверждается"""
+        self.ch.basic_publish.side_effect = pika.exceptions.NackError([])
+        rabbit.defer_task(self.ch, 7, {"job_id": "a"}, 12)
+
+        self.ch.basic_ack.assert_not_called()
+        self.ch.basic_nack.assert_called_once_with(delivery_tag=7, requeue=True)
+
+if __name__ == '__main__':
+    unittest.main()
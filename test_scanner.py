@@ -1,7 +1,12 @@
 #!/usr/bin/env python3
+import json
 import os
 import sys
+import tempfile
+import threading
+import time
 import unittest
+from concurrent.futures import Future
 from unittest.mock import patch, MagicMock
 
 # Добавляем текущую директорию в путь Python
@@ -9,6 +14,11 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
 from scanner import scanner_manager
+from sane_backend import FakeBackend, ScanBackendError
+from scan_queue import ScanRequestQueue
+import scanner_wakeup
+from scanner_monitor import ReadinessMonitor
+from scanner_wakeup import WakeUpStrategy
 
 class TestScanner(unittest.TestCase):
     
@@ -20,8 +30,10 @@ class TestScanner(unittest.TestCase):
         """Очистка после каждого теста"""
         scanner_manager.stop_keyboard_listener()
     
+    @patch.object(scanner_manager, '_available_scanners_cache', None)
+    @patch.object(scanner_manager, '_save_scanner_cache')
     @patch('subprocess.run')
-    def test_scanner_exists(self, mock_subprocess):
+    def test_scanner_exists(self, mock_subprocess, mock_save):
         """Тест проверки существования сканера"""
         # Мокаем успешный ответ
         mock_result = MagicMock()
@@ -76,5 +88,171 @@ class TestScanner(unittest.TestCase):
         self.assertEqual(len(scan_results), 1)
         self.assertEqual(scan_results[0]['scan_id'], 'test_123')
 
+    def test_fake_backend_flatbed_scan(self):
+        """Планшетное сканирование через фейковый бэкенд без оборудования"""
+        backend = FakeBackend()
+        with patch.object(scanner_manager, 'backend', backend), \
+                patch.object(scanner_manager, '_available_scanners_cache', None), \
+                patch.object(scanner_manager, '_save_scanner_cache'):
+            result = scanner_manager.scan_document(format_type="png")
+
+        self.assertEqual(result['status'], 'success')
+        self.assertTrue(result['content'])
+        self.assertEqual(backend.scans, 1)
+
+    def test_fake_backend_not_ready(self):
+        """Сканер не отвечает и не просыпается - сканирование завершается ошибкой"""
+        backend = FakeBackend()
+        backend.ready = False
+        with patch.object(scanner_manager, 'backend', backend), \
+                patch.object(scanner_manager, '_available_scanners_cache', None), \
+                patch.object(scanner_manager, '_save_scanner_cache'), \
+                patch.object(scanner_manager, 'refresh_scanners_async'), \
+                patch.object(scanner_manager, '_wake_up_scanner_advanced', return_value=False):
+            result = scanner_manager.scan_document(format_type="png")
+
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(backend.scans, 0)
+
+    def test_interrupted_adf_stack_is_incomplete(self):
+        """Сбой посреди стопки: сохраненные листы отправляются, но результат помечен incomplete"""
+        class JammedBackend(FakeBackend):
+            def scan_pages(self, *args):
+                pages = super().scan_pages(*args)
+                yield next(pages)
+                yield next(pages)
+                raise ScanBackendError("Document feeder jammed")
+
+        def submit(result, page_file, dpi, mode, futures, in_flight):
+            future = Future()
+            future.set_result({})
+            futures.append(future)
+            return in_flight
+
+        saved_pages = [{'filename': f'scan_test_page_00{i}.pdf', 'file_size': 10} for i in (1, 2)]
+        with tempfile.TemporaryDirectory() as storage_dir, \
+                patch.object(scanner_manager, 'backend', JammedBackend(pages=5)), \
+                patch.object(scanner_manager.storage, 'storage_dir', storage_dir), \
+                patch.object(scanner_manager, '_submit_adf_page', side_effect=submit), \
+                patch.object(scanner_manager, '_collect_adf_pages', return_value=saved_pages):
+            result = {"scan_id": "test", "status": "success"}
+            scanner_manager._scan_in_process("fake:scanner", result, "pdf", 300, "Gray", True)
+            with open(os.path.join(storage_dir, "scan_test.json"), encoding='utf-8') as f:
+                metadata = json.load(f)
+
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['pages'], 2)
+        self.assertTrue(result['incomplete'])
+        self.assertIn("Document feeder jammed", result['error'])
+        self.assertTrue(metadata['incomplete'])
+        self.assertEqual(metadata['scan_error'], result['error'])
+
+    @patch.object(scanner_manager, '_available_scanners_cache', ["device `cached-scanner' is a CANON scanner"])
+    @patch.object(scanner_manager, '_available_scanners_cache_time', 0)
+    @patch.object(scanner_manager, 'refresh_scanners_async')
+    @patch('subprocess.run')
+    def test_stale_cache_revalidated_in_background(self, mock_subprocess, mock_refresh):
+        """Устаревший список сканеров возвращается сразу и перепроверяется в фоне"""
+        scanners = scanner_manager.get_available_scanners()
+
+        self.assertEqual(scanners, ["device `cached-scanner' is a CANON scanner"])
+        mock_refresh.assert_called_once()
+        mock_subprocess.assert_not_called()
+
+    def test_wakeup_opens_device_one_probe_at_a_time(self):
+        """Команды, открывающие устройство, не пересекаются и не переживают пробуждение"""
+        lock = threading.Lock()
+        active = []
+        overlaps = []
+
+        def fake_command(cmd, **kwargs):
+            opens_device = any(arg.startswith("--device-name") or arg == "--test" for arg in cmd)
+            if opens_device:
+                with lock:
+                    active.append(cmd)
+                    overlaps.append(len(active))
+            time.sleep(0.1)
+            if opens_device:
+                with lock:
+                    active.remove(cmd)
+            return MagicMock(returncode=1 if opens_device else 0)
+
+        def check_ready(device):
+            fake_command(["scanimage", f"--device-name={device}", "--help"])
+            return False
+
+        with tempfile.TemporaryDirectory() as stats_dir, \
+                patch.object(scanner_wakeup, 'run_command', side_effect=fake_command):
+            strategy = WakeUpStrategy(check_ready, stats_path=os.path.join(stats_dir, "stats.json"),
+                                      deadline=1, stagger=0)
+            self.assertFalse(strategy.wake("airscan:scanner"))
+            self.assertEqual(active, [])
+
+        self.assertTrue(overlaps)
+        self.assertEqual(max(overlaps), 1)
+
+    def test_readiness_probe_waits_for_scan(self):
+        """Фоновая проверка не обращается к сканеру, пока сканирование держит устройство"""
+        manager = MagicMock()
+        manager.device_lock = threading.Lock()
+        monitor = ReadinessMonitor(manager, keepalive_interval=60, retry_interval=60)
+        probed = threading.Event()
+
+        manager.device_lock.acquire()  # идет сканирование
+        with patch.object(monitor, 'probe', side_effect=lambda: probed.set()):
+            monitor.start()
+            try:
+                self.assertFalse(probed.wait(0.5))
+                manager.device_lock.release()
+                self.assertTrue(probed.wait(5))
+            finally:
+                monitor.stop()
+
+    def test_scan_queue_coalesces_double_press(self):
+        """Двойное нажатие дает одно сканирование, нажатие во время сканирования ждет в очереди"""
+        scan_queue = ScanRequestQueue(maxsize=2, coalesce_window=0.2)
+        started = threading.Event()
+        release = threading.Event()
+        scans = []
+
+        def scan():
+            scans.append(len(scans) + 1)
+            started.set()
+            release.wait(5)
+
+        scan_queue.start()
+        try:
+            self.assertTrue(scan_queue.submit(scan))
+            self.assertFalse(scan_queue.submit(scan))  # двойное нажатие
+            self.assertTrue(started.wait(5))
+
+            time.sleep(0.3)
+            self.assertTrue(scan_queue.submit(scan))  # нажатие во время сканирования
+            self.assertEqual(scan_queue.pending(), 1)
+
+            release.set()
+            scan_queue._queue.join()
+            self.assertEqual(scans, [1, 2])
+        finally:
+            release.set()
+            scan_queue.stop()
+
+    def test_scan_queue_window_counts_from_queued_press(self):
+        """Частые повторные нажатия не продлевают окно объединения"""
+        scan_queue = ScanRequestQueue(maxsize=5, coalesce_window=1.0)
+        clock = [100.0]
+
+        with patch("scan_queue.time.monotonic", side_effect=lambda: clock[0]):
+            self.assertTrue(scan_queue.submit(lambda: None))
+            for _ in range(2):
+                clock[0] += 0.4
+                self.assertFalse(scan_queue.submit(lambda: None))
+            self.assertEqual(scan_queue.pending(), 1)
+            # 1.2 сек от поставленного нажатия, хотя от предыдущего прошло 0.4
+            clock[0] += 0.4
+            self.assertTrue(scan_queue.submit(lambda: None))
+
+        self.assertEqual(scan_queue.pending(), 2)
+
 if __name__ == '__main__':
     unittest.main()
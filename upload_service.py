@@ -17,6 +17,8 @@ from typing import Dict, List
 
 import config
 from utils import setup_logger
+from http_client import http_client
+from metrics import start_metrics_server, inc_counter, set_gauge
 
 # Настройка логирования
 logger = setup_logger()
@@ -148,13 +150,14 @@ class UploadService:
 
             logger.info(f"📤 Отправка скана {scan_data['scan_id']} в очередь...")
 
-            # СОХРАНЯЕМ ТАЙМАУТЫ И ОБРАБОТКУ ОШИБОК
-            response = requests.post(
+            # Таймауты - по политике scan_upload; ответы 5xx не повторяются клиентом, скан
+            # останется в очереди загрузки и будет отправлен повторно с задержкой
+            response = http_client.post(
                 upload_url,
+                endpoint="scan_upload",
                 files=files,
                 data=data,
-                headers=headers,
-                timeout=60  # Увеличиваем таймаут для больших файлов
+                headers=headers
             )
 
             if response.status_code in [200, 201]:
@@ -238,6 +241,7 @@ class UploadService:
             upload_result = self.upload_scan(upload_data)
 
             # Обновляем метаданные
+            inc_counter("upload_attempts_total", 1, "Попытки отправки сканов", outcome=upload_result['upload_status'])
             if upload_result['upload_status'] == 'success':
                 self._update_metadata_success(metadata_file, metadata, upload_result)
                 logger.info(f"✅ Скан {scan_id} поставлен в очередь на загрузку в S3")
@@ -293,6 +297,7 @@ class UploadService:
             while self.running:
                 # Получаем сканы для загрузки
                 pending_scans = self.get_pending_scans()
+                set_gauge("upload_backlog", len(pending_scans), "Сканы, ожидающие отправки")
 
                 if pending_scans:
                     logger.info(f"📨 Найдено сканов для отправки в очередь: {len(pending_scans)}")
@@ -320,6 +325,8 @@ class UploadService:
         self.running = False
 
 def main():
+    # Метрики сервиса загрузки (GET /metrics)
+    start_metrics_server(config.METRICS_HOST, config.UPLOAD_METRICS_PORT)
     service = UploadService(check_interval=30)
     service.run()
 
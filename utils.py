@@ -7,6 +7,11 @@ import threading
 from datetime import datetime
 from typing import Dict, Any
 
+try:
+    from .metrics import run_command
+except ImportError:
+    from metrics import run_command
+
 # Эти переменные будут устанавливаться в worker/rabbit
 connection = None
 channel = None
@@ -22,13 +27,29 @@ logger: logging.Logger = None
 current_job_id = None
 current_job_lock = threading.Lock()
 
+# Событие изменения состояния воркера - будит heartbeat без ожидания интервала
+state_changed = threading.Event()
+
+# Сервер просит полное состояние в следующем heartbeat
+full_state_requested = threading.Event()
+
+def notify_state_change():
+    state_changed.set()
+
+def request_full_state():
+    full_state_requested.set()
+    state_changed.set()
+
 def update_current_job_id(task):
     """
     Обновляет текущий job_id из задачи RabbitMQ
     """
     global current_job_id
     with current_job_lock:
+        changed = current_job_id != task.get('job_id')
         current_job_id = task.get('job_id')
+    if changed:
+        notify_state_change()
 
 def get_current_job_id():
     """
@@ -95,7 +116,7 @@ def get_printer_status(printer: str) -> Dict[str, Any]:
         "raw_status": ""
     }
     try:
-        res = subprocess.run(
+        res = run_command(
             ["lpstat", "-p", printer],
             capture_output=True,
             text=True,
@@ -122,6 +143,22 @@ def get_printer_status(printer: str) -> Dict[str, Any]:
 
     return status
 
+def parse_state_reasons(lpstat_output: str) -> list:
+    """
+    Извлекает printer-state-reasons из строки "Alerts:" вывода lpstat -l.
+    Суффиксы -error/-warning/-report отбрасываются.
+    """
+    reasons = []
+    for line in lpstat_output.splitlines():
+        match = re.match(r'\s*(?:alerts|оповещения)\s*:\s*(.*)', line, re.IGNORECASE)
+        if not match:
+            continue
+        for reason in match.group(1).replace(",", " ").split():
+            reason = re.sub(r'-(error|warning|report)$', '', reason.lower())
+            if reason and reason != "none":
+                reasons.append(reason)
+    return reasons
+
 def get_detailed_printer_status(printer_name: str) -> dict:
     """
     Получает детальный статус принтера через несколько команд CUPS
@@ -136,6 +173,7 @@ def get_detailed_printer_status(printer_name: str) -> dict:
         "toner_low": False,
         "jobs_in_queue": 0,
         "current_job_id": None,
+        "state_reasons": [],
         "errors": ["Принтер недоступен"]
     }
 
@@ -144,7 +182,6 @@ def get_detailed_printer_status(printer_name: str) -> dict:
         commands = [
             ["lpstat", "-l", "-p", printer_name],  # Подробный статус
             ["lpstat", "-p", printer_name],  # Основной статус
-            ["lpoptions", "-l", "-p", printer_name],  # Опции принтера
             ["lpstat", "-o"]  # Очередь заданий
         ]
 
@@ -155,14 +192,14 @@ def get_detailed_printer_status(printer_name: str) -> dict:
             try:
                 if cmd[0] == "lpq":
                     # Проверяем наличие lpq в системе
-                    check_lpq = subprocess.run(["which", "lpq"],
+                    check_lpq = run_command(["which", "lpq"],
                                              capture_output=True,
                                              text=True)
                     if check_lpq.returncode != 0:
                         logger.warning("Команда lpq не найдена, пропускаем")
                         continue
 
-                result = subprocess.run(
+                result = run_command(
                     cmd,
                     capture_output=True,
                     text=True,
@@ -244,6 +281,15 @@ def get_detailed_printer_status(printer_name: str) -> dict:
         door_open = any(phrase in detailed_text for phrase in door_phrases)
         toner_low = any(phrase in detailed_text for phrase in toner_phrases)
 
+        # Машинные причины состояния принтера (IPP printer-state-reasons)
+        state_reasons = parse_state_reasons(lpstat_detailed_output)
+        if {"media-empty", "media-needed", "media-jam"} & set(state_reasons):
+            paper_out = True
+        if {"door-open", "cover-open", "interlock-open"} & set(state_reasons):
+            door_open = True
+        if {"toner-low", "toner-empty", "marker-supply-low", "marker-supply-empty"} & set(state_reasons):
+            toner_low = True
+
         # Проверяем очередь заданий
         jobs_count = 0
         current_job_id = None
@@ -291,6 +337,7 @@ def get_detailed_printer_status(printer_name: str) -> dict:
             "toner_low": toner_low,
             "jobs_in_queue": jobs_count,
             "current_job_id": current_job_id,
+            "state_reasons": state_reasons,
             "errors": errors,
             "debug": {
                 "is_enabled": is_enabled,
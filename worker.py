@@ -2,8 +2,11 @@ import signal
 import sys
 from . import config
 from .utils import graceful_exit, setup_logger, get_printer_status, get_detailed_printer_status
-from .rabbit import start_rabbit
+from .rabbit import start_rabbit, start_control_thread
 from .heartbeat import start_heartbeat_thread
+from .cups_supervisor import cups_supervisor
+from .status_server import start_status_server
+from .callback_outbox import callback_outbox
 
 # создаём логгер сразу, до всего остального
 logger = setup_logger()
@@ -26,7 +29,23 @@ if __name__ == "__main__":
         logger.warning("Внимание: печать ОТКЛЮЧЕНА (тестовый режим)")
         print(" [!] Внимание: печать ОТКЛЮЧЕНА (тестовый режим)")
 
+    # Фоновый контроль CUPS - восстановление выполняется вне пути печати
+    cups_supervisor.start()
+
     # heartbeat запускаем после логгера
     start_heartbeat_thread(logger)
 
-    start_rabbit()
+    # Локальный API состояния воркера
+    start_status_server()
+
+    # Канал управления: отмена заданий, пауза и возобновление
+    start_control_thread()
+
+    # Фоновая отправка результатов из очереди на диске
+    callback_outbox.start()
+
+    try:
+        start_rabbit()
+    finally:
+        # Пытаемся отправить накопленные результаты перед выходом
+        callback_outbox.stop()